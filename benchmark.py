@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+
+from src.controllers import benchmark_controller
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the pose pipeline stages, alone and end to end, '
+                                                 'with a json report that can be compared between commits.')
+    parser.add_argument('-s', '--stages', nargs='+', choices=benchmark_controller.STAGES,
+                        default=list(benchmark_controller.STAGES), help='stages to run (default: all)')
+    parser.add_argument('--weights', nargs='+', default=None,
+                        help='pose models for the model stages (default: yolov8n/s/m-pose.pt)')
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[320], help='model input sizes to sweep')
+    parser.add_argument('-t', '--threads', nargs='+', type=int, default=None,
+                        help='thread counts to sweep (default: all cores)')
+    parser.add_argument('-n', '--frames', type=int, default=200, help='timed frames per case')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed frames before every case')
+    parser.add_argument('--video', default=None, help='recorded video instead of synthetic frames')
+    parser.add_argument('-e', '--exercise', choices=tuple(benchmark_controller.PROCESSORS), default='squats',
+                        help='pose processor of the pipeline stage')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic frames and keypoints')
+    parser.add_argument('-o', '--out', default=None, help='json report file (json to stdout if not set)')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='earlier json report, fails when a case got slower than --max-regression')
+    parser.add_argument('--max-regression', type=float, default=0.1, help='allowed fps drop, 0.1 = 10 %%')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    report = benchmark_controller.run(args.stages, args.weights, args.imgsz, args.threads, frames=args.frames,
+                                      warmup=args.warmup, video_path=args.video, exercise=args.exercise,
+                                      seed=args.seed)
+
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        cases, regressions = benchmark_controller.compare(baseline, report, args.max_regression)
+        for case in cases:
+            print(f"{case['stage']:<10} {str(case['model']):<20} {str(case['imgsz']):>5} {str(case['threads']):>3}  "
+                  f"{case['baseline_fps']:9.1f} -> {case['fps']:9.1f} fps  {case['change']:+7.1%}", file=sys.stderr)
+        if regressions:
+            print(f'{len(regressions)} case(s) got slower than {args.max_regression:.0%}', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+from src.controllers import batch_controller
+from src.controllers import quantization_controller
+from src.strategies import detection_strategy
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='INT8 quantization of the pose model with a report against the '
+                                                 'FP32 model on the same clips.')
+    parser.add_argument('weights', help='fp32 weights, .pt (exported to onnx first) or .onnx')
+    parser.add_argument('paths', nargs='+', help='sample videos or directories with videos')
+    parser.add_argument('-e', '--exercise', choices=('Squats', 'Dumbbell'), required=True,
+                        help='exercise of the clips, used for the rep count comparison')
+    parser.add_argument('-l', '--level', type=int, choices=(0, 1), default=0, help='0 = beginner, 1 = pro')
+    parser.add_argument('-o', '--out', default=None, help='int8 model path (default: <weights>-int8.onnx)')
+    parser.add_argument('-r', '--report', default=None, help='json report file (json to stdout if not set)')
+    parser.add_argument('--imgsz', type=int, default=320)
+    parser.add_argument('--calibration-frames', type=int, default=50, help='calibration frames per video')
+    parser.add_argument('--eval-frames', type=int, default=50, help='keypoint comparison frames per video')
+    parser.add_argument('--threads', type=int, default=None, help='onnx runtime threads')
+    parser.add_argument('--quantize-head', action='store_true',
+                        help='quantize the box/keypoint decoding of the head as well')
+    parser.add_argument('--skip-quantize', action='store_true', help='only compare an already quantized model')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    videos = batch_controller.find_videos(args.paths)
+    if not videos:
+        print('No videos found.', file=sys.stderr)
+        return 1
+
+    fp32_path = args.weights
+    if fp32_path.lower().endswith('.pt'):
+        fp32_path = quantization_controller.export_onnx(fp32_path, args.imgsz)
+    int8_path = args.out or quantization_controller.default_int8_path(fp32_path)
+
+    if not args.skip_quantize:
+        quantization_controller.quantize(fp32_path, int8_path, videos, frames_per_video=args.calibration_frames,
+                                         head_prefix=None if args.quantize_head else '/model.22/')
+        print(f'INT8 model written to {int8_path}', file=sys.stderr)
+
+    reference = quantization_controller.load_reference(fp32_path, args.imgsz, args.threads)
+    quantized = detection_strategy.Int8PoseStrategy(imgsz=args.imgsz, weights_path=int8_path,
+                                                    threads=args.threads).create_model()
+    report = quantization_controller.compare(reference, quantized, videos, args.exercise, args.level,
+                                             frames_per_video=args.eval_frames)
+    report.update({'reference_model': fp32_path, 'quantized_model': int8_path})
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
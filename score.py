@@ -0,0 +1,79 @@
+import argparse
+import json
+import sys
+
+from src.controllers import batch_controller
+from src.models.inference_config import InferenceConfig
+from src.strategies.keypoint_filter import FILTERS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Headless rep counting for video files, no window is opened.')
+    parser.add_argument('paths', nargs='+', help='video files or directories with videos')
+    parser.add_argument('-e', '--exercise', choices=('Squats', 'Dumbbell'), required=True)
+    parser.add_argument('-l', '--level', type=int, choices=(0, 1), default=0, help='0 = beginner, 1 = pro')
+    parser.add_argument('-o', '--out', help='report file, .csv or .json (json to stdout if not set)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('-t', '--threads', type=int, default=None, help='torch threads per worker')
+    parser.add_argument('-b', '--batch-size', type=int, default=8, help='frames per forward pass')
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help='processes running the model of every video, the frames are shared with them '
+                             'instead of batched (0 = off)')
+    parser.add_argument('--prefetch', type=int, default=16,
+                        help='frames decoded ahead on a background thread while the model runs (0 = off)')
+    parser.add_argument('--stride', type=int, default=1, help='score every n-th frame only')
+    parser.add_argument('--weights', default=None, help='path to the pose model weights')
+    parser.add_argument('--imgsz', type=int, default=320)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.7)
+    parser.add_argument('--device', default='cpu', help='cpu, cuda, cuda:0, mps, ...')
+    parser.add_argument('--half', action='store_true', help='fp16 inference, gpu only')
+    parser.add_argument('--max-det', type=int, default=300, help='maximum number of people per frame')
+    parser.add_argument('--roi', action='store_true',
+                        help='run the model on a crop around the person of the previous frame')
+    parser.add_argument('--keyframe-every', type=int, default=1,
+                        help='run the model every n-th frame, optical flow moves the keypoints in between')
+    parser.add_argument('--smooth', choices=tuple(FILTERS), default=None,
+                        help='temporal keypoint filter between the model and the rep counter')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help='write the per-stage timings of every frame to DIR/<video>.profile.json '
+                             'and add their percentiles to the report')
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help='keep the keypoints of every video in DIR, scoring it again with other thresholds, '
+                             'level or --smooth reads them from there instead of running the model')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    videos = batch_controller.find_videos(args.paths)
+    if not videos:
+        print('No videos found.', file=sys.stderr)
+        return 1
+
+    model_kwargs = {'config': InferenceConfig(imgsz=args.imgsz, conf=args.conf, iou=args.iou, device=args.device,
+                                              half=args.half, max_det=args.max_det)}
+    if args.roi:
+        model_kwargs['roi'] = True
+    if args.keyframe_every > 1:
+        model_kwargs['keyframe_every'] = args.keyframe_every
+    if args.weights:
+        model_kwargs['weights_path'] = args.weights
+
+    results = batch_controller.score_videos(videos, args.exercise, level=args.level, workers=args.workers,
+                                            batch_size=args.batch_size, threads=args.threads,
+                                            model_kwargs=model_kwargs, smoothing=args.smooth,
+                                            profile_dir=args.profile, inference_workers=args.inference_workers,
+                                            prefetch=args.prefetch, stride=args.stride, cache_dir=args.cache)
+
+    if args.out:
+        batch_controller.write_report(results, args.out)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import argparse
+import json
+import sys
+import time
+
+import cv2
+
+from src.controllers.stream_server import StreamServer
+from src.models.inference_config import InferenceConfig
+from src.strategies.keypoint_filter import FILTERS
+
+EXERCISES = ('Squats', 'Dumbbell')
+
+
+def parse_source(text, exercise, level):
+    """SOURCE[,EXERCISE[,LEVEL]], a number is a camera index"""
+    parts = text.split(',')
+    source = int(parts[0]) if parts[0].isdigit() else parts[0]
+    if len(parts) > 1 and parts[1]:
+        exercise = parts[1]
+    if len(parts) > 2 and parts[2]:
+        level = int(parts[2])
+    if exercise not in EXERCISES:
+        raise argparse.ArgumentTypeError(f'unknown exercise {exercise} of {text}')
+    return source, exercise, level
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Several cameras or videos at once, each with its own rep counter, '
+                                                 'sharing one model that batches the frames of all streams.')
+    parser.add_argument('sources', nargs='+',
+                        help='SOURCE[,EXERCISE[,LEVEL]], SOURCE is a camera index or a video file')
+    parser.add_argument('-e', '--exercise', choices=EXERCISES, default='Squats', help='default exercise')
+    parser.add_argument('-l', '--level', type=int, choices=(0, 1), default=0, help='default level')
+    parser.add_argument('--weights', default=None, help='path to the pose model weights')
+    parser.add_argument('--imgsz', type=int, default=320)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.7)
+    parser.add_argument('--device', default='cpu', help='cpu, cuda, cuda:0, mps, ...')
+    parser.add_argument('--half', action='store_true', help='fp16 inference, gpu only')
+    parser.add_argument('--max-det', type=int, default=300, help='maximum number of people per frame')
+    parser.add_argument('--models', type=int, default=1, help='model instances, each with its own scheduler')
+    parser.add_argument('--max-batch', type=int, default=8, help='most frames in one forward pass')
+    parser.add_argument('--max-wait', type=float, default=10.0,
+                        help='milliseconds a batch waits for more streams before it runs')
+    parser.add_argument('--smooth', choices=tuple(FILTERS), default=None, help='temporal keypoint filter')
+    parser.add_argument('--show', action='store_true', help='a window with the annotated frames of every stream')
+    parser.add_argument('--stats-every', type=float, default=2.0,
+                        help='seconds between the json stats lines written to stdout, 0 = only at the end')
+    args = parser.parse_args(argv)
+    try:
+        args.sources = [parse_source(text, args.exercise, args.level) for text in args.sources]
+    except (argparse.ArgumentTypeError, ValueError) as ex:
+        parser.error(str(ex))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    model_kwargs = {'config': InferenceConfig(imgsz=args.imgsz, conf=args.conf, iou=args.iou, device=args.device,
+                                              half=args.half, max_det=args.max_det)}
+    if args.weights:
+        model_kwargs['weights_path'] = args.weights
+    server = StreamServer(model_kwargs, models=args.models, max_batch=args.max_batch, max_wait=args.max_wait / 1000)
+    for source, exercise, level in args.sources:
+        server.add_stream(source, exercise, level, render=args.show,
+                          keypoint_filter=FILTERS[args.smooth]() if args.smooth else None)
+
+    server.start()
+    last_stats = time.perf_counter()
+    try:
+        while server.running():
+            if args.show:
+                for stream in server.streams:
+                    if stream.latest_frame is not None:
+                        cv2.imshow(f'AI Trainer: {stream.name}', stream.latest_frame)
+                if cv2.waitKey(30) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.1)
+            if args.stats_every and time.perf_counter() - last_stats >= args.stats_every:
+                last_stats = time.perf_counter()
+                print(json.dumps(server.stats()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if args.show:
+            cv2.destroyAllWindows()
+
+    print(json.dumps(server.stats()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# batch_controller.py
+
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from src.controllers import opencv_controller
+from src.models.frame_profiler import FrameProfiler
+from src.models.keypoint_cache import KeypointCache
+from src.strategies import detection_strategy
+from src.strategies import angle_calculation_strategy
+from src.strategies import keypoint_filter
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+# detector of the current worker process, the weights are loaded once per process and not once per video
+_detector = None
+
+
+def find_videos(paths):
+    """expands the given files and directories into a sorted list of video files"""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            videos.append(path)
+    return sorted(videos)
+
+
+def _init_worker(model_kwargs, threads, load_model=True):
+    global _detector
+
+    _detector = detection_strategy.create_strategy(**model_kwargs)
+    # onnx models run without torch, their runtime gets the thread limit itself
+    if isinstance(_detector, detection_strategy.OnnxPoseStrategy):
+        if _detector.threads is None:
+            _detector.threads = threads
+    elif threads:
+        import torch
+        torch.set_num_threads(threads)
+    # with inference workers the model only runs in their processes
+    if load_model:
+        _detector.create_model()
+
+
+def score_video(video_path, exercise, level=0, batch_size=8, detector=None, smoothing=None, profile_dir=None,
+                inference_workers=0, prefetch=0, stride=1, cache_dir=None):
+    """counts the reps of one video with the given detector or the one of the current worker process,
+    smoothing is a name of keypoint_filter.FILTERS or None.
+    with profile_dir the stage timings of every frame are written to <profile_dir>/<video name>.profile.json
+    and their summary is added to the result. inference_workers > 0 runs the model of this video in that many
+    processes sharing the frames (see OpenCVController.process_headless).
+    prefetch frames are decoded ahead on a background thread while the model runs, stride > 1 scores every
+    stride-th frame only.
+    with cache_dir the keypoints of the video are read from a KeypointCache there instead of running the model,
+    or are stored there for the next time. result['cached'] says which one happened. the entry keeps the counts
+    of the run that filled it, a replay with the same exercise, level and smoothing sets result['cache_match']
+    to whether it counted the same (False after changing the thresholds, otherwise the replay went wrong)
+    """
+    detector = detector or _detector
+    cache = cached = None
+    if cache_dir:
+        cache = KeypointCache(cache_dir)
+        key = cache.key(video_path, detector, stride)
+        cached = cache.load(key)
+    # a cached video is neither decoded nor run through the model, the model is only loaded when it's needed
+    if cached is None and detector.model is None and not inference_workers:
+        detector.create_model()
+
+    angle = angle_calculation_strategy.Angle2DCalculation()
+    controller = opencv_controller.OpenCVController(detector, angle, exercise)
+    controller.setup(stream=0, level=level, video_path=video_path,
+                     keypoint_filter=keypoint_filter.FILTERS[smoothing]() if smoothing else None,
+                     prefetch=prefetch if cached is None else 0, stride=stride)
+    profiler = None
+    if profile_dir:
+        profiler = FrameProfiler(capacity=max(int(controller.vid.get(cv2.CAP_PROP_FRAME_COUNT)), 1000))
+    controller.set_profiler(profiler)
+
+    result = {'video': video_path, 'level': level}
+    settings = f'{exercise}/{level}/{smoothing}'
+    if cached is not None:
+        controller.vid.release()
+        result.update(controller.process_headless(replay=cached))
+        recorded = cached.meta.get('scores', {}).get(settings)
+        if recorded is not None:
+            result['cache_match'] = recorded == [result['frames'], result['correct'], result['incorrect']]
+    else:
+        records = [] if cache is not None else None
+        result.update(controller.process_headless(batch_size=batch_size, inference_workers=inference_workers,
+                                                  record=records.append if records is not None else None))
+        if cache is not None:
+            cache.save(key, records, {'video': os.path.abspath(video_path),
+                                      'scores': {settings: [result['frames'], result['correct'],
+                                                            result['incorrect']]},
+                                      **cache.describe(video_path, detector, stride)})
+    if cache is not None:
+        result['cached'] = cached is not None
+    if profiler is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.to_json(os.path.join(profile_dir, os.path.basename(video_path) + '.profile.json'))
+        result['profile'] = profiler.summary()
+    return result
+
+
+def _score_video_safe(video_path, exercise, level, batch_size, smoothing=None, profile_dir=None,
+                      inference_workers=0, prefetch=0, stride=1, cache_dir=None):
+    try:
+        return score_video(video_path, exercise, level, batch_size, smoothing=smoothing, profile_dir=profile_dir,
+                           inference_workers=inference_workers, prefetch=prefetch, stride=stride,
+                           cache_dir=cache_dir)
+    except Exception as ex:
+        return {'video': video_path, 'exercise': exercise, 'level': level, 'error': str(ex)}
+
+
+def score_videos(video_paths, exercise, level=0, workers=1, batch_size=8, threads=None, model_kwargs=None,
+                 smoothing=None, profile_dir=None, inference_workers=0, prefetch=0, stride=1, cache_dir=None):
+    """scores every video, spreading the files over a pool of worker processes.
+    threads limits the torch (or onnxruntime) threads of every worker, so the workers don't fight over the cores
+    """
+    model_kwargs = model_kwargs or {}
+    workers = max(1, min(workers, len(video_paths)))
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # with inference workers the model only runs in their processes, with a cache maybe not at all
+    load_model = not inference_workers and not cache_dir
+    if workers == 1:
+        _init_worker(model_kwargs, threads, load_model)
+        return [_score_video_safe(path, exercise, level, batch_size, smoothing, profile_dir, inference_workers,
+                                  prefetch, stride, cache_dir)
+                for path in video_paths]
+
+    # spawn, torch doesn't survive a fork well
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(model_kwargs, threads, load_model)) as pool:
+        futures = [pool.submit(_score_video_safe, path, exercise, level, batch_size, smoothing,
+                               profile_dir, inference_workers, prefetch, stride, cache_dir)
+                   for path in video_paths]
+        return [future.result() for future in futures]
+
+
+def write_report(results, path):
+    """writes the results as csv or json, chosen by the extension of path"""
+    if path.lower().endswith('.csv'):
+        errors = sorted({msg for result in results for msg in result.get('form_errors', {})})
+        fields = ['video', 'exercise', 'level', 'frames', 'correct', 'incorrect', 'fps', 'cached', 'cache_match',
+                  'error'] + errors
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=fields, restval='')
+            writer.writeheader()
+            for result in results:
+                row = {key: value for key, value in result.items() if key not in ('form_errors', 'profile')}
+                row.update({msg: result.get('form_errors', {}).get(msg, 0) for msg in errors})
+                writer.writerow(row)
+    else:
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
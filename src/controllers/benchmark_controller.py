@@ -0,0 +1,317 @@
+# benchmark_controller.py
+
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.models.frame_profiler import PERCENTILES
+from src.models.keypoints import KeypointRecord, NUM_KEYPOINTS
+from src.models.opencv_elements import OpenCVElements
+from src.strategies import angle_calculation_strategy
+from src.strategies import detection_strategy
+from src.strategies.model_registry import POSE_VARIANTS, WEIGHTS_DIR
+from src.strategies.pose_processor import squats_processor, dumbbell_processor
+
+# stages that run the model, they are repeated for every weights file, imgsz and thread count
+MODEL_STAGES = ('model', 'pipeline')
+STAGES = MODEL_STAGES + ('angle', 'squats', 'dumbbell', 'draw_text')
+
+PROCESSORS = {'squats': squats_processor.SquatsProcessor, 'dumbbell': dumbbell_processor.DumbbellProcessor}
+
+FRAME_SIZE = (720, 1280)
+
+
+def default_weights():
+    return [os.path.join(WEIGHTS_DIR, name) for name in POSE_VARIANTS]
+
+
+def synthetic_frames(count, size=FRAME_SIZE, seed=0):
+    """noise frames with a bright blob moving across them, the same for the same seed"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+        x = int((i * 13) % width)
+        cv2.rectangle(frame, (x, height // 4), (min(x + width // 8, width - 1), 3 * height // 4),
+                      (200, 200, 200), -1)
+        frames.append(frame)
+    return frames
+
+
+def read_frames(video_path, count):
+    """the first count frames of a recording, from the start again if it is shorter"""
+    vid = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = vid.read()
+        if not ret:
+            if not frames:
+                break
+            vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frames.append(frame)
+    vid.release()
+    if not frames:
+        raise ValueError(f'no frames could be read from {video_path}')
+    return frames
+
+
+def synthetic_poses(count, exercise='squats', seed=0, size=FRAME_SIZE):
+    """side view keypoints of one person doing squats or curls, one rep every 40 frames, with 1 px noise"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    poses = []
+    for i in range(count):
+        bend = 1 - abs(2 * (i % 40) / 40.0 - 1)
+        xy = np.zeros((NUM_KEYPOINTS, 2), dtype=np.float32)
+        for side, dx in ((0, 0.0), (1, 3.0)):
+            shoulder = np.array((width / 2 + dx, height * 0.3))
+            if exercise == 'squats':
+                angle = np.radians(5 + 90 * bend)
+                knee = np.array((width / 2 + dx, height * 0.65))
+                hip = knee + 0.2 * height * np.array((np.sin(angle), -np.cos(angle)))
+                shoulder = hip + np.array((5.0, -0.28 * height))
+                elbow, wrist, ankle = shoulder + (10, 80), shoulder + (20, 160), knee + (0, 0.2 * height)
+            else:
+                angle = np.radians(170 - 130 * bend)
+                elbow = shoulder + (0, 0.2 * height)
+                wrist = elbow + 0.18 * height * np.array((-np.sin(angle), -np.cos(angle)))
+                hip, knee, ankle = shoulder + (0, 0.35 * height), shoulder + (0, 0.55 * height), \
+                    shoulder + (0, 0.75 * height)
+            for index, point in zip((5, 7, 9, 11, 13, 15), (shoulder, elbow, wrist, hip, knee, ankle)):
+                xy[index + side] = point
+        xy[0] = xy[5] + (40, -40)
+        xy[(xy != 0).any(axis=1)] += rng.normal(0, 1, (np.count_nonzero((xy != 0).any(axis=1)), 2))
+        poses.append(KeypointRecord(np.clip(xy, 0, (width - 1, height - 1))[None]))
+    return poses
+
+
+class _PeakRss:
+    """samples the resident memory of the process on a background thread, peak is the largest sample"""
+    def __init__(self, interval=0.005):
+        import psutil
+
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def measure(step, items, warmup=10):
+    """calls step on every item after warmup untimed calls,
+    returns frames/s, latency percentiles in milliseconds and the peak rss in megabytes
+    """
+    for item in items[:warmup]:
+        step(item)
+
+    latencies = np.empty(len(items), dtype=np.float64)
+    with _PeakRss() as rss:
+        start = time.perf_counter()
+        for i, item in enumerate(items):
+            t = time.perf_counter()
+            step(item)
+            latencies[i] = time.perf_counter() - t
+        elapsed = time.perf_counter() - start
+
+    latencies *= 1000.0
+    result = {
+        'frames': len(items),
+        'fps': len(items) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {'mean': float(latencies.mean()), 'max': float(latencies.max())},
+        'peak_rss_mb': rss.peak / 2 ** 20
+    }
+    result['latency_ms'].update({f'p{p}': float(value)
+                                 for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))})
+    return result
+
+
+def _create_detector(weights_path, imgsz, threads):
+    kwargs = {'imgsz': imgsz}
+    if weights_path.lower().endswith(('.onnx', '.xml')):
+        kwargs['threads'] = threads
+    detector = detection_strategy.create_strategy(weights_path, **kwargs)
+    if not isinstance(detector, detection_strategy.OnnxPoseStrategy):
+        import torch
+        torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    return detector.create_model().warm_up()
+
+
+def bench_model(frames, weights_path, imgsz, threads, warmup=10):
+    """YOLOStrategy.process_frame (or the onnx strategies' one) on every frame"""
+    detector = _create_detector(weights_path, imgsz, threads)
+    try:
+        return measure(detector.process_frame, frames, warmup)
+    finally:
+        detector.release_model()
+
+
+def bench_pipeline(frames, weights_path, imgsz, threads, exercise='squats', warmup=10):
+    """model, rep counter and overlays of one frame, what OpenCVController does apart from decoding and imshow"""
+    detector = _create_detector(weights_path, imgsz, threads)
+    processor = PROCESSORS[exercise](detector, angle_calculation_strategy.Angle2DCalculation(), 0)
+
+    def step(frame):
+        frame = detector.process_frame(frame.copy())
+        processor.process(frame)
+
+    try:
+        return measure(step, frames, warmup)
+    finally:
+        detector.release_model()
+
+
+def bench_angle(poses, warmup=10):
+    """Angle2DCalculation.calculate_angle for the hip-knee and shoulder-elbow angles of every pose"""
+    angle = angle_calculation_strategy.Angle2DCalculation()
+
+    def step(pose):
+        xy = pose.xy[0]
+        angle.calculate_angle(xy[11], xy[15], xy[13])
+        angle.calculate_angle(xy[5], xy[9], xy[7])
+
+    return measure(step, poses, warmup)
+
+
+def bench_processor(exercise, poses, frame, warmup=10):
+    """PoseProcessor.process of the exercise on the given keypoints, drawing on one reused frame"""
+    detector = detection_strategy.YOLOStrategy()
+    processor = PROCESSORS[exercise](detector, angle_calculation_strategy.Angle2DCalculation(), 0)
+
+    def step(pose):
+        detector.set_detections(pose)
+        processor.process(frame)
+
+    return measure(step, poses, warmup)
+
+
+def bench_draw_text(frame, count, warmup=10):
+    """OpenCVElements.draw_text with the messages the processors show on a frame"""
+    messages = ['CORRECT: 12', 'INCORRECT: 3', 'LOWER YOUR HIPS', 'KNEE FALLING OVER TOE', 'fps: 30']
+
+    def step(_):
+        for j, msg in enumerate(messages):
+            OpenCVElements.draw_text(frame, msg, pos=(30, 80 + 60 * j), text_color=(255, 255, 230),
+                                     text_color_bg=(18, 185, 0), font_scale=0.7)
+
+    return measure(step, list(range(count)), warmup)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_info():
+    info = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__
+    }
+    for module in ('torch', 'ultralytics', 'onnxruntime', 'openvino'):
+        if module in sys.modules:
+            info[module] = getattr(sys.modules[module], '__version__', None)
+    return info
+
+
+def run(stages=STAGES, weights_paths=None, imgsz_values=(320,), thread_counts=None, frames=200, warmup=10,
+        video_path=None, exercise='squats', seed=0):
+    """runs the chosen stages, the model stages once for every weights file, imgsz and thread count.
+    returns {'machine': ..., 'settings': ..., 'results': [...]}, every result has the stage, its parameters
+    and what measure() returns
+    """
+    weights_paths = weights_paths or default_weights()
+    thread_counts = thread_counts or [os.cpu_count() or 1]
+    images = read_frames(video_path, frames) if video_path else synthetic_frames(frames, seed=seed)
+    frame = images[0].copy()
+
+    results = []
+
+    def add(stage, result, **params):
+        result = dict({'stage': stage, 'model': None, 'imgsz': None, 'threads': None}, **params, **result)
+        results.append(result)
+        print(f"{stage} {params}: {result['fps']:.1f} fps, p95 {result['latency_ms']['p95']:.2f} ms",
+              file=sys.stderr)
+
+    for stage in stages:
+        if stage in MODEL_STAGES:
+            for weights_path in weights_paths:
+                for imgsz in imgsz_values:
+                    for threads in thread_counts:
+                        params = {'model': os.path.basename(weights_path), 'imgsz': imgsz, 'threads': threads}
+                        try:
+                            if stage == 'model':
+                                result = bench_model(images, weights_path, imgsz, threads, warmup)
+                            else:
+                                result = bench_pipeline(images, weights_path, imgsz, threads, exercise, warmup)
+                        except Exception as ex:
+                            print(f'{stage} {params} failed: {ex}', file=sys.stderr)
+                            results.append(dict({'stage': stage, 'error': str(ex)}, **params))
+                            continue
+                        add(stage, result, **params)
+        elif stage == 'angle':
+            add(stage, bench_angle(synthetic_poses(frames, 'squats', seed), warmup))
+        elif stage in PROCESSORS:
+            add(stage, bench_processor(stage, synthetic_poses(frames, stage, seed), frame.copy(), warmup))
+        elif stage == 'draw_text':
+            add(stage, bench_draw_text(frame.copy(), frames, warmup))
+        else:
+            raise ValueError(f'Unknown stage: {stage}')
+
+    return {
+        'machine': machine_info(),
+        'settings': {'frames': frames, 'warmup': warmup, 'video': video_path, 'exercise': exercise, 'seed': seed},
+        'results': results
+    }
+
+
+def _case(result):
+    return result['stage'], result.get('model'), result.get('imgsz'), result.get('threads')
+
+
+def compare(baseline, report, max_regression=0.1):
+    """fps of every case of report against the same case of baseline (an earlier report).
+    returns the compared cases and the ones whose fps dropped by more than max_regression (0.1 = 10 %)
+    """
+    before = {_case(result): result for result in baseline['results'] if 'fps' in result}
+    cases, regressions = [], []
+    for result in report['results']:
+        old = before.get(_case(result))
+        if old is None or 'fps' not in result:
+            continue
+        change = result['fps'] / old['fps'] - 1 if old['fps'] > 0 else 0.0
+        case = {'stage': result['stage'], 'model': result['model'], 'imgsz': result['imgsz'],
+                'threads': result['threads'], 'baseline_fps': old['fps'], 'fps': result['fps'], 'change': change,
+                'baseline_p95_ms': old['latency_ms']['p95'], 'p95_ms': result['latency_ms']['p95']}
+        cases.append(case)
+        if change < -max_regression:
+            regressions.append(case)
+    return cases, regressions
@@ -0,0 +1,153 @@
+# frame_decoder.py
+
+import math
+import queue
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+# marks the end of the video in the queue of decoded frames
+_END_OF_STREAM = object()
+
+
+class PrefetchDecoder:
+    """decodes a video file on a background thread ahead of the consumer, a drop-in for cv2.VideoCapture
+    in the processing loops (read, isOpened, get, set, release).
+
+    prefetch - frames decoded ahead, the thread waits when they are not taken
+    stride   - only every stride-th frame is decoded, the ones in between are skipped with grab()
+    start    - index of the first frame
+
+    frames are decoded into a pool of reused buffers (VideoCapture.read(image=buffer)). a buffer is reused once
+    nothing references it any more, so a frame stays valid for as long as the caller keeps it. when every
+    buffer is still in use a new frame is allocated instead of waiting, the pool never blocks the caller.
+    at the end read() returns (False, None) and isOpened() turns False
+    """
+    def __init__(self, vid, prefetch=4, stride=1, start=0, buffers=None):
+        self.vid = vid
+        self.prefetch = prefetch
+        self.stride = max(1, stride)
+        self.buffers = buffers or prefetch + 4
+        self.start = start
+        self.position = start
+        self.error = None
+        self._opened = vid.isOpened()
+
+        self._pool = []
+        self._frames = None
+        self._ended = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        # a new capture is at the first frame already
+        if start:
+            self.vid.set(cv2.CAP_PROP_POS_FRAMES, start)
+        self._start(start)
+
+    def _start(self, position):
+        self.position = position
+        self._frames = queue.Queue(maxsize=self.prefetch)
+        self._ended = False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._decode, name='decoder', daemon=True)
+        self._thread.start()
+
+    def _free_buffer(self):
+        for buffer in self._pool:
+            # the pool, the loop variable and getrefcount's argument: nobody else holds the frame
+            if sys.getrefcount(buffer) == 3:
+                return buffer
+        return None
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decode(self):
+        # the frames in between are skipped before every frame but the first
+        skip = 0
+        try:
+            while not self._stop_event.is_set():
+                buffer = self._free_buffer()
+                ret = True
+                for _ in range(skip):
+                    ret = self.vid.grab()
+                    if not ret:
+                        break
+                if ret:
+                    ret, frame = self.vid.read(image=buffer) if buffer is not None else self.vid.read()
+                if not ret:
+                    break
+                skip = self.stride - 1
+                if buffer is None and len(self._pool) < self.buffers:
+                    self._pool.append(frame)
+                del buffer
+                if not self._put(frame):
+                    return
+                del frame
+        except cv2.error as ex:
+            print(f'frame_decoder: {ex}')
+            self.error = ex
+        self._put(_END_OF_STREAM)
+
+    def read(self, image=None):
+        """the next frame like VideoCapture.read, copied into image if one is given"""
+        if self._ended:
+            return False, None
+        frame = self._frames.get()
+        if frame is _END_OF_STREAM:
+            self._ended = True
+            return False, None
+        self.position += self.stride
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def seek(self, position):
+        """continues from the frame with the given index, the frames decoded ahead are dropped"""
+        self._stop()
+        self.vid.set(cv2.CAP_PROP_POS_FRAMES, position)
+        self._start(position)
+
+    def _stop(self):
+        self._stop_event.set()
+        # unblocks a decoder waiting for room in the queue
+        while self._thread.is_alive():
+            try:
+                self._frames.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def isOpened(self):
+        # the decoder is ahead of the caller, the capture ends before the frames in the queue are read
+        return self._opened and not self._ended
+
+    def get(self, prop):
+        """VideoCapture.get, the frame rate and count are the ones of the frames that are read (with stride)"""
+        value = self.vid.get(prop)
+        if prop == cv2.CAP_PROP_FPS and value > 0:
+            return value / self.stride
+        if prop == cv2.CAP_PROP_FRAME_COUNT and value > 0:
+            return math.ceil(max(value - self.start, 0) / self.stride)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        return value
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.seek(int(value))
+            return True
+        return self.vid.set(prop, value)
+
+    def release(self):
+        self._stop()
+        self._ended = True
+        self.vid.release()
@@ -3,15 +3,38 @@
 from PySide6.QtWidgets import QMessageBox, QFileDialog
 from src.view import settings
 from src.controllers import opencv_controller
+from src.controllers import session_worker
 from src.strategies import detection_strategy
 from src.strategies import angle_calculation_strategy
 
+# size of the form in main-new.ui and of the session video next to it
+FORM_SIZE = (461, 670)
+VIDEO_SIZE = (854, 480)
+
+
 class MainWindowController:
     def __init__(self, window):
         self._window = window
         self.opencv_controller = None
+        self.detector = None
         self.sets = settings.Settings()
         self.sets.create()
+        # saving other weights in the settings warms them up as well
+        self.sets.window_sets.save_button.clicked.connect(lambda: self.warm_up(self.sets.get_settings()))
+
+        # runs the session loop off the gui thread, see clicked_start
+        self._worker = None
+        # cleared by session_finished, the worker doesn't touch the model after it
+        self._session_running = False
+
+        self._warm_up_worker = None
+        # cleared by the finished signal of the warm up, on the gui thread
+        self._warming_up = False
+        # settings saved while a session or another warm up ran, they are warmed up after it
+        self._pending_warm_up = None
+        # Start pressed during a warm up, the session starts once the warm up is done
+        self._pending_start = False
+        self.warm_up()
 
     @property
     def window(self):
@@ -25,6 +48,11 @@ class MainWindowController:
         self.sets.show()
 
     def clicked_start(self):
+        # while a session runs the start button stops it
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.stop()
+            return
+
         text = self.window.curls.text()
         style_sheet = self.window.curls.styleSheet()
         try:
@@ -35,13 +63,17 @@ class MainWindowController:
 
                 settings_dict = self.sets.get_settings()
 
-                if len(settings_dict) > 0:
-                    if settings_dict['path'] != '':
-                        self.detector = detection_strategy.YOLOStrategy(imgsz=settings_dict['imgsz'], weights_path=settings_dict['path'], conf=settings_dict['conf'], iou=settings_dict['iou']).create_model()
-                    else:
-                        self.detector = detection_strategy.YOLOStrategy(imgsz=settings_dict['imgsz'], conf=settings_dict['conf'], iou=settings_dict['iou']).create_model()
-                else:
-                    self.detector = detection_strategy.YOLOStrategy().create_model()
+                # a start during the warm up waits for it without blocking the gui and gets the warmed up model,
+                # the same model must not run on the warm up thread and in the session at once
+                if self._warming_up:
+                    self._pending_start = True
+                    self.window.statusbar.showMessage('Loading the model...')
+                    return
+                previous = self.detector
+                self.detector = detection_strategy.create_strategy(**self._detector_kwargs(settings_dict)).create_model()
+                if previous is not None:
+                    # the model stays in the registry, starting again with the same settings doesn't reload it
+                    previous.release_model()
 
                 angle = angle_calculation_strategy.Angle2DCalculation()
                 self.opencv_controller = opencv_controller.OpenCVController(self.detector, angle, self.chosen_exercise())
@@ -50,9 +82,11 @@ class MainWindowController:
                 else:
                     self.opencv_controller.setup(stream=self.chosen_stream(), level=self.get_level(), video_path=self.get_path())
                 if len(settings_dict) > 0:
-                    self.opencv_controller.process(show_fps=settings_dict['fps'], curls=number, plot=settings_dict['plot'])
+                    process_kwargs = dict(show_fps=settings_dict['fps'], curls=number, plot=settings_dict['plot'],
+                                          pipelined=True)
                 else:
-                    self.opencv_controller.process(show_fps=False, curls=number, plot=False)
+                    process_kwargs = dict(show_fps=False, curls=number, plot=False, pipelined=True)
+                self._start_session(process_kwargs)
             else:
                 # setting a style with a red border to indicate invalid input
                 self.window.curls.setStyleSheet(f"{style_sheet} border-bottom: 1px solid red;")
@@ -63,6 +97,89 @@ class MainWindowController:
             self.window.curls.setStyleSheet(f"{style_sheet} border-bottom: 1px solid red;")
             QMessageBox.warning(self.window, "Warning", "Enter correct number.")
 
+    def _start_session(self, process_kwargs):
+        worker = session_worker.SessionWorker(self.opencv_controller, process_kwargs)
+        worker.frame_ready.connect(lambda image: self._show_frame(worker, image))
+        worker.session_finished.connect(self._session_finished)
+        worker.failed.connect(lambda msg: QMessageBox.warning(self.window, "Warning", msg))
+        self._worker = worker
+        self._session_running = True
+
+        self._show_video()
+        self.window.start_button.setText('Stop')
+        self.window.pause_button.setText('Pause')
+        self.window.pause_button.setEnabled(True)
+        worker.start()
+
+    def _show_frame(self, worker, image):
+        self.window.video.show_frame(image)
+        worker.frame_shown()
+
+    def _session_finished(self, correct, incorrect):
+        self._session_running = False
+        self.window.start_button.setText('Start')
+        self.window.pause_button.setText('Pause')
+        self.window.pause_button.setEnabled(False)
+        self.window.statusbar.showMessage(f'Correct: {correct}, incorrect: {incorrect}')
+        if self._pending_warm_up is not None:
+            self.warm_up(self._pending_warm_up)
+
+    def _show_video(self):
+        width, height = VIDEO_SIZE
+        self.window.setFixedSize(FORM_SIZE[0] + width + 20, max(FORM_SIZE[1], height + 40))
+        self.window.video.setGeometry(FORM_SIZE[0], 20, width, height)
+        self.window.video.show()
+
+    def clicked_pause(self):
+        if self._worker is None or not self._worker.isRunning():
+            return
+        if self.window.pause_button.text() == 'Pause':
+            self._worker.pause()
+            self.window.pause_button.setText('Resume')
+        else:
+            self._worker.resume()
+            self.window.pause_button.setText('Pause')
+
+    def close(self):
+        """stops a running session and waits for it, called before the application quits"""
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker.wait()
+        if self._warm_up_worker is not None:
+            self._warm_up_worker.wait()
+
+    @staticmethod
+    def _detector_kwargs(settings_dict):
+        if len(settings_dict) == 0:
+            return {}
+        kwargs = {'config': settings_dict['config']}
+        if settings_dict['path'] != '':
+            kwargs['weights_path'] = settings_dict['path']
+        return kwargs
+
+    def warm_up(self, settings_dict=None):
+        """loads the model and runs it once in the background while the user fills in the form,
+        Start takes the loaded model from the model registry if the settings are the same.
+        a session may be using the model of the settings, so settings saved during a session (or during
+        another warm up) are warmed up when it ends
+        """
+        if self._session_running or self._warming_up:
+            self._pending_warm_up = settings_dict or {}
+            return
+        self._pending_warm_up = None
+        self._warming_up = True
+        self._warm_up_worker = session_worker.WarmUpWorker(self._detector_kwargs(settings_dict or {}))
+        self._warm_up_worker.finished.connect(self._warm_up_finished)
+        self._warm_up_worker.start()
+
+    def _warm_up_finished(self):
+        self._warming_up = False
+        if self._pending_start:
+            self._pending_start = False
+            self.clicked_start()
+        elif self._pending_warm_up is not None:
+            self.warm_up(self._pending_warm_up)
+
     def get_path(self):
         return self.window.file.text()
 
@@ -1,8 +1,50 @@
 # opencv_controller.py
 
+import contextlib
+import queue
+import threading
 import time
 import cv2
-from src.strategies.pose_processor import squats_processor, dumbbell_processor
+import numpy as np
+from src.controllers import shared_frames
+from src.controllers.frame_decoder import PrefetchDecoder
+from src.strategies.pose_processor import squats_processor, dumbbell_processor, multi_person_processor
+from src.strategies.pose_processor.pose_processor import FrameClock
+
+# marks the end of the stream in the pipeline queues
+_END_OF_STREAM = object()
+
+
+def _put(q, item, stop_event, drop_stale=False):
+    """puts item into a bounded queue,
+    if drop_stale is set the oldest queued item is thrown away instead of waiting
+    """
+    while not stop_event.is_set():
+        if drop_stale and item is not _END_OF_STREAM:
+            try:
+                q.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+        else:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+    return False
+
+
+def _get(q, stop_event):
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _END_OF_STREAM
 
 
 # В opencv_controller.py
@@ -13,6 +55,15 @@ class OpenCVController:
         self.detection_strategy = detection_strategy
         self.selected_exercise = selected_exercise
         self.pose_processor = None
+        # per-stage timings of every frame, see set_profiler
+        self.profiler = None
+        # gets the annotated frames instead of cv2.imshow, see set_frame_sink
+        self.frame_sink = None
+        # time of the video file being processed, the camera runs on the wall clock
+        self.frame_clock = None
+        self._stop_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
 
     def set_selected_exercise(self, exercise_name):
         self.selected_exercise = exercise_name
@@ -26,14 +77,84 @@ class OpenCVController:
     def set_pose_processor_strategy(self, strategy):
         self.pose_processor = strategy
 
-    def setup(self, stream=0, level=0, video_path=None):
+    def set_profiler(self, profiler):
+        """a FrameProfiler that gets the stage timings of every processed frame, None turns it off"""
+        self.profiler = profiler
+        return self
+
+    def set_frame_sink(self, sink):
+        """sink(frame) is called with every annotated frame instead of showing it with cv2.imshow,
+        the session is then ended with stop() instead of the q key. None shows the opencv window again
+        """
+        self.frame_sink = sink
+        return self
+
+    def stop(self):
+        """ends the running session after the current frame, can be called from any thread"""
+        self._stop_event.set()
+        self._resume_event.set()
+
+    def pause(self):
+        """holds the session before the next frame until resume() or stop(), only with a frame sink"""
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def _record(self, stage, start, frame=0):
+        """adds the time since start to the profiler, returns the current time"""
+        if self.profiler is not None:
+            return self.profiler.since(stage, start, frame)
+        return time.perf_counter()
+
+    def _record_detection(self, first=0):
+        if self.profiler is not None:
+            self.profiler.add_timings(self.detection_strategy.timings, first)
+
+    def _read(self, frame=0):
+        start = time.perf_counter()
+        ret, image = self.vid.read()
+        self._record('decode', start, frame)
+        return ret, image
+
+    def _set_detections(self, detections, plot=False):
+        if self.frame_clock is not None:
+            self.frame_clock.tick()
+        start = time.perf_counter()
+        self.detection_strategy.set_detections(detections, plot=plot)
+        self._record('keypoints', start)
+
+    def _finish_frame(self):
+        """polls the window and closes the frame in the profiler, True if the session has to end"""
+        if self.frame_sink is not None:
+            self._resume_event.wait()
+        start = time.perf_counter()
+        if self.frame_sink is None:
+            stopped = cv2.waitKey(1) & 0xFF == ord('q')
+        else:
+            stopped = self._stop_event.is_set()
+        self._record('display', start)
+        if self.profiler is not None:
+            self.profiler.end_frame()
+        return stopped
+
+    def setup(self, stream=0, level=0, video_path=None, multi_person=False, keypoint_filter=None, camera_index=1,
+              prefetch=0, stride=1, start_frame=0):
+        """prefetch > 0 decodes that many frames of a video file ahead on a background thread, stride > 1 only
+        analyzes every stride-th frame and start_frame skips the beginning, see frame_decoder.PrefetchDecoder
+        """
+        self.stream = stream
+        self._stop_event.clear()
+        self._resume_event.set()
         if stream:
-            self.vid = cv2.VideoCapture(1)
+            self.vid = cv2.VideoCapture(camera_index)
         else:
             self.vid = cv2.VideoCapture(video_path)
             # self.vid = cv2.VideoCapture('/Users/egorken/Downloads/How to bodyweight squat.mp4')
             # self.vid = cv2.VideoCapture('/Users/egorken/Downloads/10 Min Squat Workout with 10 Variations - No Repeats No Talking.mp4')
             # self.vid = cv2.VideoCapture('/Users/egorken/Downloads/bicep curls.mp4')
+            if prefetch > 0 or stride > 1 or start_frame:
+                self.vid = PrefetchDecoder(self.vid, max(prefetch, 1), stride, start_frame)
 
         if self.selected_exercise is None or \
                 self.angle_calculation_strategy is None or \
@@ -43,43 +164,339 @@ class OpenCVController:
         # setting chosen strategies
         self.set_detection_strategy(self.detection_strategy)
         self.set_angle_calculation_strategy(self.angle_calculation_strategy)
+        # the strategy may be reused from the previous video (batch scoring), nothing of that one may leak into this one
+        self.detection_strategy.reset()
+
+        # a new filter for every video, the time step follows the frame rate of the file
+        if keypoint_filter is not None and not stream and self.vid.get(cv2.CAP_PROP_FPS) > 0:
+            keypoint_filter.fps = self.vid.get(cv2.CAP_PROP_FPS)
+        self.detection_strategy.set_filter(keypoint_filter)
 
         # choosing pose_processor strategy
         if self.selected_exercise == "Squats":
-            self.set_pose_processor_strategy(squats_processor.SquatsProcessor(self.detection_strategy, self.angle_calculation_strategy, level))
+            processor_class = squats_processor.SquatsProcessor
         elif self.selected_exercise == "Dumbbell":
-            self.set_pose_processor_strategy(dumbbell_processor.DumbbellProcessor(self.detection_strategy, self.angle_calculation_strategy, level))
+            processor_class = dumbbell_processor.DumbbellProcessor
         else:
             raise ValueError(f"Unknown exercise: {self.selected_exercise}")
+
+        if multi_person:
+            # every tracked person gets an own processor
+            self.detection_strategy.set_tracking(True)
+            self.set_pose_processor_strategy(multi_person_processor.MultiPersonProcessor(
+                self.detection_strategy, self.angle_calculation_strategy, level, processor_class=processor_class))
+        else:
+            self.set_pose_processor_strategy(processor_class(self.detection_strategy, self.angle_calculation_strategy, level))
+
+        # a video runs on its own time, so the inactivity resets happen on the same frames however fast it's processed
+        self.frame_clock = None
+        if not stream:
+            fps = self.vid.get(cv2.CAP_PROP_FPS)
+            self.frame_clock = FrameClock(fps if fps > 0 else 30.0)
+            self.pose_processor.set_clock(self.frame_clock)
         return self
 
-    def process(self, show_fps=False, curls=None, plot=False):
+    def process(self, show_fps=False, curls=None, plot=False, pipelined=False, drop_stale=None, queue_size=2,
+                batch_size=1, inference_workers=0):
+        if inference_workers > 0:
+            return self.process_multiprocess(show_fps=show_fps, curls=curls, plot=plot, workers=inference_workers)
+        # batching only makes sense for a recorded video, the webcam would wait for the whole batch
+        if batch_size > 1 and not self.stream:
+            return self.process_batched(show_fps=show_fps, curls=curls, plot=plot, batch_size=batch_size)
+        if pipelined:
+            return self.process_pipelined(show_fps=show_fps, curls=curls, plot=plot,
+                                          drop_stale=drop_stale, queue_size=queue_size)
+
         pTime = 0
 
         try:
             while self.vid.isOpened():
-                _, self.frame = self.vid.read()
-                self.frame = self.detection_strategy.process_frame(self.frame, plot=plot)
+                ret, self.frame = self._read()
+                if not ret:
+                    break
+                self.frame, detections = self.detection_strategy.detect(self.frame, plot=plot)
+                self._record_detection()
+                self._set_detections(detections, plot=plot)
+                pTime = self._annotate_and_show(curls, show_fps, pTime)
+
+                if self._finish_frame():
+                    break
+        except cv2.error as ex:
+            print(f'opencv_controller: {ex}')
+
+        self.vid.release()
+        if self.frame_sink is None:
+            cv2.destroyAllWindows()
+
+    def _annotate_and_show(self, curls, show_fps, pTime):
+        start = time.perf_counter()
+        try:
+            analysis = self.pose_processor.analyze()
+            start = self._record('analysis', start)
+            self.pose_processor.draw(self.frame, analysis, curls)
+        except Exception as ex:
+            print(f'pose_processor exception: {ex}')
+
+        if show_fps:
+            cTime = time.time()
+            fps = 1 / (cTime - pTime)
+            pTime = cTime
+            cv2.putText(self.frame, f'fps: {int(fps)}', (1180, 45), cv2.FONT_HERSHEY_PLAIN, 1.2,
+                        (255, 255, 255), 2)
+        start = self._record('overlay', start)
+
+        if self.frame_sink is not None:
+            self.frame_sink(self.frame)
+        else:
+            cv2.imshow(f'AI Trainer: {self.selected_exercise} training', self.frame)
+        self._record('display', start)
+        return pTime
+
+    def _read_batch(self, batch_size):
+        frames = []
+        while len(frames) < batch_size:
+            ret, frame = self._read(len(frames))
+            if not ret:
+                break
+            frames.append(frame)
+        return frames
+
+    def analyze_frame(self, frame, detections, plot=False, curls=None, render=True):
+        """pose processor step for a frame the model ran on somewhere else, e.g. in the shared model of a
+        StreamServer. with render the overlays are drawn and the frame goes to the frame sink
+        """
+        self.frame = frame
+        self._set_detections(detections, plot=plot)
+        if render:
+            self._annotate_and_show(curls, False, 0)
+            return
+        start = time.perf_counter()
+        try:
+            self.pose_processor.analyze()
+        except Exception as ex:
+            print(f'pose_processor exception: {ex}')
+        self._record('analysis', start)
+
+    def _detect_batches(self, batch_size):
+        while self.vid.isOpened():
+            frames = self._read_batch(batch_size)
+            if not frames:
+                break
+            batch = self.detection_strategy.detect_batch(frames)
+            self._record_detection()
+            yield from batch
 
+    def _detect_multiprocess(self, workers, plot=False, slots=None):
+        """yields (frame, detections) in frame order like detect_batch, the model runs in worker processes.
+        frames are decoded straight into the slots of a shared memory ring and the workers write the keypoints
+        next to them, nothing but slot numbers is pickled. a yielded frame stays valid until the next one
+        """
+        strategy = self.detection_strategy
+        if workers > 1 and (strategy.track or strategy.roi or strategy.keyframe_every > 1):
+            raise ValueError('the tracker, roi and keyframes need the frames in order, use one inference worker')
+        ret, first = self._read()
+        if not ret:
+            return
+        pool = shared_frames.InferencePool(first.shape, self.detection_strategy.spawn_kwargs(), workers, slots,
+                                           plot=plot, max_persons=self.detection_strategy.config.max_det)
+        try:
+            slot = pool.acquire()
+            np.copyto(pool.ring.frame(slot), first)
+            pool.submit(slot, 0)
+            submitted, delivered, ended = 1, 0, False
+
+            while True:
+                # keeps every slot busy while the frames before are analyzed
+                while not ended and pool.has_free_slot():
+                    slot = pool.acquire()
+                    buffer = pool.ring.frame(slot)
+                    start = time.perf_counter()
+                    ret, frame = self.vid.read(image=buffer)
+                    self._record('decode', start, submitted - delivered)
+                    if not ret:
+                        pool.release(slot)
+                        ended = True
+                        break
+                    if frame is not buffer:
+                        np.copyto(buffer, frame)
+                    pool.submit(slot, submitted)
+                    submitted += 1
+
+                if delivered == submitted:
+                    break
+                slot, detections, timings = pool.result(delivered)
+                if self.profiler is not None:
+                    self.profiler.add_timings([timings])
+                yield pool.ring.frame(slot), detections
+                pool.release(slot)
+                delivered += 1
+        finally:
+            pool.close()
+
+    def process_headless(self, batch_size=8, inference_workers=0, replay=None, record=None):
+        """runs the whole video through the pose processor without any window,
+        returns the rep counts and how many times every form error was shown.
+        inference_workers > 0 runs the model in that many processes instead of batches on this one.
+        replay is a sequence with the detections of every frame (keypoint_cache.CachedKeypoints), the video isn't
+        decoded and the model doesn't run. record(detections) gets the detections of every frame before the filter
+        """
+        frames_count = 0
+        form_errors = {}
+        active_feedback = set()
+        start_time = time.perf_counter()
+
+        if replay is not None:
+            detections_source = ((None, detections) for detections in replay)
+        elif inference_workers > 0:
+            detections_source = self._detect_multiprocess(inference_workers)
+        else:
+            detections_source = self._detect_batches(batch_size)
+
+        try:
+            with contextlib.closing(detections_source):
+                for frame, detections in detections_source:
+                    if record is not None:
+                        record(detections)
+                    # nothing is shown, so the overlays are not drawn at all
+                    self.analyze_frame(frame, detections, render=False)
+                    if self.profiler is not None:
+                        self.profiler.end_frame()
+                    frames_count += 1
+
+                    # a form error is counted once per appearance, not once per frame it stays on the screen
+                    feedback = set(self.pose_processor.active_feedback())
+                    for msg in feedback - active_feedback:
+                        form_errors[msg] = form_errors.get(msg, 0) + 1
+                    active_feedback = feedback
+        finally:
+            self.vid.release()
+
+        elapsed = time.perf_counter() - start_time
+        correct, incorrect = self.pose_processor.get_counts()
+        return {
+            'exercise': self.selected_exercise,
+            'frames': frames_count,
+            'correct': int(correct),
+            'incorrect': int(incorrect),
+            'form_errors': form_errors,
+            'fps': frames_count / elapsed if elapsed > 0 else 0.0
+        }
+
+    def process_multiprocess(self, show_fps=False, curls=None, plot=False, workers=2, slots=None):
+        """capture, decoding and the pose processor stay in this process, the model runs in workers
+        processes that share the frames with it, see _detect_multiprocess
+        """
+        pTime = 0
+
+        try:
+            with contextlib.closing(self._detect_multiprocess(workers, plot, slots)) as detections_source:
+                for self.frame, results in detections_source:
+                    self._set_detections(results, plot=plot)
+                    pTime = self._annotate_and_show(curls, show_fps, pTime)
+
+                    if self._finish_frame():
+                        break
+        except cv2.error as ex:
+            print(f'opencv_controller: {ex}')
+
+        self.vid.release()
+        if self.frame_sink is None:
+            cv2.destroyAllWindows()
+
+    def process_batched(self, show_fps=False, curls=None, plot=False, batch_size=8):
+        """offline analysis of a video file:
+        decodes batch_size frames ahead and runs them through the model in one call,
+        then hands the frames to the pose processor one by one in their original order
+        """
+        pTime = 0
+        stopped = False
+
+        try:
+            while self.vid.isOpened() and not stopped:
+                frames = self._read_batch(batch_size)
+                if not frames:
+                    break
+
+                batch = self.detection_strategy.detect_batch(frames, plot=plot)
+                self._record_detection()
+                for self.frame, results in batch:
+                    self._set_detections(results, plot=plot)
+                    pTime = self._annotate_and_show(curls, show_fps, pTime)
+
+                    if self._finish_frame():
+                        stopped = True
+                        break
+        except cv2.error as ex:
+            print(f'opencv_controller: {ex}')
+
+        self.vid.release()
+        if self.frame_sink is None:
+            cv2.destroyAllWindows()
+
+    def process_pipelined(self, show_fps=False, curls=None, plot=False, drop_stale=None, queue_size=2):
+        """same as process, but capture and inference run on their own threads,
+        connected to the annotate/display stage with bounded queues.
+        drop_stale=None drops stale frames only for the webcam, so a video file is processed frame by frame.
+        the stage timings travel with the frame, so the profiler rows stay per frame although the stages overlap
+        """
+        if drop_stale is None:
+            drop_stale = bool(self.stream)
+
+        stop_event = threading.Event()
+        frames = queue.Queue(maxsize=queue_size)
+        detections = queue.Queue(maxsize=queue_size)
+
+        def capture():
+            while self.vid.isOpened() and not stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = self.vid.read()
+                if not ret:
+                    break
+                _put(frames, (frame, {'decode': time.perf_counter() - start}), stop_event, drop_stale)
+            _put(frames, _END_OF_STREAM, stop_event)
+
+        def inference():
+            while True:
+                item = _get(frames, stop_event)
+                if item is _END_OF_STREAM:
+                    break
+                frame, timings = item
                 try:
-                    self.pose_processor.process(self.frame, curls=curls)
+                    frame, results = self.detection_strategy.detect(frame, plot=plot)
                 except Exception as ex:
-                    print(f'pose_processor exception: {ex}')
-
+                    print(f'detection exception: {ex}')
+                    continue
+                timings.update(self.detection_strategy.timings[0])
+                _put(detections, (frame, results, timings), stop_event, drop_stale)
+            _put(detections, _END_OF_STREAM, stop_event)
 
-                if show_fps:
-                    cTime = time.time()
-                    fps = 1 / (cTime - pTime)
-                    pTime = cTime
-                    cv2.putText(self.frame, f'fps: {int(fps)}', (1180, 45), cv2.FONT_HERSHEY_PLAIN, 1.2,
-                                 (255, 255, 255), 2)
+        workers = [threading.Thread(target=capture, name='capture', daemon=True),
+                   threading.Thread(target=inference, name='inference', daemon=True)]
+        for worker in workers:
+            worker.start()
 
-                cv2.imshow(f'AI Trainer: {self.selected_exercise} training', self.frame)
+        # annotate/display stage stays on the calling thread, cv2.imshow has to run on the main thread
+        pTime = 0
+        try:
+            while True:
+                item = _get(detections, stop_event)
+                if item is _END_OF_STREAM:
+                    break
+                self.frame, results, timings = item
+                if self.profiler is not None:
+                    self.profiler.add_timings([timings])
+                self._set_detections(results, plot=plot)
+                pTime = self._annotate_and_show(curls, show_fps, pTime)
 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                if self._finish_frame():
                     break
         except cv2.error as ex:
             print(f'opencv_controller: {ex}')
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join()
 
         self.vid.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+        if self.frame_sink is None:
+            cv2.destroyAllWindows()
@@ -0,0 +1,163 @@
+# quantization_controller.py
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from src.controllers import batch_controller
+from src.strategies import detection_strategy
+from src.strategies import onnx_pose
+
+
+def export_onnx(weights_path, imgsz=320):
+    """exports .pt weights with ultralytics to an .onnx file next to them and returns its path"""
+    from ultralytics import YOLO
+
+    return YOLO(weights_path).export(format='onnx', imgsz=imgsz, simplify=True)
+
+
+def _model_input(path):
+    import onnxruntime as ort
+
+    model_input = ort.InferenceSession(path, providers=['CPUExecutionProvider']).get_inputs()[0]
+    return model_input.name, model_input.shape
+
+
+def sample_frames(video_paths, frames_per_video=50):
+    """frames spread evenly over every video, the calibration and comparison set"""
+    for path in video_paths:
+        vid = cv2.VideoCapture(path)
+        count = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        for index in np.linspace(0, max(count - 1, 0), frames_per_video).astype(int):
+            vid.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = vid.read()
+            if ret:
+                yield frame
+        vid.release()
+
+
+class CalibrationReader:
+    """feeds letterboxed video frames to the onnx runtime calibration, one frame per get_next call"""
+    def __init__(self, video_paths, input_name, size, frames_per_video=50):
+        self.input_name = input_name
+        self.size = size
+        self._frames = sample_frames(video_paths, frames_per_video)
+
+    def get_next(self):
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        return {self.input_name: onnx_pose.letterbox(frame, self.size)[0]}
+
+    def rewind(self):
+        pass
+
+
+def _head_nodes(path, head_prefix):
+    """nodes of the pose head that decode boxes and keypoints, int8 there costs most of the keypoint accuracy"""
+    import onnx
+
+    return [node.name for node in onnx.load(path).graph.node
+            if node.name.startswith(head_prefix) and node.op_type != 'Conv']
+
+
+def quantize(fp32_path, int8_path, video_paths, frames_per_video=50, per_channel=True,
+             head_prefix='/model.22/'):
+    """static int8 quantization of an exported pose model with frames of video_paths as the calibration set.
+    the decoding part of the head (head_prefix, None to quantize everything) stays in fp32
+    """
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    input_name, shape = _model_input(fp32_path)
+    size = shape[2] if isinstance(shape[2], int) else 320
+
+    reader = CalibrationReader(video_paths, input_name, size, frames_per_video)
+    quantize_static(fp32_path, int8_path, reader, quant_format=QuantFormat.QDQ, per_channel=per_channel,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax,
+                    nodes_to_exclude=_head_nodes(fp32_path, head_prefix) if head_prefix else None)
+    return int8_path
+
+
+def _keypoint_errors(reference, quantized, frames):
+    """pixel error of the best person's keypoints visible in both models, relative to the box diagonal,
+    the share of frames where both models agree whether there is a person and the fps of both models
+    """
+    errors, relative, agree = [], [], 0
+    seconds = [0.0, 0.0]
+    for frame in frames:
+        detections = []
+        for i, model in enumerate((reference, quantized)):
+            start = time.perf_counter()
+            detections.append(model.detect(frame)[1])
+            seconds[i] += time.perf_counter() - start
+
+        ref, quant = detections
+        agree += (len(ref) > 0) == (len(quant) > 0)
+        if len(ref) == 0 or len(quant) == 0:
+            continue
+        visible = (ref.xyf[0] != 0).any(axis=1) & (quant.xyf[0] != 0).any(axis=1)
+        if not visible.any():
+            continue
+        distance = np.linalg.norm(ref.xyf[0][visible] - quant.xyf[0][visible], axis=1)
+        diagonal = np.linalg.norm(ref.boxes[0, 2:] - ref.boxes[0, :2])
+        errors.extend(distance.tolist())
+        relative.extend((distance / max(diagonal, 1.0)).tolist())
+
+    return errors, relative, agree, seconds
+
+
+def compare(reference, quantized, video_paths, exercise, level=0, frames_per_video=50):
+    """accuracy and speed of the quantized model against the reference (fp32) model on the same clips.
+    reference and quantized are DetectionStrategy objects with a created model
+    """
+    frames = list(sample_frames(video_paths, frames_per_video))
+    errors, relative, agree, seconds = _keypoint_errors(reference, quantized, frames)
+
+    clips = []
+    for path in video_paths:
+        # score_video runs the rep counter on the frame clock of the video, so the faster model
+        # resets on the same frames and only its keypoints can change the counts
+        ref = batch_controller.score_video(path, exercise, level, batch_size=1, detector=reference)
+        quant = batch_controller.score_video(path, exercise, level, batch_size=1, detector=quantized)
+        clips.append({
+            'video': path,
+            'reference': (ref['correct'], ref['incorrect']),
+            'quantized': (quant['correct'], quant['incorrect']),
+            'same_reps': (ref['correct'], ref['incorrect']) == (quant['correct'], quant['incorrect']),
+            'reference_fps': ref['fps'],
+            'quantized_fps': quant['fps']
+        })
+
+    # None when no frame had a person in both models, there is nothing to measure then
+    keypoint_error_px = keypoint_error_rel = None
+    if errors:
+        errors, relative = np.array(errors), np.array(relative)
+        keypoint_error_px = {'mean': float(errors.mean()), 'p50': float(np.percentile(errors, 50)),
+                             'p95': float(np.percentile(errors, 95)), 'max': float(errors.max())}
+        keypoint_error_rel = {'mean': float(relative.mean()), 'p95': float(np.percentile(relative, 95))}
+    return {
+        'frames': len(frames),
+        'detection_agreement': agree / max(len(frames), 1),
+        'keypoint_error_px': keypoint_error_px,
+        'keypoint_error_rel': keypoint_error_rel,
+        'reference_fps': len(frames) / max(seconds[0], 1e-9),
+        'quantized_fps': len(frames) / max(seconds[1], 1e-9),
+        'speedup': seconds[0] / max(seconds[1], 1e-9),
+        'rep_agreement': sum(clip['same_reps'] for clip in clips) / max(len(clips), 1),
+        'clips': clips
+    }
+
+
+def load_reference(weights_path, imgsz=320, threads=None):
+    """the fp32 model to compare with, .onnx files run through the same runtime as the int8 model"""
+    if weights_path.lower().endswith('.onnx'):
+        return detection_strategy.OnnxPoseStrategy(imgsz=imgsz, weights_path=weights_path,
+                                                   backend='onnxruntime', threads=threads).create_model()
+    return detection_strategy.YOLOStrategy(imgsz=imgsz, weights_path=weights_path).create_model()
+
+
+def default_int8_path(weights_path):
+    return os.path.splitext(weights_path)[0] + '-int8.onnx'
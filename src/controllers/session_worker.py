@@ -0,0 +1,81 @@
+# session_worker.py
+
+import threading
+
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+from PySide6.QtGui import QImage
+
+from src.strategies import detection_strategy
+
+
+class SessionWorker(QThread):
+    """runs OpenCVController.process on its own thread, so the qt event loop stays free during a set.
+
+    every annotated frame is sent to the gui with frame_ready as a QImage that wraps a buffer of the worker
+    without a copy. the buffer has to stay untouched until the gui painted it, so the next frame is only
+    sent after frame_shown() was called, frames in between are analyzed but not shown
+    """
+    frame_ready = Signal(QImage)
+    # correct and incorrect reps when the session ends
+    session_finished = Signal(int, int)
+    failed = Signal(str)
+
+    def __init__(self, controller, process_kwargs=None, parent=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.process_kwargs = process_kwargs or {}
+        self._shown = threading.Event()
+        self._shown.set()
+        self._buffer = None
+        controller.set_frame_sink(self._send)
+
+    def _send(self, frame):
+        if not self._shown.is_set():
+            return
+        self._shown.clear()
+        # the frame itself can be a reused decoder buffer or a shared memory slot, so it is copied once
+        # into a buffer that only changes after the gui is done with it
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty_like(frame)
+        np.copyto(self._buffer, frame)
+        height, width = self._buffer.shape[:2]
+        self.frame_ready.emit(QImage(self._buffer.data, width, height, self._buffer.strides[0],
+                                     QImage.Format_BGR888))
+
+    def frame_shown(self):
+        """called by the gui after it painted the last frame_ready image"""
+        self._shown.set()
+
+    def run(self):
+        try:
+            self.controller.process(**self.process_kwargs)
+        except Exception as ex:
+            print(f'session exception: {ex}')
+            self.failed.emit(str(ex))
+        correct, incorrect = self.controller.pose_processor.get_counts()
+        self.session_finished.emit(int(correct), int(incorrect))
+
+    def stop(self):
+        self.controller.stop()
+
+    def pause(self):
+        self.controller.pause()
+
+    def resume(self):
+        self.controller.resume()
+
+
+class WarmUpWorker(QThread):
+    """loads the model of a detector and runs it once, see MainWindowController.warm_up.
+    the detector is released again when it is done, the model stays in the model registry
+    """
+    def __init__(self, detector_kwargs, parent=None):
+        super().__init__(parent)
+        self.detector_kwargs = detector_kwargs
+
+    def run(self):
+        try:
+            detection_strategy.create_strategy(**self.detector_kwargs).create_model().warm_up().release_model()
+        except Exception as ex:
+            print(f'model warm up failed: {ex}')
@@ -1,6 +1,7 @@
 # settings_controller.py
 
 from PySide6.QtWidgets import QMessageBox, QFileDialog
+from src.models.inference_config import InferenceConfig
 
 class SettingsController:
     def __init__(self, window):
@@ -43,16 +44,42 @@ class SettingsController:
     def chosen_iou(self):
         return self.window.iou.text()
 
-    def clicked_save(self):
-        self.fps, self.plot = self.choose_param()
-        self.settings_dict = {
+    def chosen_device(self):
+        return self.window.device.text()
+
+    def chosen_half(self):
+        return self.window.half.isChecked()
+
+    def chosen_max_det(self):
+        return self.window.max_det.text()
+
+    def _make_settings(self):
+        config = InferenceConfig(
+            imgsz=int(self.chosen_size()),
+            conf=float(self.chosen_conf()),
+            iou=float(self.chosen_iou()),
+            device=self.chosen_device(),
+            half=self.chosen_half(),
+            max_det=int(self.chosen_max_det())
+        )
+        return {
             'path': self.get_path(),
-            'imgsz': int(self.chosen_size()),
-            'conf': float(self.chosen_conf()),
-            'iou': float(self.chosen_iou()),
+            'imgsz': config.imgsz,
+            'conf': config.conf,
+            'iou': config.iou,
+            'config': config,
             'fps': int(self.fps),
             'plot': bool(self.plot)
         }
+
+    def clicked_save(self):
+        self.fps, self.plot = self.choose_param()
+        try:
+            self.settings_dict = self._make_settings()
+        except ValueError as v:
+            print(v)
+            QMessageBox.warning(self.window, "Warning", f"Wrong model settings: {v}")
+            return
         print(self.settings_dict)
 
         self.window.close()
@@ -63,15 +90,11 @@ class SettingsController:
         self.window.imgsz.setText(str(320))
         self.window.conf.setText(str(0.25))
         self.window.iou.setText(str(0.7))
+        self.window.device.setText('cpu')
+        self.window.half.setChecked(False)
+        self.window.max_det.setText(str(300))
 
-        self.settings_dict = {
-            'path': self.get_path(),
-            'imgsz': int(self.chosen_size()),
-            'conf': float(self.chosen_conf()),
-            'iou': float(self.chosen_iou()),
-            'fps': int(self.fps),
-            'plot': bool(self.plot)
-        }
+        self.settings_dict = self._make_settings()
         print(self.settings_dict)
 
     @property
@@ -0,0 +1,163 @@
+# shared_frames.py
+# capture and inference in separate processes: the frames and the keypoints stay in shared memory,
+# only slot numbers go through the queues
+
+import multiprocessing
+import os
+import queue
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.models.keypoints import KeypointRecord, NUM_KEYPOINTS
+from src.strategies import detection_strategy
+
+# every array in the shared block starts on a cache line
+_ALIGN = 64
+
+
+class SharedFrameRing:
+    """preallocated frame slots (slots, h, w, 3) uint8 and the detections of every slot in one shared memory block.
+    the process that creates it (name=None) owns it and unlinks it, the workers attach to it by name.
+
+    max_persons - detections stored per slot, the rest is dropped (the model sorts them by confidence)
+    """
+    def __init__(self, frame_shape, slots, max_persons=300, name=None):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.max_persons = max_persons
+
+        fields = (('frames', (slots,) + self.frame_shape, np.uint8),
+                  ('counts', (slots,), np.int32),
+                  ('xyf', (slots, max_persons, NUM_KEYPOINTS, 2), np.float32),
+                  ('conf', (slots, max_persons, NUM_KEYPOINTS), np.float32),
+                  ('ids', (slots, max_persons), np.int64),
+                  ('boxes', (slots, max_persons, 4), np.float32))
+        offsets, size = [], 0
+        for _, shape, dtype in fields:
+            offsets.append(size)
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // _ALIGN) * _ALIGN
+
+        self.shm = SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self._owner = name is None
+        for (field, shape, dtype), offset in zip(fields, offsets):
+            setattr(self, field, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+
+    @property
+    def spec(self):
+        """arguments to attach to the ring from another process"""
+        return self.frame_shape, self.slots, self.max_persons, self.shm.name
+
+    def frame(self, slot):
+        return self.frames[slot]
+
+    def write_detections(self, slot, detections):
+        count = min(len(detections), self.max_persons)
+        self.xyf[slot, :count] = detections.xyf[:count]
+        self.conf[slot, :count] = detections.conf[:count]
+        self.ids[slot, :count] = detections.ids[:count]
+        self.boxes[slot, :count] = detections.boxes[:count]
+        self.counts[slot] = count
+
+    def read_detections(self, slot):
+        """the detections of a slot as a KeypointRecord of its own, the slot can be reused afterwards"""
+        count = self.counts[slot]
+        return KeypointRecord(self.xyf[slot, :count].copy(), self.conf[slot, :count].copy(),
+                              self.ids[slot, :count].copy(), self.boxes[slot, :count].copy())
+
+    def close(self):
+        # the views have to go before the memory can be closed
+        self.frames = self.counts = self.xyf = self.conf = self.ids = self.boxes = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def _inference_worker(spec, model_kwargs, threads, plot, todo, done):
+    ring = SharedFrameRing(*spec)
+    try:
+        detector = detection_strategy.create_strategy(**model_kwargs)
+        if threads and not isinstance(detector, detection_strategy.OnnxPoseStrategy):
+            import torch
+            torch.set_num_threads(threads)
+        detector.create_model()
+
+        while True:
+            item = todo.get()
+            if item is None:
+                break
+            slot, index = item
+            frame = ring.frame(slot)
+            try:
+                plotted, detections = detector.detect(frame, plot=plot)
+            except Exception as ex:
+                print(f'detection exception: {ex}')
+                plotted, detections = frame, KeypointRecord.empty()
+            if plotted is not frame:
+                frame[...] = plotted
+            ring.write_detections(slot, detections)
+            done.put((slot, index, detector.timings[0] if detector.timings else {}))
+    finally:
+        ring.close()
+
+
+class InferencePool:
+    """inference worker processes around a SharedFrameRing.
+
+    the capturing process takes a free slot (acquire), decodes the frame right into it (ring.frame(slot)),
+    hands it to the workers (submit) and gets the detections back in frame order (result). the slot is
+    given back with release once the frame isn't needed any more.
+    every worker loads its own model from model_kwargs (create_strategy arguments), the detector has to be
+    stateless: the tracker, roi and keyframes need the frames in order and don't work with several workers
+    """
+    def __init__(self, frame_shape, model_kwargs, workers=2, slots=None, threads=None, plot=False, max_persons=300):
+        self.ring = SharedFrameRing(frame_shape, slots or 2 * workers + 2, max_persons)
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+
+        # spawn, torch doesn't survive a fork well
+        context = multiprocessing.get_context('spawn')
+        self._todo = context.Queue()
+        self._done = context.Queue()
+        self._free = list(range(self.ring.slots))
+        self._results = {}
+        self._processes = [context.Process(target=_inference_worker, name=f'inference-{i}', daemon=True,
+                                           args=(self.ring.spec, model_kwargs, threads, plot, self._todo, self._done))
+                           for i in range(workers)]
+        for process in self._processes:
+            process.start()
+
+    def has_free_slot(self):
+        return bool(self._free)
+
+    def acquire(self):
+        return self._free.pop()
+
+    def release(self, slot):
+        self._free.append(slot)
+
+    def submit(self, slot, index):
+        self._todo.put((slot, index))
+
+    def result(self, index):
+        """waits for the frame with the given index, returns its slot, detections and stage timings"""
+        while index not in self._results:
+            try:
+                slot, done_index, timings = self._done.get(timeout=1.0)
+            except queue.Empty:
+                dead = [process for process in self._processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f'inference worker {dead[0].name} exited with code {dead[0].exitcode}')
+                continue
+            self._results[done_index] = (slot, timings)
+        slot, timings = self._results.pop(index)
+        return slot, self.ring.read_detections(slot), timings
+
+    def close(self):
+        for _ in self._processes:
+            self._todo.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
@@ -0,0 +1,271 @@
+# stream_server.py
+
+import queue
+import threading
+import time
+from collections import deque
+
+from src.controllers import opencv_controller
+from src.models.keypoints import KeypointRecord
+from src.strategies import angle_calculation_strategy
+from src.strategies import detection_strategy
+
+# marks the end of a stream in its queues
+_END_OF_STREAM = object()
+
+
+class Stream:
+    """one camera or video file of a StreamServer with its own OpenCVController, so its own pose processor,
+    exercise state and keypoint filter. the controller's detection strategy only holds the keypoints of this
+    stream, the model is the server's.
+
+    a camera drops its oldest waiting frame when the model is behind, a video file waits instead
+    """
+    def __init__(self, name, source, exercise, level=0, queue_size=2, keypoint_filter=None, curls=None,
+                 plot=False, render=False):
+        self.name = name
+        self.source = source
+        self.live = isinstance(source, int)
+        self.curls = curls
+        self.plot = plot
+        self.render = render
+
+        self.controller = opencv_controller.OpenCVController(detection_strategy.YOLOStrategy(),
+                                                             angle_calculation_strategy.Angle2DCalculation(),
+                                                             exercise)
+        if self.live:
+            self.controller.setup(stream=1, level=level, keypoint_filter=keypoint_filter, camera_index=source)
+        else:
+            self.controller.setup(stream=0, level=level, video_path=source, keypoint_filter=keypoint_filter)
+        # the last annotated frame, shown by the server's caller
+        self.latest_frame = None
+        self.controller.set_frame_sink(self._keep_frame)
+
+        # captured frames waiting for the model and detected frames waiting for the pose processor
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        # set while a frame of this stream is in a batch, so a stream never has two frames in flight
+        self.in_flight = False
+        self.ended = threading.Event()
+
+        self.frames_done = 0
+        self.dropped = 0
+        self._times = deque(maxlen=30)
+        self._threads = []
+
+    def _keep_frame(self, frame):
+        self.latest_frame = frame
+
+    def start(self, on_frame):
+        """starts capturing and analyzing, on_frame() is called after every captured frame"""
+        self._threads = [threading.Thread(target=self._capture, args=(on_frame,), name=f'{self.name}-capture',
+                                          daemon=True),
+                         threading.Thread(target=self._analyze, name=f'{self.name}-analysis', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def _capture(self, on_frame):
+        vid = self.controller.vid
+        while vid.isOpened() and not self.ended.is_set():
+            ret, frame = vid.read()
+            if not ret:
+                break
+            if self.live:
+                while True:
+                    try:
+                        self.frames.put_nowait(frame)
+                        break
+                    except queue.Full:
+                        try:
+                            self.frames.get_nowait()
+                            self.dropped += 1
+                        except queue.Empty:
+                            pass
+            else:
+                self._put(frame)
+            on_frame()
+        vid.release()
+        # a stopped server doesn't take frames any more, the end marker must not block then either
+        self._put(_END_OF_STREAM)
+        on_frame()
+
+    def _put(self, item):
+        while not self.ended.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _analyze(self):
+        while True:
+            item = self.results.get()
+            if item is _END_OF_STREAM:
+                break
+            frame, detections = item
+            self.controller.analyze_frame(frame, detections, plot=self.plot, curls=self.curls, render=self.render)
+            self.frames_done += 1
+            self._times.append(time.perf_counter())
+        self.ended.set()
+
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / max(self._times[-1] - self._times[0], 1e-9)
+
+    def stats(self):
+        correct, incorrect = self.controller.pose_processor.get_counts()
+        return {
+            'name': self.name,
+            'source': self.source,
+            'exercise': self.controller.selected_exercise,
+            'fps': self.fps(),
+            'queue_depth': self.frames.qsize() + self.results.qsize(),
+            'frames': self.frames_done,
+            'dropped': self.dropped,
+            'correct': int(correct),
+            'incorrect': int(incorrect),
+            'ended': self.ended.is_set()
+        }
+
+
+class StreamServer:
+    """runs many streams at once on one model (or a small pool of them).
+
+    a scheduler thread per model takes the waiting frame of every ready stream, up to max_batch, and runs
+    them through the model in one detect_batch call. it waits up to max_wait seconds for more streams
+    to become ready when the batch isn't full. the shared model has to be stateless (no tracker, roi or
+    keyframes), everything that belongs to one person lives in the stream.
+    every scheduler has a model of its own (an own instance in the model registry), a model is never
+    called from two threads at once
+    """
+    def __init__(self, model_kwargs=None, models=1, max_batch=8, max_wait=0.01):
+        self.model_kwargs = model_kwargs or {}
+        self.detectors = [detection_strategy.create_strategy(**self.model_kwargs) for _ in range(models)]
+        for instance, detector in enumerate(self.detectors):
+            detector.model_instance = instance
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.streams = []
+
+        self._ready = threading.Condition()
+        self._cursor = 0
+        self._stop_event = threading.Event()
+        self._schedulers = []
+        self.batches = 0
+        self.batched_frames = 0
+
+    def add_stream(self, source, exercise, level=0, name=None, **kwargs):
+        """source is a camera index or a video path, kwargs go to Stream"""
+        stream = Stream(name or f'stream-{len(self.streams)}', source, exercise, level, **kwargs)
+        self.streams.append(stream)
+        return stream
+
+    def start(self):
+        for detector in self.detectors:
+            detector.create_model().warm_up()
+        for stream in self.streams:
+            stream.start(self._notify)
+        self._schedulers = [threading.Thread(target=self._schedule, args=(detector,), name=f'scheduler-{i}',
+                                             daemon=True)
+                            for i, detector in enumerate(self.detectors)]
+        for thread in self._schedulers:
+            thread.start()
+        return self
+
+    def _notify(self):
+        with self._ready:
+            self._ready.notify_all()
+
+    def _take_ready(self, batch, ended):
+        """moves the waiting frames of streams without a frame in flight into batch, round robin"""
+        count = len(self.streams)
+        for i in range(count):
+            if len(batch) >= self.max_batch:
+                break
+            stream = self.streams[(self._cursor + i) % count]
+            if stream.in_flight:
+                continue
+            try:
+                item = stream.frames.get_nowait()
+            except queue.Empty:
+                continue
+            if item is _END_OF_STREAM:
+                ended.append(stream)
+                continue
+            stream.in_flight = True
+            batch.append((stream, item))
+        self._cursor = (self._cursor + 1) % max(count, 1)
+
+    def _next_batch(self):
+        batch, ended = [], []
+        with self._ready:
+            while not batch and not ended and not self._stop_event.is_set():
+                self._take_ready(batch, ended)
+                if not batch and not ended:
+                    self._ready.wait(timeout=0.1)
+                    if all(stream.ended.is_set() for stream in self.streams):
+                        break
+
+            # a few more milliseconds for the other streams, a fuller batch uses the model better
+            waiting = sum(not stream.in_flight and not stream.ended.is_set() for stream in self.streams)
+            deadline = time.perf_counter() + self.max_wait
+            while batch and len(batch) < self.max_batch and waiting and not self._stop_event.is_set():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._ready.wait(timeout=remaining)
+                before = len(batch)
+                self._take_ready(batch, ended)
+                waiting -= len(batch) - before
+        return batch, ended
+
+    def _schedule(self, detector):
+        while not self._stop_event.is_set():
+            batch, ended = self._next_batch()
+            for stream in ended:
+                stream.results.put(_END_OF_STREAM)
+            if not batch:
+                if all(stream.ended.is_set() for stream in self.streams):
+                    break
+                continue
+
+            try:
+                results = detector.detect_batch([frame for _, frame in batch])
+            except Exception as ex:
+                print(f'detection exception: {ex}')
+                results = [(frame, KeypointRecord.empty()) for _, frame in batch]
+            for (stream, _), result in zip(batch, results):
+                stream.results.put(result)
+            with self._ready:
+                self.batches += 1
+                self.batched_frames += len(batch)
+                for stream, _ in batch:
+                    stream.in_flight = False
+                self._ready.notify_all()
+
+    def stats(self):
+        """per stream fps, queue depth and counts, and the mean batch size of the model calls"""
+        return {
+            'streams': [stream.stats() for stream in self.streams],
+            'batches': self.batches,
+            'mean_batch': self.batched_frames / self.batches if self.batches else 0.0
+        }
+
+    def running(self):
+        return not all(stream.ended.is_set() for stream in self.streams)
+
+    def stop(self):
+        self._stop_event.set()
+        for stream in self.streams:
+            stream.ended.set()
+            try:
+                stream.results.put_nowait(_END_OF_STREAM)
+            except queue.Full:
+                pass
+        self._notify()
+        for thread in self._schedulers:
+            thread.join(timeout=5)
+        for detector in self.detectors:
+            detector.release_model()
@@ -1,148 +1,34 @@
 # exercise.py
 
-from abc import ABC, abstractmethod
+from src.models.exercise_spec import load_spec, check_spec, get_thresholds, StateClassifier
 
-class Exercise:
-    def __init__(self):
-        # name, parameters maybe
-        # Инициализация упражнения
-        pass
-
-    @abstractmethod
-    def _get_thresholds_beginner(self):
-        pass
-
-    @abstractmethod
-    def _get_thresholds_pro(self):
-        pass
-    
-    @abstractmethod
-    def get_thresholds(self):
-        pass
-
-class SquatExercise(Exercise):
-
-    def __init__(self, level=0):
-        super().__init__()
-
-        self.thresholds = None
-        self._ANGLE_HIP_KNEE_VERT_BEGINNER = {
-            'NORMAL': (0, 32),
-            'TRANS': (35, 65),
-            'PASS': (70, 95)
-        }
-        self.thresholds_beginner = {
-            'HIP_KNEE_VERT': self._ANGLE_HIP_KNEE_VERT_BEGINNER,
-
-            'HIP_THRESH': [10, 50],
-            'ANKLE_THRESH': 45,
-            'KNEE_THRESH': [50, 70, 95],
-
-            'OFFSET_THRESH': 45.0,
-            'INACTIVE_THRESH': 25.0,
-
-            'CNT_FRAME_THRESH': 50
-        }
-
-        self._ANGLE_HIP_KNEE_VERT_PRO = {
-            'NORMAL': (0, 32),
-            'TRANS': (35, 65),
-            'PASS': (80, 95)
-        }
-        self.thresholds_pro = {
-            'HIP_KNEE_VERT': self._ANGLE_HIP_KNEE_VERT_PRO,
-
-            'HIP_THRESH': [15, 50],
-            'ANKLE_THRESH': 30,
-            'KNEE_THRESH': [50, 80, 95],
-
-            'OFFSET_THRESH': 45.0,
-            'INACTIVE_THRESH': 15.0,
-
-            'CNT_FRAME_THRESH': 50
-
-        }
-        
-        self.set_level(level)
 
-    def set_level(self, level=0):
-        """setting the level of difficulty, 
-        where 
-        0 = beginner, 1 = pro
-        """    
-        if level:
-            self.thresholds = self.thresholds_pro
+class Exercise:
+    """exercise built from a spec of src/models/exercises (or any .yaml/.json file with the same layout),
+    a new exercise needs a spec and no subclass: Exercise('lunges', level)
+    """
+    # spec the subclasses load when no spec is given
+    SPEC = None
+
+    def __init__(self, spec=None, level=0):
+        # spec - name of a spec in src/models/exercises, path to a spec file or an already loaded spec dict
+        spec = self.SPEC if spec is None else spec
+        if isinstance(spec, dict):
+            check_spec(spec)
         else:
-            self.thresholds = self.thresholds_beginner
+            spec = load_spec(spec)
 
-    def _get_thresholds_beginner(self):
-        return self.thresholds_beginner
-
-    def _get_thresholds_pro(self):
-        return self.thresholds_pro
-    
-    def get_thresholds(self):
-        return self.thresholds
-
-    def get_state(self, knee_angle):
-
-        knee = None
-
-        if self.thresholds['HIP_KNEE_VERT']['NORMAL'][0] <= knee_angle <= self.thresholds['HIP_KNEE_VERT']['NORMAL'][1]:
-            knee = 1
-        elif self.thresholds['HIP_KNEE_VERT']['TRANS'][0] <= knee_angle <= self.thresholds['HIP_KNEE_VERT']['TRANS'][1]:
-            knee = 2
-        elif self.thresholds['HIP_KNEE_VERT']['PASS'][0] <= knee_angle <= self.thresholds['HIP_KNEE_VERT']['PASS'][1]:
-            knee = 3
-
-        return f's{knee}' if knee else None
-
-    def _update_state_sequence(self, state, state_tracker):
-        if state == 's2':
-            if (('s3' not in state_tracker['state_seq']) and (state_tracker['state_seq'].count('s2')) == 0) or \
-                    (('s3' in state_tracker['state_seq']) and (state_tracker['state_seq'].count('s2') == 1)):
-                state_tracker['state_seq'].append(state)
-
-        elif state == 's3':
-            if (state not in state_tracker['state_seq']) and 's2' in state_tracker['state_seq']:
-                state_tracker['state_seq'].append(state)
-
-class DumbellExercise(Exercise):
-    def __init__(self, level=0):
-        super().__init__()
+        self.spec = spec
+        self.name = spec.get('name')
+        self.state_angle = spec['state_angle']
 
         self.thresholds = None
-        self._ANGLE_HIP_KNEE_VERT_BEGINNER = {
-            'NORMAL': (180, 110),
-            'TRANS': (110, 70),
-            'PASS': (70, 60)
-        }
-        self.thresholds_beginner = {
-            'SHLDR_ELBOW_WRIST': self._ANGLE_HIP_KNEE_VERT_BEGINNER,
-
-            'ELBOW_THRESH': [50, 60],
-            'HAND_THRESH': [12, 20, 35],
-
-            'OFFSET_THRESH': 45.0,
-            'INACTIVE_THRESH': 25.0,
-            'CNT_FRAME_THRESH': 50
-        }
-
-        self._ANGLE_HIP_KNEE_VERT_PRO = {
-            'NORMAL': (180, 110),
-            'TRANS': (110, 60),
-            'PASS': (60, 50)
-        }
-        self.thresholds_pro = {
-            'SHLDR_ELBOW_WRIST': self._ANGLE_HIP_KNEE_VERT_PRO,
-
-            'ELBOW_THRESH': [50, 60],
-            'HAND_THRESH': [12, 20, 35],
-
-            'OFFSET_THRESH': 45.0,
-            'INACTIVE_THRESH': 25.0,
-            'CNT_FRAME_THRESH': 50
-        }
+        self.thresholds_beginner = get_thresholds(spec, 0)
+        self.thresholds_pro = get_thresholds(spec, 1)
+
+        self.classifier = None
+        self._classifiers = (StateClassifier.from_thresholds(self.thresholds_beginner, self.state_angle),
+                             StateClassifier.from_thresholds(self.thresholds_pro, self.state_angle))
 
         self.set_level(level)
 
@@ -153,8 +39,10 @@ class DumbellExercise(Exercise):
         """
         if level:
             self.thresholds = self.thresholds_pro
+            self.classifier = self._classifiers[1]
         else:
             self.thresholds = self.thresholds_beginner
+            self.classifier = self._classifiers[0]
 
     def _get_thresholds_beginner(self):
         return self.thresholds_beginner
@@ -165,25 +53,25 @@ class DumbellExercise(Exercise):
     def get_thresholds(self):
         return self.thresholds
 
-    def get_state(self, elbow_angle):
+    def get_state(self, angle):
+        """NO_STATE, S1, S2 or S3 for the angle of state_angle,
+        an array of angles gives an array of states
+        """
+        return self.classifier.classify(angle)
 
-        elbow = None
+    def _update_state_sequence(self, state, state_tracker):
+        state_tracker.update_state_sequence(state)
 
-        if self.thresholds['SHLDR_ELBOW_WRIST']['NORMAL'][0] >= elbow_angle >= self.thresholds['SHLDR_ELBOW_WRIST']['NORMAL'][1]:
-            elbow = 1
-        elif self.thresholds['SHLDR_ELBOW_WRIST']['TRANS'][0] >= elbow_angle >= self.thresholds['SHLDR_ELBOW_WRIST']['TRANS'][1]:
-            elbow = 2
-        elif self.thresholds['SHLDR_ELBOW_WRIST']['PASS'][0] >= elbow_angle >= self.thresholds['SHLDR_ELBOW_WRIST']['PASS'][1]:
-            elbow = 3
 
-        return f's{elbow}' if elbow else None
+class SquatExercise(Exercise):
+    SPEC = 'squats'
 
-    def _update_state_sequence(self, state, state_tracker):
-        if state == 's2':
-            if (('s3' not in state_tracker['state_seq']) and (state_tracker['state_seq'].count('s2')) == 0) or \
-                    (('s3' in state_tracker['state_seq']) and (state_tracker['state_seq'].count('s2') == 1)):
-                state_tracker['state_seq'].append(state)
-
-        elif state == 's3':
-            if (state not in state_tracker['state_seq']) and 's2' in state_tracker['state_seq']:
-                state_tracker['state_seq'].append(state)
\ No newline at end of file
+    def __init__(self, level=0):
+        super().__init__(level=level)
+
+
+class DumbellExercise(Exercise):
+    SPEC = 'dumbbell'
+
+    def __init__(self, level=0):
+        super().__init__(level=level)
@@ -0,0 +1,98 @@
+# exercise_spec.py
+
+import bisect
+import json
+import os
+
+import numpy as np
+import yaml
+
+from src.models.state_tracker import NO_STATE, S1, S2, S3
+
+SPEC_DIR = os.path.join(os.path.dirname(__file__), 'exercises')
+
+# spec level names, the index is the level passed to the exercises (0 = beginner, 1 = pro)
+LEVELS = ('beginner', 'pro')
+
+# names of the angle bands in the spec and the state each band stands for
+STATE_BANDS = (('NORMAL', S1), ('TRANS', S2), ('PASS', S3))
+
+
+def load_spec(name):
+    """loads an exercise spec, name is a file of SPEC_DIR without extension or a path to a .yaml/.json file"""
+    path = name
+    if not os.path.isfile(path):
+        path = os.path.join(SPEC_DIR, f'{name}.yaml')
+    with open(path) as file:
+        if path.lower().endswith('.json'):
+            spec = json.load(file)
+        else:
+            spec = yaml.safe_load(file)
+    check_spec(spec, path)
+    return spec
+
+
+def check_spec(spec, source='exercise spec'):
+    if 'state_angle' not in spec or 'levels' not in spec:
+        raise ValueError(f'{source}: needs state_angle and levels')
+    for level in LEVELS:
+        bands = spec['levels'].get(level, {}).get(spec['state_angle'])
+        if not bands or any(band not in bands for band, _ in STATE_BANDS):
+            raise ValueError(f'{source}: level {level} needs {spec["state_angle"]} with '
+                             f'{", ".join(band for band, _ in STATE_BANDS)}')
+
+
+def get_thresholds(spec, level):
+    """thresholds of one level in the same layout the pose processors read them,
+    the state bands become tuples"""
+    thresholds = dict(spec['levels'][LEVELS[level]])
+    thresholds[spec['state_angle']] = {band: tuple(bounds) for band, bounds in thresholds[spec['state_angle']].items()}
+    return thresholds
+
+
+class StateClassifier:
+    """maps an angle to the state of the first band containing it, NO_STATE if there is none.
+
+    the band ends are inclusive and can be given in any order, (180, 110) is the same band as (110, 180).
+    on compile every band end becomes an edge, so an angle is either exactly on an edge or in the
+    gap between two edges and both get their state precomputed: a lookup is one binary search
+    """
+    def __init__(self, bands):
+        # bands - [(state, (end, end)), ...], earlier bands win where they overlap
+        bands = [(state, min(bounds), max(bounds)) for state, bounds in bands]
+
+        self.edges = np.unique([end for _, low, high in bands for end in (low, high)]).astype(np.float64)
+
+        def first_match(angle):
+            return next((state for state, low, high in bands if low <= angle <= high), NO_STATE)
+
+        midpoints = (self.edges[:-1] + self.edges[1:]) / 2
+        # edge_states[i] - the state on edges[i], gap_states[i] - the state between edges[i - 1] and edges[i]
+        self.edge_states = np.array([first_match(edge) for edge in self.edges], dtype=np.int64)
+        self.gap_states = np.array([NO_STATE] + [first_match(mid) for mid in midpoints] + [NO_STATE],
+                                   dtype=np.int64)
+
+        # plain python copies for single angles, numpy has too much overhead for one value per frame
+        self._edges = self.edges.tolist()
+        self._edge_states = self.edge_states.tolist()
+        self._gap_states = self.gap_states.tolist()
+
+    @classmethod
+    def from_thresholds(cls, thresholds, state_angle):
+        return cls([(state, thresholds[state_angle][band]) for band, state in STATE_BANDS])
+
+    def classify(self, angles):
+        """state of one angle or an array of states of an angle array"""
+        if np.ndim(angles) == 0:
+            i = bisect.bisect_left(self._edges, angles)
+            if i < len(self._edges) and self._edges[i] == angles:
+                return self._edge_states[i]
+            # nan ends up here as well and gets NO_STATE, comparisons with nan are always false
+            return self._gap_states[i] if angles == angles else NO_STATE
+
+        angles = np.asarray(angles, dtype=np.float64)
+        i = np.searchsorted(self.edges, angles)
+        on_edge = self.edges[np.minimum(i, len(self.edges) - 1)] == angles
+        states = np.where(on_edge, self.edge_states[np.minimum(i, len(self.edges) - 1)], self.gap_states[i])
+        states[np.isnan(angles)] = NO_STATE
+        return states
@@ -0,0 +1,119 @@
+# frame_profiler.py
+
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# stages of one frame in the order they run:
+# decode      - VideoCapture.read
+# preprocess  - resize/letterbox of the model input
+# forward     - the model itself
+# postprocess - nms and the decoding of the boxes and keypoints
+# flow        - optical flow instead of the model on frames between keyframes
+# keypoints   - KeypointRecord conversion and the keypoint filter
+# analysis    - angles and the state of the rep counter
+# overlay     - everything drawn on the frame
+# display     - imshow and waitKey
+STAGES = ('decode', 'preprocess', 'forward', 'postprocess', 'flow', 'keypoints', 'analysis', 'overlay', 'display')
+
+PERCENTILES = (50, 95, 99)
+
+
+class FrameProfiler:
+    """per-stage timings of the last capacity frames in a ring buffer, in milliseconds.
+
+    timings are added to the frame being processed until end_frame() stores it. a batch decodes or runs
+    the model for frames that are processed later, their timings go to frame=1, 2, ... frames ahead.
+    stages that didn't run on a frame are 0, e.g. forward on frames between keyframes
+    """
+    def __init__(self, capacity=1000, stages=STAGES):
+        self.capacity = capacity
+        self.stages = tuple(stages)
+        self._columns = {stage: i for i, stage in enumerate(self.stages)}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._times = np.zeros((self.capacity, len(self.stages)), dtype=np.float64)
+            self._next = 0
+            self._count = 0
+            # rows of the current and the upcoming frames
+            self._pending = deque()
+
+    def add(self, stage, seconds, frame=0):
+        """adds seconds to a stage of the current frame, or of the frame-th frame after it"""
+        column = self._columns[stage]
+        with self._lock:
+            while len(self._pending) <= frame:
+                self._pending.append(np.zeros(len(self.stages), dtype=np.float64))
+            self._pending[frame][column] += seconds * 1000.0
+
+    def add_timings(self, timings, first=0):
+        """adds a list of {stage: seconds} dicts, one per frame, starting frame first frames ahead"""
+        for i, frame_timings in enumerate(timings):
+            for stage, seconds in frame_timings.items():
+                self.add(stage, seconds, first + i)
+
+    def since(self, stage, start, frame=0):
+        """adds the time since start (a time.perf_counter value), returns the current time"""
+        now = time.perf_counter()
+        self.add(stage, now - start, frame)
+        return now
+
+    def end_frame(self):
+        """stores the current frame in the ring buffer"""
+        with self._lock:
+            row = self._pending.popleft() if self._pending else np.zeros(len(self.stages), dtype=np.float64)
+            self._times[self._next] = row
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def __len__(self):
+        return self._count
+
+    def timings(self):
+        """(frames, stages) array of the stored frames, oldest first"""
+        with self._lock:
+            if self._count < self.capacity:
+                return self._times[:self._count].copy()
+            return np.roll(self._times, -self._next, axis=0)
+
+    def summary(self):
+        """mean, p50, p95, p99 and max of every stage and of the whole frame, in milliseconds"""
+        times = self.timings()
+        if not len(times):
+            return {'frames': 0}
+        times = np.column_stack((times, times.sum(axis=1)))
+
+        percentiles = np.percentile(times, PERCENTILES, axis=0)
+        summary = {'frames': len(times)}
+        for i, stage in enumerate(self.stages + ('total',)):
+            summary[stage] = {'mean': float(times[:, i].mean()), 'max': float(times[:, i].max())}
+            summary[stage].update({f'p{p}': float(value) for p, value in zip(PERCENTILES, percentiles[:, i])})
+        return summary
+
+    def to_csv(self, path):
+        """every stored frame as a row, the stage timings in milliseconds"""
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('frame',) + self.stages + ('total',))
+            for i, row in enumerate(self.timings()):
+                writer.writerow([i] + [f'{value:.3f}' for value in row] + [f'{row.sum():.3f}'])
+
+    def to_json(self, path):
+        """the summary and the stage timings of every stored frame"""
+        with open(path, 'w') as file:
+            json.dump({'summary': self.summary(), 'stages': list(self.stages),
+                       'frames': np.round(self.timings(), 3).tolist()}, file, indent=2)
+
+    def export(self, path):
+        """to_csv or to_json, chosen by the extension of path"""
+        if path.lower().endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
@@ -0,0 +1,36 @@
+# inference_config.py
+
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class InferenceConfig:
+    """arguments of every model call. the settings window fills it in (SettingsController.clicked_save)
+    and YOLOStrategy passes it to the model on each frame
+
+    device  - 'cpu', 'cuda', 'cuda:0', 'mps', ...
+    half    - fp16 inference, only has an effect on gpu
+    max_det - maximum number of people per frame, 1 is enough for a single user station
+    """
+    imgsz: int = 320
+    conf: float = 0.25
+    iou: float = 0.7
+    device: str = 'cpu'
+    half: bool = False
+    max_det: int = 300
+
+    def __post_init__(self):
+        self.imgsz = int(self.imgsz)
+        self.conf = float(self.conf)
+        self.iou = float(self.iou)
+        self.device = str(self.device).strip() or 'cpu'
+        self.half = bool(self.half)
+        self.max_det = int(self.max_det)
+        if self.imgsz <= 0 or self.max_det <= 0:
+            raise ValueError('imgsz and max_det have to be positive')
+        if not (0 <= self.conf <= 1 and 0 <= self.iou <= 1):
+            raise ValueError('conf and iou have to be between 0 and 1')
+
+    def predict_kwargs(self):
+        """keyword arguments for the ultralytics model call"""
+        return asdict(self)
@@ -0,0 +1,127 @@
+# keypoint_cache.py
+# raw keypoints of every frame of a video on disk, so a video can be scored again (other thresholds,
+# level or keypoint filter) without decoding it and running the model
+
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.models.keypoints import KeypointRecord, NUM_KEYPOINTS
+
+# arrays of one cache entry, the persons of all frames one after another, offsets says where a frame starts
+_FIELDS = ('offsets', 'xyf', 'conf', 'ids', 'boxes')
+
+
+@functools.lru_cache(maxsize=64)
+def _file_hash(path, size, mtime):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(functools.partial(file.read, 1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    """sha1 of the file contents, a file is hashed once per process as long as it doesn't change"""
+    stat = os.stat(path)
+    return _file_hash(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+class CachedKeypoints:
+    """the KeypointRecords of every frame of a cache entry, the arrays are memory-mapped and read lazily"""
+    def __init__(self, directory):
+        arrays = {field: np.load(os.path.join(directory, field + '.npy'), mmap_mode='r') for field in _FIELDS}
+        self.offsets = arrays['offsets']
+        self.xyf = arrays['xyf']
+        self.conf = arrays['conf']
+        self.ids = arrays['ids']
+        self.boxes = arrays['boxes']
+        with open(os.path.join(directory, 'meta.json')) as file:
+            self.meta = json.load(file)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, frame):
+        start, end = self.offsets[frame], self.offsets[frame + 1]
+        return KeypointRecord(self.xyf[start:end], self.conf[start:end], self.ids[start:end], self.boxes[start:end])
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self[frame]
+
+
+class KeypointCache:
+    """a directory of cache entries, one per video and detector.
+
+    the key of an entry is the hash of the video file and of everything that changes what the model outputs:
+    the weights (by content), imgsz, conf, iou, max_det, half, tracking, roi, keyframes and the frame stride.
+    an entry holds the keypoints before the keypoint filter, so the filter can change between runs
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def describe(video_path, detector, stride=1):
+        """everything the key is made of"""
+        kwargs = detector.spawn_kwargs()
+        kwargs.pop('threads', None)
+        config = dataclasses.asdict(kwargs.pop('config'))
+        # the device doesn't change the result, fp16 does
+        del config['device']
+        weights = kwargs.pop('weights_path')
+        kwargs.update(config)
+        kwargs.update(video=file_hash(video_path), weights=os.path.basename(weights),
+                      weights_hash=file_hash(weights) if os.path.exists(weights) else None, stride=stride)
+        return kwargs
+
+    def key(self, video_path, detector, stride=1):
+        description = json.dumps(self.describe(video_path, detector, stride), sort_keys=True)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        """the CachedKeypoints of key or None when there is no such entry"""
+        path = self._path(key)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        return CachedKeypoints(path)
+
+    def save(self, key, records, meta=None):
+        """writes the KeypointRecords of every frame as the entry of key, replacing an older one"""
+        counts = np.array([len(record) for record in records], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        def stacked(field, shape, dtype):
+            arrays = [getattr(record, field) for record in records if len(record)]
+            return np.concatenate(arrays).astype(dtype) if arrays else np.zeros((0,) + shape, dtype=dtype)
+
+        arrays = {'offsets': offsets,
+                  'xyf': stacked('xyf', (NUM_KEYPOINTS, 2), np.float32),
+                  'conf': stacked('conf', (NUM_KEYPOINTS,), np.float32),
+                  'ids': stacked('ids', (), np.int64),
+                  'boxes': stacked('boxes', (4,), np.float32)}
+
+        # written next to the entry and renamed, a reader never sees half of it
+        os.makedirs(self.directory, exist_ok=True)
+        temp = tempfile.mkdtemp(dir=self.directory, prefix='.' + key)
+        try:
+            for field, array in arrays.items():
+                np.save(os.path.join(temp, field + '.npy'), array)
+            with open(os.path.join(temp, 'meta.json'), 'w') as file:
+                json.dump(dict(meta or {}, frames=len(records)), file, indent=2)
+            path = self._path(key)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(temp, path)
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
@@ -0,0 +1,76 @@
+# keypoints.py
+
+import numpy as np
+
+# number of keypoints in the COCO pose layout used by the yolov8-pose models
+NUM_KEYPOINTS = 17
+
+
+class KeypointRecord:
+    """keypoints of every person found on one frame, built once per frame and never changed afterwards
+
+    xy   - (persons, 17, 2) int32, truncated pixel coordinates the pose processors measure and draw with
+    xyf  - (persons, 17, 2) float32, sub-pixel coordinates
+    conf - (persons, 17) float32, keypoint confidences
+    ids  - (persons,) int64 track ids, -1 when the person isn't tracked
+    boxes - (persons, 4) float32 person boxes as x1, y1, x2, y2
+    """
+    __slots__ = ('xy', 'xyf', 'conf', 'ids', 'boxes')
+
+    def __init__(self, xyf, conf=None, ids=None, boxes=None):
+        xyf = np.ascontiguousarray(xyf, dtype=np.float32).reshape(-1, NUM_KEYPOINTS, 2)
+        persons = len(xyf)
+        if conf is None:
+            conf = np.ones(xyf.shape[:2], dtype=np.float32)
+        conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(xyf.shape[:2])
+        if ids is None:
+            ids = np.full(persons, -1, dtype=np.int64)
+        ids = np.ascontiguousarray(ids, dtype=np.int64).reshape(persons)
+        if boxes is None:
+            boxes = _boxes_from_keypoints(xyf)
+        boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(persons, 4)
+        # astype truncates towards zero, same as torch's .to(int)
+        xy = xyf.astype(np.int32)
+
+        for array in (xy, xyf, conf, ids, boxes):
+            array.setflags(write=False)
+        object.__setattr__(self, 'xy', xy)
+        object.__setattr__(self, 'xyf', xyf)
+        object.__setattr__(self, 'conf', conf)
+        object.__setattr__(self, 'ids', ids)
+        object.__setattr__(self, 'boxes', boxes)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('KeypointRecord is immutable')
+
+    def __len__(self):
+        return len(self.xy)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, NUM_KEYPOINTS, 2), dtype=np.float32))
+
+    @classmethod
+    def from_result(cls, result):
+        """converts one ultralytics Results object, the tensors are moved to numpy only here"""
+        keypoints = result.keypoints
+        if keypoints is None or keypoints.xy.shape[1] == 0:
+            return cls.empty()
+        conf = keypoints.conf.cpu().numpy() if keypoints.conf is not None else None
+        ids = boxes = None
+        if result.boxes is not None:
+            boxes = result.boxes.xyxy.cpu().numpy()
+            if result.boxes.id is not None:
+                ids = result.boxes.id.cpu().numpy()
+        return cls(keypoints.xy.cpu().numpy(), conf, ids, boxes)
+
+
+def _boxes_from_keypoints(xyf):
+    """bounding boxes of the detected keypoints, (0, 0) keypoints are the ones the model didn't find"""
+    boxes = np.zeros((len(xyf), 4), dtype=np.float32)
+    for i, person in enumerate(xyf):
+        found = person[(person != 0).any(axis=1)]
+        if len(found):
+            boxes[i, :2] = found.min(axis=0)
+            boxes[i, 2:] = found.max(axis=0)
+    return boxes
@@ -1,8 +1,34 @@
 # opencv_elements.py
 
+import threading
+from collections import OrderedDict
+
 import cv2
+import numpy as np
+
+
+class _Label:
+    """label rendered once, blended into frames with its alpha mask"""
+    __slots__ = ('dx', 'dy', 'color', 'mask', 'alpha', 'edge', 'text_size')
+
+    def __init__(self, dx, dy, color, alpha, text_size):
+        # offset of the patch from the text position
+        self.dx = dx
+        self.dy = dy
+        self.color = color
+        self.alpha = alpha
+        # fully covered pixels are copied, only the anti-aliased edge outside the box is blended
+        self.mask = (alpha == 255).astype(np.uint8)
+        self.edge = np.nonzero((alpha > 0) & (alpha < 255))
+        self.text_size = text_size
+
 
 class OpenCVElements:
+    # LRU cache of rendered labels for draw_text, most strings are the same every frame
+    label_cache_size = 128
+    _label_cache = OrderedDict()
+    _label_cache_lock = threading.Lock()
+
     @staticmethod
     def draw_rounded_rect(frame, rect_start, rect_end, corner_width, box_color, increased_size=0):
         """method for drawing rounded rectangle"""
@@ -59,8 +85,16 @@ class OpenCVElements:
             text_color=(0, 255, 0),
             text_color_bg=(0, 0, 0),
             box_offset=(20, 10),
-            increased_size=0
+            increased_size=0,
+            cache=True
     ):
+        if cache and frame.ndim == 3 and frame.shape[2] == 3 and frame.dtype == np.uint8:
+            key = (msg, width, font, font_scale, font_thickness, tuple(text_color), tuple(text_color_bg),
+                   tuple(box_offset), increased_size)
+            label = OpenCVElements._get_label(key)
+            OpenCVElements._blend_label(frame, label, pos)
+            return label.text_size
+
         offset = tuple([i+increased_size for i in box_offset])
         x, y = pos
         text_size, _ = cv2.getTextSize(msg, font, font_scale, font_thickness)
@@ -83,4 +117,69 @@ class OpenCVElements:
 
         return text_size
 
+    @staticmethod
+    def _get_label(key):
+        cache = OpenCVElements._label_cache
+        with OpenCVElements._label_cache_lock:
+            label = cache.get(key)
+            if label is not None:
+                cache.move_to_end(key)
+                return label
+
+        label = OpenCVElements._render_label(*key)
+
+        with OpenCVElements._label_cache_lock:
+            cache[key] = label
+            while len(cache) > OpenCVElements.label_cache_size:
+                cache.popitem(last=False)
+        return label
+
+    @staticmethod
+    def _render_label(msg, width, font, font_scale, font_thickness, text_color, text_color_bg, box_offset,
+                      increased_size):
+        """draws the label the same way draw_text does, on a black canvas placed around the text position,
+        and the same shapes in white on a second canvas that becomes the alpha mask
+        """
+        (text_w, text_h), baseline = cv2.getTextSize(msg, font, font_scale, font_thickness)
+        # generous margin around the text position, cropped to the drawn pixels below
+        margin_x = max(box_offset[0], 0) + 2 * increased_size + width + font_thickness + 8
+        margin_y = max(box_offset[1], 0) + 2 * increased_size + width + font_thickness + 8
+        size = (text_h + baseline + 2 * margin_y, text_w + 2 * margin_x)
+
+        kwargs = dict(width=width, font=font, pos=(margin_x, margin_y), font_scale=font_scale,
+                      font_thickness=font_thickness, box_offset=box_offset, increased_size=increased_size, cache=False)
+        color = np.zeros(size + (3,), dtype=np.uint8)
+        OpenCVElements.draw_text(color, msg, text_color=text_color, text_color_bg=text_color_bg, **kwargs)
+        alpha = np.zeros(size, dtype=np.uint8)
+        OpenCVElements.draw_text(alpha, msg, text_color=255, text_color_bg=255, **kwargs)
+
+        x, y, w, h = cv2.boundingRect(alpha)
+        return _Label(x - margin_x, y - margin_y, color[y:y + h, x:x + w], alpha[y:y + h, x:x + w], (text_w, text_h))
 
+    @staticmethod
+    def _blend_label(frame, label, pos):
+        frame_h, frame_w = frame.shape[:2]
+        patch_h, patch_w = label.alpha.shape
+        x0, y0 = int(pos[0]) + label.dx, int(pos[1]) + label.dy
+
+        # clip the patch to the frame
+        px0, py0 = max(0, -x0), max(0, -y0)
+        px1, py1 = min(patch_w, frame_w - x0), min(patch_h, frame_h - y0)
+        if px0 >= px1 or py0 >= py1:
+            return frame
+
+        roi = frame[y0 + py0:y0 + py1, x0 + px0:x0 + px1]
+        if (px0, py0, px1, py1) == (0, 0, patch_w, patch_h):
+            color, mask, alpha, edge = label.color, label.mask, label.alpha, label.edge
+        else:
+            color = label.color[py0:py1, px0:px1]
+            mask = label.mask[py0:py1, px0:px1]
+            alpha = label.alpha[py0:py1, px0:px1]
+            edge = np.nonzero((alpha > 0) & (alpha < 255))
+
+        cv2.copyTo(color, mask, roi)
+        if len(edge[0]):
+            # the canvas was black, so the edge colors are already multiplied by alpha
+            a = alpha[edge][:, None] / 255.0
+            roi[edge] = roi[edge] * (1.0 - a) + color[edge] + 0.5
+        return frame
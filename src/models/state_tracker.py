@@ -0,0 +1,82 @@
+# state_tracker.py
+
+import time
+
+import numpy as np
+
+# exercise states returned by Exercise.get_state, NO_STATE = the angle is in none of the bands
+NO_STATE = 0
+S1 = 1
+S2 = 2
+S3 = 3
+
+# the sequence of states seen since the last S1 can only be one of these four
+SEQ_EMPTY = 0     # []
+SEQ_S2 = 1        # [s2]
+SEQ_S2_S3 = 2     # [s2, s3]
+SEQ_S2_S3_S2 = 3  # [s2, s3, s2]  - a full rep
+
+# SEQ_TRANSITIONS[state_seq][state] -> next state_seq
+SEQ_TRANSITIONS = (
+    # NO_STATE, S1, S2, S3
+    (SEQ_EMPTY, SEQ_EMPTY, SEQ_S2, SEQ_EMPTY),
+    (SEQ_S2, SEQ_S2, SEQ_S2, SEQ_S2_S3),
+    (SEQ_S2_S3, SEQ_S2_S3, SEQ_S2_S3_S2, SEQ_S2_S3),
+    (SEQ_S2_S3_S2, SEQ_S2_S3_S2, SEQ_S2_S3_S2, SEQ_S2_S3_S2),
+)
+
+
+class StateTracker:
+    """state of one person's rep counter, the inactivity times are in seconds of the processor's clock
+
+    display_text/count_frames - which feedback message is shown and for how many frames,
+                                indexed like the FEEDBACK_ID_MAP of the processor
+    hint                      - the exercise specific hint (LOWER YOUR HIPS, HAND TOO FAR FROM BODY)
+    """
+    __slots__ = ('state_seq', 'start_inactive_time', 'start_inactive_time_front', 'inactive_time',
+                 'inactive_time_front', 'inactive_time_start', 'display_text', 'count_frames', 'hint',
+                 'incorrect_posture', 'prev_state', 'curr_state', 'curls', 'bad_curls')
+
+    def __init__(self, feedback_size, clock=time.perf_counter):
+        self.state_seq = SEQ_EMPTY
+
+        self.start_inactive_time = clock()
+        self.start_inactive_time_front = clock()
+        self.inactive_time = 0.0
+        self.inactive_time_front = 0.0
+        # time of the last inactivity reset, the reset message stays for 3 seconds after it
+        self.inactive_time_start = float('-inf')
+
+        self.display_text = np.full((feedback_size,), False)
+        self.count_frames = np.zeros((feedback_size,), dtype=np.int64)
+        self.hint = False
+
+        self.incorrect_posture = False
+
+        self.prev_state = NO_STATE
+        self.curr_state = NO_STATE
+
+        self.curls = 0
+        self.bad_curls = 0
+
+    def update_state_sequence(self, state):
+        self.state_seq = SEQ_TRANSITIONS[self.state_seq][state]
+
+    def reset_feedback(self):
+        """hides every feedback message, the arrays keep the size of the processor's FEEDBACK_ID_MAP"""
+        self.display_text = np.full(self.display_text.shape, False)
+        self.count_frames = np.zeros(self.count_frames.shape, dtype=np.int64)
+
+    def snapshot(self):
+        """copy of the whole state, restore() brings it back"""
+        return tuple(value.copy() if isinstance(value, np.ndarray) else value
+                     for value in (getattr(self, name) for name in self.__slots__))
+
+    def restore(self, snapshot):
+        for name, value in zip(self.__slots__, snapshot):
+            setattr(self, name, value.copy() if isinstance(value, np.ndarray) else value)
+
+    def to_dict(self):
+        """json friendly view of the state"""
+        return {name: value.tolist() if isinstance(value, np.ndarray) else value
+                for name, value in ((name, getattr(self, name)) for name in self.__slots__)}
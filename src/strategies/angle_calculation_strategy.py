@@ -8,6 +8,15 @@ class AngleCalculationStrategy(ABC):
     def calculate_angle(self, p1, p2, ref_pt):
         pass
 
+    def calculate_angles(self, p1, p2, ref_pt):
+        """angles for arrays of points with shape (..., 2), e.g. (N, 2) for one frame or (T, N, 2) for a clip,
+        strategies without a vectorized version fall back to calculate_angle for every point
+        """
+        p1, p2, ref_pt = np.broadcast_arrays(np.asarray(p1), np.asarray(p2), np.asarray(ref_pt))
+        angles = [self.calculate_angle(a, b, r) for a, b, r in
+                  zip(p1.reshape(-1, 2), p2.reshape(-1, 2), ref_pt.reshape(-1, 2))]
+        return np.array(angles, dtype=np.int64).reshape(p1.shape[:-1])
+
 
 class Angle2DCalculation(AngleCalculationStrategy):
     def calculate_angle(self, p1, p2, ref_pt=np.array([0, 0])):
@@ -27,3 +36,21 @@ class Angle2DCalculation(AngleCalculationStrategy):
         except Exception as exc:
             print(exc)
             return 0
+
+    def calculate_angles(self, p1, p2, ref_pt=np.array([0, 0])):
+        """vectorized calculate_angle over arrays of points with shape (..., 2),
+        returns an int64 array of shape (...) with exactly the values calculate_angle gives point by point
+        """
+        p1_ref = np.asarray(p1, dtype=np.float64) - ref_pt
+        p2_ref = np.asarray(p2, dtype=np.float64) - ref_pt
+
+        dot = np.einsum('...i,...i->...', p1_ref, p2_ref)
+        norm_1 = np.sqrt(np.einsum('...i,...i->...', p1_ref, p1_ref))
+        norm_2 = np.sqrt(np.einsum('...i,...i->...', p2_ref, p2_ref))
+
+        # a zero-length vector gives nan, which calculate_angle turns into 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_theta = dot / (norm_1 * norm_2)
+        degree = int(180 / np.pi) * np.arccos(np.clip(cos_theta, -1.0, 1.0))
+
+        return np.where(np.isnan(degree), 0, degree).astype(np.int64)
@@ -2,8 +2,17 @@
 
 from abc import ABC, abstractmethod
 
-from ultralytics import YOLO
 import os
+import time
+
+import cv2
+import numpy as np
+
+from src.models.keypoints import KeypointRecord
+from src.models.inference_config import InferenceConfig
+from src.strategies.model_registry import registry
+from src.strategies import onnx_pose
+from src.strategies import keypoint_flow
 
 class DetectionStrategy(ABC):
     @abstractmethod
@@ -22,24 +31,63 @@ class DetectionStrategy(ABC):
     def process_frame(self, frame):
         pass
     @abstractmethod
-    def get_landmark_coordinates(self, feature):
+    def get_landmark_coordinates(self, feature, person=0):
         pass
     @abstractmethod
     def is_plotted(self):
         pass
     @abstractmethod
-    def change_parameters(self, path='', imgsz=-1, conf=-1, iou=-1):
+    def change_parameters(self, path='', imgsz=-1, conf=-1, iou=-1, device='', half=None, max_det=-1):
+        pass
+    @abstractmethod
+    def detect(self, frame, plot=False):
+        pass
+    @abstractmethod
+    def set_detections(self, detections, plot=False):
+        pass
+
+    def reset(self):
+        """forgets the state carried over from the previous frames, called at the start of every video or session"""
         pass
 
 
 class YOLOStrategy(DetectionStrategy):
-    def __init__(self, imgsz=320, weights_path=os.path.join(os.path.dirname(__file__), r'../models/weights/yolov8s-pose.pt'), conf=0.25, iou=0.7,):
+    def __init__(self, imgsz=320, weights_path=os.path.join(os.path.dirname(__file__), r'../models/weights/yolov8s-pose.pt'), conf=0.25, iou=0.7, track=False, device='cpu', config=None, roi=False, keyframe_every=1):
         self.weights_path = weights_path
-        self.imgsz = imgsz,
-        self.conf = conf,
-        self.iou = iou
+        # arguments of every model call, imgsz/conf/iou/device only matter when no config is given
+        self.config = config if config is not None else InferenceConfig(imgsz=imgsz, conf=conf, iou=iou, device=device)
+        # ultralytics tracker keeps the person ids stable between frames
+        self.track = track
         self.model = None
+        # key of the model in the model registry, the model is given back with release_model()
+        self._model_key = None
+        # which copy of the model the registry hands out, strategies running on different threads need different ones
+        self.model_instance = 0
+        # the first track call of a session starts new tracks instead of continuing the ones of the reused model
+        self._track_persist = False
         self._is_plotted = False
+        self.keypoints = KeypointRecord.empty()
+
+        # roi mode: the model only sees a crop around the person of the previous frame, see set_roi
+        self.roi = roi
+        self.roi_margin = 0.25
+        self.roi_full_every = 30
+        self._roi_box = None
+        self._roi_frames = 0
+
+        # keyframe mode: the model runs every keyframe_every frames, see set_keyframes
+        self.keyframe_every = keyframe_every
+        self.keyframe_motion = 0.05
+        self.keyframe_max_lost = 0.3
+        self._since_keyframe = 0
+        self._last_keyframe = None
+
+        # smoothing between the detections and the pose processor, see set_filter
+        self.keypoint_filter = None
+
+        # {stage: seconds} of every frame of the last detect/detect_batch call, read by the FrameProfiler
+        self.timings = []
+        self._frame_timings = {}
 
         # Dictionary to maintain the various landmark features.
         self.landmark_features_dict = {}
@@ -67,56 +115,325 @@ class YOLOStrategy(DetectionStrategy):
         self.landmark_features_dict['right'] = self.landmark_features_dict_right
         self.landmark_features_dict['nose'] = 0
 
-    def change_parameters(self, path='', imgsz=-1, conf=-1, iou=-1):
-        if path != '':
-            self.path_weights = path
+        # keypoint indices in the order get_landmark_coordinates returns them
+        self._side_indices = {
+            side: tuple(self.landmark_features_dict[side][name]
+                        for name in ('shoulder', 'elbow', 'wrist', 'hip', 'knee', 'ankle'))
+            for side in ('left', 'right')
+        }
 
-        if imgsz != -1:
-            self.imgsz = imgsz
+    @property
+    def imgsz(self):
+        return self.config.imgsz
 
-        if conf != -1:
-            self.conf = conf
+    @property
+    def conf(self):
+        return self.config.conf
 
+    @property
+    def iou(self):
+        return self.config.iou
+
+    @property
+    def device(self):
+        return self.config.device
+
+    def change_parameters(self, path='', imgsz=-1, conf=-1, iou=-1, device='', half=None, max_det=-1):
+        config = self.config.predict_kwargs()
+        if imgsz != -1:
+            config['imgsz'] = imgsz
+        if conf != -1:
+            config['conf'] = conf
         if iou != -1:
-            self.iou = iou
+            config['iou'] = iou
+        if device != '':
+            config['device'] = device
+        if half is not None:
+            config['half'] = half
+        if max_det != -1:
+            config['max_det'] = max_det
+        self.set_config(InferenceConfig(**config), weights_path=path or None)
 
-        print(self.path_weights, self.imgsz, self.conf, self.iou)
+        print(self.weights_path, self.config)
 
-    def create_model(self):
+    def set_config(self, config, weights_path=None):
+        """changes the inference settings, a loaded model is swapped for the one matching the new settings"""
+        self.config = config
+        if weights_path is not None:
+            self.weights_path = weights_path
         if self.model is not None:
-            del self.model
-        self.model = YOLO(self.weights_path)
+            self.create_model()
+        return self
+
+    def create_model(self):
+        """takes the model from the model registry, the weights are only loaded if no other
+        strategy with the same settings loaded them before
+        """
+        previous = self._model_key
+        self._model_key, self.model = registry.acquire(self.weights_path, self.imgsz, self.device, self.conf, self.iou,
+                                                      self.config.half, self.model_instance)
+        if previous is not None:
+            registry.release(previous)
         return self
 
-    def process_frame(self, frame, verbose=False, device='cpu', plot=False):
-        self.is_plotted=plot
-        self.results = self.model(frame, verbose=verbose, device=device, imgsz=self.imgsz)
+    def release_model(self):
+        if self._model_key is not None:
+            registry.release(self._model_key)
+            self._model_key = None
+            self.model = None
+        return self
+
+    def warm_up(self):
+        """runs the model once on a blank frame, the first inference of a model is several times slower
+        than the next ones. does nothing if the model was warmed up already
+        """
+        registry.warm_up(self._model_key)
+        return self
+
+    def spawn_kwargs(self):
+        """create_strategy arguments that build the same detector in another process"""
+        return {'weights_path': self.weights_path, 'config': self.config, 'track': self.track, 'roi': self.roi,
+                'keyframe_every': self.keyframe_every}
+
+    def process_frame(self, frame, verbose=False, device=None, plot=False):
+        frame, detections = self.detect(frame, verbose=verbose, device=device, plot=plot)
+        self.set_detections(detections, plot=plot)
+        return frame
+
+    def set_tracking(self, track=True):
+        self.track = track
+
+    def set_roi(self, roi=True, margin=0.25, full_every=30):
+        """crops the frame around the person found on the previous frame before running the model,
+        so the person covers more of the model input: better keypoints at the same imgsz or the same
+        keypoints at a smaller one.
+
+        margin     - added around the keypoint box on every side, relative to its longer side
+        full_every - a full frame detect after that many crops, so a better box is found again
+        only the first person is followed and roi is not used while tracking
+        """
+        self.roi = roi
+        self.roi_margin = margin
+        self.roi_full_every = full_every
+        self._roi_box = None
+        self._roi_frames = 0
+        return self
+
+    def set_keyframes(self, every=3, motion=0.05, max_lost=0.3):
+        """runs the model only on every every-th frame, the keypoints of the frames in between are moved
+        along the lucas-kanade optical flow of the previous frame. the model runs earlier when a keypoint
+        moved more than motion (relative to the person's box height) or the flow lost more than max_lost
+        of the keypoints, so fast movements still get a fresh detection. every=1 turns it off
+        """
+        self.keyframe_every = every
+        self.keyframe_motion = motion
+        self.keyframe_max_lost = max_lost
+        self._since_keyframe = 0
+        self._last_keyframe = None
+        return self
+
+    def reset(self):
+        self._since_keyframe = 0
+        self._last_keyframe = None
+        self._roi_box = None
+        self._roi_frames = 0
+        self._track_persist = False
+        self.keypoints = KeypointRecord.empty()
+        return self
+
+    def _detect_keyframes(self, frame, verbose=False, device=None, plot=False):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._since_keyframe += 1
+
+        if self._last_keyframe is not None and self._since_keyframe < self.keyframe_every:
+            prev_gray, prev_detections = self._last_keyframe
+            if len(prev_detections):
+                start = time.perf_counter()
+                detections, motion, lost = keypoint_flow.track(prev_gray, gray, prev_detections)
+                self._add_time('flow', start)
+                if motion <= self.keyframe_motion and lost <= self.keyframe_max_lost:
+                    self._last_keyframe = (gray, detections)
+                    if plot:
+                        start = time.perf_counter()
+                        frame = onnx_pose.draw_pose(frame.copy(), detections.xyf)
+                        self._add_time('overlay', start)
+                    return frame, detections
+
+        frame, detections = self._detect_model(frame, verbose, device, plot)
+        self._since_keyframe = 0
+        self._last_keyframe = (gray, detections)
+        return frame, detections
+
+    def _next_roi(self, detections, frame_shape):
+        """crop box (x1, y1, x2, y2) for the next frame from the keypoints of the first person,
+        None if there is nobody or the crop would be about the whole frame anyway
+        """
+        if len(detections) == 0:
+            return None
+        person = detections.xyf[0]
+        found = person[(person != 0).any(axis=1)]
+        if len(found) < 2:
+            return None
+
+        height, width = frame_shape[:2]
+        (x1, y1), (x2, y2) = found.min(axis=0), found.max(axis=0)
+        margin = self.roi_margin * max(x2 - x1, y2 - y1)
+        # a crop smaller than the model input would only be upscaled
+        half_w = max((x2 - x1) / 2 + margin, self.imgsz / 2)
+        half_h = max((y2 - y1) / 2 + margin, self.imgsz / 2)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        box = (max(0, int(cx - half_w)), max(0, int(cy - half_h)),
+               min(width, int(cx + half_w)), min(height, int(cy + half_h)))
+        if (box[2] - box[0]) * (box[3] - box[1]) > 0.8 * width * height:
+            return None
+        return box
+
+    def _roi_in(self, frame_shape):
+        """the crop box cut to the frame, None if it doesn't overlap the frame (e.g. a box of another video)"""
+        if self._roi_box is None:
+            return None
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = self._roi_box
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        return x1, y1, x2, y2
+
+    def _detect_roi(self, frame, verbose=False, device=None, plot=False):
+        detections = None
+        box = self._roi_in(frame.shape)
+        if box is not None and self._roi_frames < self.roi_full_every:
+            x1, y1, x2, y2 = box
+            crop_frame, crop = self._detect_frame(np.ascontiguousarray(frame[y1:y2, x1:x2]), verbose, device, plot)
+            if len(crop):
+                self._roi_frames += 1
+                # back to frame coordinates, (0, 0) keypoints stay (0, 0) = not found
+                offset = np.array((x1, y1), dtype=np.float32)
+                xyf = np.where((crop.xyf != 0).any(axis=2, keepdims=True), crop.xyf + offset, 0)
+                detections = KeypointRecord(xyf, crop.conf, crop.ids, crop.boxes + np.tile(offset, 2))
+                if plot:
+                    frame = frame.copy()
+                    frame[y1:y2, x1:x2] = crop_frame
+
+        if detections is None:
+            # no roi yet, time for a full frame or the person left the crop
+            self._roi_frames = 0
+            frame, detections = self._detect_frame(frame, verbose, device, plot)
+
+        self._roi_box = self._next_roi(detections, frame.shape)
+        return frame, detections
+
+    def _predict_kwargs(self, device=None):
+        kwargs = self.config.predict_kwargs()
+        if device is not None:
+            kwargs['device'] = device
+        return kwargs
+
+    def _add_time(self, stage, start):
+        self._frame_timings[stage] = self._frame_timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def _add_speed(self, result):
+        """stage times ultralytics measured for one image, in milliseconds"""
+        for stage, key in (('preprocess', 'preprocess'), ('forward', 'inference'), ('postprocess', 'postprocess')):
+            self._frame_timings[stage] = self._frame_timings.get(stage, 0.0) + (result.speed.get(key) or 0.0) / 1000.0
+
+    def _to_record(self, result, frame, plot):
         if plot:
-            annotated_frame = self.results[0].plot(labels=False, boxes=False)
-            return annotated_frame
+            start = time.perf_counter()
+            frame = result.plot(labels=False, boxes=False)
+            self._add_time('overlay', start)
+        start = time.perf_counter()
+        detections = KeypointRecord.from_result(result)
+        self._add_time('keypoints', start)
+        return frame, detections
+
+    def detect(self, frame, verbose=False, device=None, plot=False):
+        """runs the model without touching the state read by the pose processor,
+        so it can be called from another thread than the one calling set_detections
+        """
+        self._frame_timings = {}
+        if self.keyframe_every > 1:
+            result = self._detect_keyframes(frame, verbose, device, plot)
         else:
-            return frame
-        # тут обдумать трек для нескольких людей
+            result = self._detect_model(frame, verbose, device, plot)
+        self.timings = [self._frame_timings]
+        return result
+
+    def _detect_model(self, frame, verbose=False, device=None, plot=False):
+        if self.roi and not self.track:
+            return self._detect_roi(frame, verbose, device, plot)
+        return self._detect_frame(frame, verbose, device, plot)
+
+    def _detect_frame(self, frame, verbose=False, device=None, plot=False):
+        kwargs = self._predict_kwargs(device)
+        if self.track:
+            results = self.model.track(frame, persist=self._track_persist, verbose=verbose, **kwargs)
+            self._track_persist = True
+        else:
+            results = self.model(frame, verbose=verbose, **kwargs)
+        self._add_speed(results[0])
+        return self._to_record(results[0], frame, plot)
+
+    def detect_batch(self, frames, verbose=False, device=None, plot=False):
+        """runs the model once on a list of frames,
+        returns (frame, detections) pairs in the same order as process_frame would produce them
+        """
+        if self.track or self.roi or self.keyframe_every > 1:
+            # the tracker, the roi and the keyframes have to see the frames one after another
+            return self._detect_each(frames, verbose, device, plot)
+
+        results = self.model(list(frames), verbose=verbose, **self._predict_kwargs(device))
+        detections, timings = [], []
+        for frame, result in zip(frames, results):
+            self._frame_timings = {}
+            self._add_speed(result)
+            detections.append(self._to_record(result, frame, plot))
+            timings.append(self._frame_timings)
+        self.timings = timings
+        return detections
+
+    def _detect_each(self, frames, verbose=False, device=None, plot=False):
+        detections, timings = [], []
+        for frame in frames:
+            detections.append(self.detect(frame, verbose=verbose, device=device, plot=plot))
+            timings.extend(self.timings)
+        self.timings = timings
+        return detections
+
+    def set_filter(self, keypoint_filter=None):
+        """temporal keypoint filter applied to every detection handed to set_detections,
+        e.g. keypoint_filter.OneEuroFilter(), None turns it off
+        """
+        self.keypoint_filter = keypoint_filter
+        return self
+
+    def set_detections(self, detections, plot=False):
+        """hands the detections of the current frame to the pose processor"""
+        self.is_plotted = plot
+        if self.keypoint_filter is not None:
+            detections = self.keypoint_filter(detections)
+        self.keypoints = detections
 
     def get_coordinates(self):
-        res_coord = [r.keypoints.xy.to(int).numpy() for r in self.results]
-        return res_coord[0]
+        return self.keypoints.xy
 
     def get_landmark_features(self):
         return self.landmark_features_dict
 
-    def get_landmark_coordinates(self, feature):
+    def get_track_ids(self):
+        return self.keypoints.ids
+
+    def get_boxes(self):
+        return self.keypoints.boxes
+
+    def get_landmark_coordinates(self, feature, person=0):
+        # rows of the read-only keypoint array are returned as views, nothing is copied
+        person = self.keypoints.xy[person]
         if feature == 'nose':
-            return self.get_coordinates()[0][self.landmark_features_dict[feature]]
-        if feature == 'left' or 'right':
-            shldr_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['shoulder']]
-            elbow_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['elbow']]
-            wrist_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['wrist']]
-            hip_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['hip']]
-            knee_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['knee']]
-            ankle_coord = self.get_coordinates()[0][self.landmark_features_dict[feature]['ankle']]
-
-            return shldr_coord, elbow_coord, wrist_coord, hip_coord, knee_coord, ankle_coord
+            return person[self.landmark_features_dict[feature]]
+        if feature in ('left', 'right'):
+            # shoulder, elbow, wrist, hip, knee, ankle
+            return tuple(person[i] for i in self._side_indices[feature])
         else:
             raise ValueError('Feature needs to be "nose", "left" or "right"')
 
@@ -124,6 +441,149 @@ class YOLOStrategy(DetectionStrategy):
         return self._is_plotted
 
 
+class OnnxPoseStrategy(YOLOStrategy):
+    """yolov8-pose exported to onnx (yolo export model=yolov8s-pose.pt format=onnx) or openvino
+    (format=openvino, the .xml file) run by onnx runtime or openvino, without torch and ultralytics.
+    letterbox, decoding and nms are done in numpy, the keypoints come out in the same layout as
+    YOLOStrategy's so the pose processors can't tell the difference.
+
+    backend - 'onnxruntime', 'openvino' or 'auto' (openvino for .xml files)
+    threads - cpu threads of the runtime, None = runtime default
+    there is no tracker and half has no effect, the precision is the one the model was exported with
+    """
+    def __init__(self, imgsz=320, weights_path=os.path.join(os.path.dirname(__file__), r'../models/weights/yolov8s-pose.onnx'), conf=0.25, iou=0.7, track=False, device='cpu', config=None, backend='auto', threads=None, roi=False, keyframe_every=1):
+        super().__init__(imgsz, weights_path, conf, iou, False, device, config, roi, keyframe_every)
+        self.set_tracking(track)
+        self.backend = backend
+        self.threads = threads
+        self._run = None
+        self._input_size = None
+        self._dynamic_batch = False
+
+    def create_model(self):
+        backend = self.backend
+        if backend == 'auto':
+            backend = 'openvino' if self.weights_path.lower().endswith('.xml') else 'onnxruntime'
+
+        if backend == 'onnxruntime':
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            providers = ['CPUExecutionProvider']
+            if self.device.startswith('cuda'):
+                providers.insert(0, 'CUDAExecutionProvider')
+            session = ort.InferenceSession(self.weights_path, options, providers=providers)
+            input_name = session.get_inputs()[0].name
+            shape = session.get_inputs()[0].shape
+            self._run = lambda blob: session.run(None, {input_name: blob})[0]
+            self.model = session
+        elif backend == 'openvino':
+            from openvino.runtime import Core
+
+            core = Core()
+            network = core.read_model(self.weights_path)
+            shape = [dim.get_length() if dim.is_static else None for dim in network.inputs[0].get_partial_shape()]
+            compiled = core.compile_model(network, 'CPU', {'INFERENCE_NUM_THREADS': self.threads} if self.threads else {})
+            output = compiled.output(0)
+            self._run = lambda blob: compiled(blob)[output]
+            self.model = compiled
+        else:
+            raise ValueError('backend needs to be "onnxruntime", "openvino" or "auto"')
+
+        # exported models mostly have a fixed input size, only a dynamic one uses imgsz
+        self._input_size = shape[2] if isinstance(shape[2], int) else self.imgsz
+        self._dynamic_batch = not isinstance(shape[0], int)
+        return self
+
+    def release_model(self):
+        self.model = None
+        self._run = None
+        return self
+
+    def warm_up(self):
+        self._run(onnx_pose.letterbox(np.zeros((480, 640, 3), dtype=np.uint8), self._input_size)[0])
+        return self
+
+    def set_tracking(self, track=True):
+        if track:
+            raise ValueError('OnnxPoseStrategy has no tracker, counting several people needs YOLOStrategy')
+        self.track = False
+
+    def spawn_kwargs(self):
+        kwargs = super().spawn_kwargs()
+        kwargs.update(backend=self.backend, threads=self.threads)
+        return kwargs
+
+    def _to_detections(self, frame, prediction, scale, pad, plot):
+        start = time.perf_counter()
+        boxes, xy, conf = onnx_pose.decode(prediction, self.conf, self.iou, self.config.max_det, scale, pad,
+                                           frame.shape)
+        self._add_time('postprocess', start)
+        if plot:
+            start = time.perf_counter()
+            frame = onnx_pose.draw_pose(frame.copy(), xy)
+            self._add_time('overlay', start)
+        start = time.perf_counter()
+        detections = KeypointRecord(xy, conf, boxes=boxes)
+        self._add_time('keypoints', start)
+        return frame, detections
+
+    def _detect_frame(self, frame, verbose=False, device=None, plot=False):
+        start = time.perf_counter()
+        blob, scale, pad = onnx_pose.letterbox(frame, self._input_size)
+        self._add_time('preprocess', start)
+        start = time.perf_counter()
+        prediction = self._run(blob)[0]
+        self._add_time('forward', start)
+        return self._to_detections(frame, prediction, scale, pad, plot)
+
+    def detect_batch(self, frames, verbose=False, device=None, plot=False):
+        if not self._dynamic_batch or self.roi or self.keyframe_every > 1:
+            return self._detect_each(frames, plot=plot)
+
+        # the batch is letterboxed and run at once, every frame gets an even share of that time
+        start = time.perf_counter()
+        inputs = [onnx_pose.letterbox(frame, self._input_size) for frame in frames]
+        preprocess = (time.perf_counter() - start) / len(frames)
+        start = time.perf_counter()
+        predictions = self._run(np.concatenate([blob for blob, _, _ in inputs]))
+        forward = (time.perf_counter() - start) / len(frames)
+
+        detections, timings = [], []
+        for frame, prediction, (_, scale, pad) in zip(frames, predictions, inputs):
+            self._frame_timings = {'preprocess': preprocess, 'forward': forward}
+            detections.append(self._to_detections(frame, prediction, scale, pad, plot))
+            timings.append(self._frame_timings)
+        self.timings = timings
+        return detections
+
+
+class Int8PoseStrategy(OnnxPoseStrategy):
+    """int8 model made by quantize.py, run by onnx runtime on the cpu"""
+    def __init__(self, imgsz=320, weights_path=os.path.join(os.path.dirname(__file__), r'../models/weights/yolov8s-pose-int8.onnx'), conf=0.25, iou=0.7, track=False, device='cpu', config=None, threads=None, roi=False, keyframe_every=1):
+        super().__init__(imgsz, weights_path, conf, iou, track, device, config, backend='onnxruntime', threads=threads,
+                         roi=roi, keyframe_every=keyframe_every)
+
+    def spawn_kwargs(self):
+        kwargs = super().spawn_kwargs()
+        del kwargs['backend']
+        return kwargs
+
+
+def create_strategy(weights_path=None, **kwargs):
+    """Int8PoseStrategy for quantize.py output, OnnxPoseStrategy for exported .onnx and openvino .xml models,
+    YOLOStrategy for everything else
+    """
+    if weights_path is None:
+        return YOLOStrategy(**kwargs)
+    if weights_path.lower().endswith('-int8.onnx'):
+        return Int8PoseStrategy(weights_path=weights_path, **kwargs)
+    if weights_path.lower().endswith(('.onnx', '.xml')):
+        return OnnxPoseStrategy(weights_path=weights_path, **kwargs)
+    return YOLOStrategy(weights_path=weights_path, **kwargs)
+
 
 class YoloNasStrategy(DetectionStrategy):
     def process_frame(self, frame):
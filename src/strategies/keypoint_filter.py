@@ -0,0 +1,173 @@
+# keypoint_filter.py
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from src.models.keypoints import KeypointRecord, NUM_KEYPOINTS
+
+
+class KeypointFilter(ABC):
+    """temporal smoothing of the keypoints between the detector and the pose processor.
+
+    every person has an own filter state, found by its track id or, without tracking, by its place in the
+    detections. all 17 keypoints of a person are filtered at once. keypoints the model didn't find ((0, 0))
+    are passed through and their state starts again when they come back.
+
+    fps     - frame rate used as the time step when there is no timestamp, so offline runs are reproducible
+    max_age - frames a person can be missing before the state is dropped
+    clock   - called for the timestamp when none is given, e.g. time.perf_counter for a camera
+    """
+    def __init__(self, fps=30.0, max_age=30, clock=None):
+        self.fps = fps
+        self.max_age = max_age
+        self.clock = clock
+        self._states = {}
+        self._frame = 0
+        self._last_time = None
+
+    def reset(self):
+        self._states = {}
+        self._frame = 0
+        self._last_time = None
+
+    def __call__(self, detections, timestamp=None):
+        """filtered copy of the detections, timestamp is in seconds"""
+        self._frame += 1
+        if timestamp is None and self.clock is not None:
+            timestamp = self.clock()
+        if timestamp is None or self._last_time is None:
+            dt = 1.0 / self.fps
+        else:
+            dt = max(timestamp - self._last_time, 1e-3)
+        self._last_time = timestamp
+
+        xyf = detections.xyf.copy()
+        for person in range(len(detections)):
+            key = int(detections.ids[person]) if detections.ids[person] >= 0 else -1 - person
+            found = (xyf[person] != 0).any(axis=1)
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = self._new_state()
+                state['found'] = np.zeros(NUM_KEYPOINTS, dtype=bool)
+            # keypoints seen for the first time (again) start from the measurement
+            fresh = found & ~state['found']
+            self._start(state, fresh, xyf[person])
+            smooth = found & state['found']
+            if smooth.any():
+                xyf[person][smooth] = self._update(state, smooth, xyf[person], dt)
+            state['found'] = found
+            state['seen'] = self._frame
+
+        for key in [key for key, state in self._states.items() if self._frame - state['seen'] > self.max_age]:
+            del self._states[key]
+
+        return KeypointRecord(xyf, detections.conf, detections.ids, detections.boxes)
+
+    @abstractmethod
+    def _new_state(self):
+        """dict of (17, 2) state arrays of one person"""
+        pass
+
+    @abstractmethod
+    def _start(self, state, mask, xy):
+        """starts the state of the keypoints in mask at the measured xy"""
+        pass
+
+    @abstractmethod
+    def _update(self, state, mask, xy, dt):
+        """filters the measured xy of the keypoints in mask, returns the filtered (n, 2) points"""
+        pass
+
+
+class OneEuroFilter(KeypointFilter):
+    """one euro filter (Casiez et al. 2012): a low pass whose cutoff grows with the speed of the keypoint,
+    so a still keypoint is smoothed a lot and a fast one follows with little lag.
+
+    min_cutoff - cutoff in Hz at rest, lower = smoother
+    beta       - how fast the cutoff grows with the speed (pixels per second), higher = less lag
+    d_cutoff   - cutoff of the speed estimate
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.03, d_cutoff=1.0, fps=30.0, max_age=30, clock=None):
+        super().__init__(fps, max_age, clock)
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def _new_state(self):
+        return {'x': np.zeros((NUM_KEYPOINTS, 2), dtype=np.float32),
+                'dx': np.zeros((NUM_KEYPOINTS, 2), dtype=np.float32)}
+
+    def _start(self, state, mask, xy):
+        state['x'][mask] = xy[mask]
+        state['dx'][mask] = 0
+
+    def _update(self, state, mask, xy, dt):
+        x_prev = state['x'][mask]
+        dx = (xy[mask] - x_prev) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * dx + (1 - a_d) * state['dx'][mask]
+
+        cutoff = self.min_cutoff + self.beta * np.linalg.norm(dx_hat, axis=1, keepdims=True)
+        a = self._alpha(cutoff, dt)
+        x_hat = a * xy[mask] + (1 - a) * x_prev
+
+        state['x'][mask] = x_hat
+        state['dx'][mask] = dx_hat
+        return x_hat
+
+
+class KalmanFilter(KeypointFilter):
+    """constant velocity kalman filter on every keypoint coordinate, x and y are independent,
+    so the 2x2 covariance of each coordinate is kept as three arrays.
+
+    process_noise     - variance of the acceleration in (pixels / s^2)^2, higher = follows faster
+    measurement_noise - variance of the detected position in pixels^2, higher = smoother
+    """
+    def __init__(self, process_noise=1e5, measurement_noise=4.0, fps=30.0, max_age=30, clock=None):
+        super().__init__(fps, max_age, clock)
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+
+    def _new_state(self):
+        return {name: np.zeros((NUM_KEYPOINTS, 2), dtype=np.float64) for name in ('p', 'v', 'P00', 'P01', 'P11')}
+
+    def _start(self, state, mask, xy):
+        state['p'][mask] = xy[mask]
+        state['v'][mask] = 0
+        state['P00'][mask] = self.measurement_noise
+        state['P01'][mask] = 0
+        # the speed is unknown at the start
+        state['P11'][mask] = self.process_noise
+
+    def _update(self, state, mask, xy, dt):
+        p, v = state['p'][mask], state['v'][mask]
+        P00, P01, P11 = state['P00'][mask], state['P01'][mask], state['P11'][mask]
+        q = self.process_noise
+
+        # predict
+        p = p + v * dt
+        P00 = P00 + 2 * dt * P01 + dt * dt * P11 + q * dt ** 4 / 4
+        P01 = P01 + dt * P11 + q * dt ** 3 / 2
+        P11 = P11 + q * dt * dt
+
+        # update with the detected position
+        s = P00 + self.measurement_noise
+        k0, k1 = P00 / s, P01 / s
+        y = xy[mask] - p
+        p = p + k0 * y
+        v = v + k1 * y
+        P11 = P11 - k1 * P01
+        P00, P01 = (1 - k0) * P00, (1 - k0) * P01
+
+        state['p'][mask], state['v'][mask] = p, v
+        state['P00'][mask], state['P01'][mask], state['P11'][mask] = P00, P01, P11
+        return p
+
+
+FILTERS = {'one_euro': OneEuroFilter, 'kalman': KalmanFilter}
@@ -0,0 +1,45 @@
+# keypoint_flow.py
+# moves the keypoints of the last keyframe along the lucas-kanade optical flow, used between model calls
+
+import cv2
+import numpy as np
+
+from src.models.keypoints import KeypointRecord
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+# a point is kept if tracking it back lands closer than this to where it started, in pixels
+MAX_BACK_ERROR = 1.0
+
+
+def track(prev_gray, gray, detections):
+    """moves the found keypoints of every person from prev_gray to gray.
+
+    returns the moved detections, the motion (largest keypoint move relative to the person's box height)
+    and the share of keypoints the flow lost, lost keypoints stay where they were
+    """
+    found = (detections.xyf != 0).any(axis=2)
+    if not found.any():
+        return detections, 0.0, 0.0
+
+    points = detections.xyf[found].reshape(-1, 1, 2)
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **LK_PARAMS)
+    back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, moved, None, **LK_PARAMS)
+    good = (status.ravel() == 1) & (back_status.ravel() == 1) & \
+           (np.linalg.norm((back - points).reshape(-1, 2), axis=1) < MAX_BACK_ERROR)
+
+    shift = np.where(good[:, None], (moved - points).reshape(-1, 2), 0)
+    shifts = np.zeros_like(detections.xyf)
+    shifts[found] = shift
+    xyf = detections.xyf + shifts
+
+    heights = np.maximum(detections.boxes[:, 3] - detections.boxes[:, 1], 1.0)
+    distance = np.linalg.norm(shifts, axis=2) / heights[:, None]
+    # the boxes follow the median move of their keypoints
+    box_shift = np.array([np.median(shifts[person][found[person]], axis=0) if found[person].any() else (0, 0)
+                          for person in range(len(xyf))], dtype=np.float32)
+    boxes = detections.boxes + np.tile(box_shift, 2)
+
+    moved_detections = KeypointRecord(xyf, detections.conf, detections.ids, boxes)
+    return moved_detections, float(distance.max()), 1.0 - good.mean()
@@ -0,0 +1,140 @@
+# model_registry.py
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(__file__), r'../models/weights')
+
+# the pose variants preload() loads when no weights are given
+POSE_VARIANTS = ('yolov8n-pose.pt', 'yolov8s-pose.pt', 'yolov8m-pose.pt')
+
+
+class _Entry:
+    __slots__ = ('model', 'refs', 'warmed', 'lock')
+
+    def __init__(self):
+        self.model = None
+        self.refs = 0
+        self.warmed = False
+        # held while the weights are loaded, so two threads asking for the same model load it once
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """process-wide cache of loaded yolo models keyed by (weights_path, imgsz, device, conf, iou, half, instance).
+
+    acquire() hands out a model and counts the reference, release() gives it back. released models
+    stay loaded, only when there are more than capacity models the least recently used unreferenced
+    ones are dropped, so starting a set again or switching between a few settings doesn't touch the disk
+    """
+    def __init__(self, capacity=4):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(weights_path, imgsz, device='cpu', conf=0.25, iou=0.7, half=False, instance=0):
+        return os.path.abspath(weights_path), imgsz, device, conf, iou, half, instance
+
+    def acquire(self, weights_path, imgsz, device='cpu', conf=0.25, iou=0.7, half=False, instance=0):
+        """returns (key, model), the model has to be given back with release(key).
+        half is part of the key as well, ultralytics converts the weights to fp16 on the first half call.
+        a model must not run on two threads at once, every instance is an own copy of the weights for that
+        """
+        key = self.make_key(weights_path, imgsz, device, conf, iou, half, instance)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.refs += 1
+            self._entries.move_to_end(key)
+
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    # ultralytics pulls in torch and torchvision, importing it only here keeps the gui start fast
+                    from ultralytics import YOLO
+                    entry.model = YOLO(weights_path)
+        except Exception:
+            self.release(key)
+            raise
+
+        with self._lock:
+            self._evict()
+        return key, entry.model
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            if entry.model is None and entry.refs == 0:
+                # loading failed
+                del self._entries[key]
+            self._evict()
+
+    def warm_up(self, key, runs=1):
+        """runs the model of key on a blank frame, the first inference of a model is several times slower
+        than the next ones. does nothing if the model was warmed up already
+        """
+        entry = self._entries[key]
+        with entry.lock:
+            if entry.warmed:
+                return
+            _, imgsz, device, conf, iou, half, _ = key
+            for _ in range(runs):
+                entry.model(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False, imgsz=imgsz, device=device,
+                            conf=conf, iou=iou, half=half)
+            entry.warmed = True
+
+    def preload(self, weights_paths=None, imgsz=320, device='cpu', conf=0.25, iou=0.7, half=False, warm_up=True,
+                background=False):
+        """loads (and warms up) several weights files ahead of time, by default the n, s and m pose models.
+        with background=True it runs in a daemon thread, which is returned
+        """
+        if weights_paths is None:
+            weights_paths = [os.path.join(WEIGHTS_DIR, name) for name in POSE_VARIANTS]
+
+        def load():
+            for path in weights_paths:
+                try:
+                    key, _ = self.acquire(path, imgsz, device, conf, iou, half)
+                except Exception as ex:
+                    print(f'preloading {path} failed: {ex}')
+                    continue
+                try:
+                    if warm_up:
+                        self.warm_up(key)
+                finally:
+                    self.release(key)
+
+        if background:
+            thread = threading.Thread(target=load, daemon=True)
+            thread.start()
+            return thread
+        load()
+
+    def _evict(self):
+        # called with self._lock held
+        unused = [key for key, entry in self._entries.items() if entry.refs == 0]
+        for key in unused[:max(0, len(self._entries) - self.capacity)]:
+            del self._entries[key]
+
+    def clear(self):
+        """drops every model nobody holds a reference to"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.refs == 0]:
+                del self._entries[key]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,92 @@
+# onnx_pose.py
+# numpy pre- and postprocessing for exported yolov8-pose models, the same steps ultralytics runs in torch
+
+import cv2
+import numpy as np
+
+from src.models.keypoints import NUM_KEYPOINTS
+
+# keypoint pairs connected when plotting, the COCO skeleton
+SKELETON = ((15, 13), (13, 11), (16, 14), (14, 12), (11, 12), (5, 11), (6, 12), (5, 6), (5, 7), (6, 8), (7, 9),
+            (8, 10), (1, 2), (0, 1), (0, 2), (1, 3), (2, 4), (3, 5), (4, 6))
+
+# ultralytics hides keypoints with a lower confidence by setting them to (0, 0)
+KEYPOINT_VISIBLE_CONF = 0.5
+
+
+def letterbox(frame, size, color=(114, 114, 114)):
+    """resizes the frame to fit size x size keeping the aspect ratio and pads the rest,
+    returns the (1, 3, size, size) float32 rgb input, the scale and the (left, top) padding
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_w, pad_h = (size - new_w) / 2, (size - new_h) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+    blob = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0, scale, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """greedy non maximum suppression, returns the indices of the kept boxes by descending score"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode(prediction, conf, iou, max_det, scale, pad, frame_shape):
+    """turns one (56, anchors) model output into frame coordinates:
+    rows are cx, cy, w, h, person score and x, y, confidence for every keypoint.
+    returns boxes (n, 4), keypoints (n, 17, 2) and keypoint confidences (n, 17)
+    """
+    prediction = prediction.T
+    prediction = prediction[prediction[:, 4] > conf]
+
+    cx, cy, w, h = prediction[:, :4].T
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+    keep = nms(boxes, prediction[:, 4], iou)[:max_det]
+    boxes, prediction = boxes[keep], prediction[keep]
+
+    keypoints = prediction[:, 5:].reshape(-1, NUM_KEYPOINTS, 3)
+    xy, kpt_conf = keypoints[..., :2], keypoints[..., 2]
+
+    # back from the letterboxed input to the frame
+    offset = np.array(pad, dtype=np.float32)
+    boxes = (boxes.reshape(-1, 2, 2) - offset) / scale
+    xy = (xy - offset) / scale
+    limits = np.array((frame_shape[1], frame_shape[0]), dtype=np.float32)
+    boxes = np.clip(boxes, 0, limits).reshape(-1, 4)
+    xy = np.clip(xy, 0, limits)
+    xy[kpt_conf < KEYPOINT_VISIBLE_CONF] = 0
+    return boxes, xy, kpt_conf
+
+
+def draw_pose(frame, keypoints, radius=5):
+    """plots the keypoints and the skeleton of every person, like ultralytics' Results.plot"""
+    for person in keypoints:
+        visible = (person != 0).any(axis=1)
+        for a, b in SKELETON:
+            if visible[a] and visible[b]:
+                cv2.line(frame, tuple(map(int, person[a])), tuple(map(int, person[b])), (255, 180, 50), 2,
+                         cv2.LINE_AA)
+        for point in person[visible]:
+            cv2.circle(frame, tuple(map(int, point)), radius, (0, 140, 255), -1, cv2.LINE_AA)
+    return frame
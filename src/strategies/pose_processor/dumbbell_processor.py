@@ -1,12 +1,12 @@
 # dumbbell_processor.py
 
-from src.strategies.pose_processor.pose_processor import PoseProcessor
-import time
+from src.strategies.pose_processor.pose_processor import PoseProcessor, PoseAnalysis, NO_PERSON, CAMERA_NOT_ALIGNED, ALIGNED
 import cv2
 import numpy as np
 from src.strategies import angle_calculation_strategy as acs
 from src.strategies import detection_strategy as dc
 from src.models import exercise as exr
+from src.models.state_tracker import StateTracker, NO_STATE, S1, SEQ_EMPTY, SEQ_S2, SEQ_S2_S3, SEQ_S2_S3_S2
 
 
 class DumbbellProcessor(PoseProcessor):
@@ -17,29 +17,8 @@ class DumbbellProcessor(PoseProcessor):
         self.exercise = exr.DumbellExercise(level)
         self.thresholds = self.exercise.get_thresholds()
 
-        self.state_tracker = {
-            'state_seq': [],
-
-            'NEAR_HAND': False,
-
-            'start_inactive_time': time.perf_counter(),
-            'start_inactive_time_front': time.perf_counter(),
-            'INACTIVE_TIME': 0.0,
-            'INACTIVE_TIME_FRONT': 0.0,
-            'INACTIVE_TIME_START': 0.0,
-
-            # 0 -> LOWER YOUR WRIST, 1 -> HIGHER YOUR WRIST, 2 -> KEEP YOUR HAND NEAR THE BODY
-            'DISPLAY_TEXT': np.full((3,), False),
-            'COUNT_FRAMES': np.zeros((3,), dtype=np.int64),
-
-            'INCORRECT_POSTURE': False,
-
-            'prev_state': None,
-            'curr_state': None,
-
-            'CURLS': 0,
-            'BAD_CURLS': 0
-        }
+        # feedback slots: 0 -> LOWER YOUR WRIST, 1 -> HIGHER YOUR WRIST, 2 -> KEEP YOUR HAND NEAR THE BODY
+        self.state_tracker = StateTracker(3, self.clock)
 
         self.FEEDBACK_ID_MAP = {
             0: ('LOWER YOUR WRIST', 125, self.COLORS['purple']),
@@ -50,7 +29,7 @@ class DumbbellProcessor(PoseProcessor):
     def calculate_angle(self, p1, p2, ref_pt=np.array([0, 0])):
         return self.angle_calculation.calculate_angle(p1, p2, ref_pt)
 
-    def _show_feedback(self, frame, c_frame, dict_maps, near_hand_disp):
+    def _show_feedback(self, frame, feedback, dict_maps, near_hand_disp):
         if near_hand_disp:
             self.cv_elem.draw_text(
                 frame,
@@ -62,10 +41,9 @@ class DumbbellProcessor(PoseProcessor):
                 text_color_bg=(255, 255, 0),
                 increased_size=3
             )
-            c_frame[2] = False
 
         # if c_frame[0]: c_frame[1] = False
-        for idx in np.where(c_frame)[0]:
+        for idx in feedback:
             self.cv_elem.draw_text(
                 frame,
                 dict_maps[idx][0],
@@ -78,378 +56,267 @@ class DumbbellProcessor(PoseProcessor):
             )
         return frame
 
-    def draw_landmark_line(self, frame, p1, p2, color, thickness):
-        if not np.array_equal(p1, [0, 0]) and not np.array_equal(p2, [0, 0]):
-            cv2.line(frame, p1, p2, color, thickness, lineType=self.linetype)
-        return frame
+    def active_feedback(self):
+        feedback = super().active_feedback()
+        if self.state_tracker.hint:
+            feedback.append('HAND TOO FAR FROM BODY')
+        return feedback
 
-    def process(self, frame: np.array, curls=None):
-        frame_height, frame_width, _ = frame.shape
+    def analyze(self):
+        play_sound = None
 
         keypoints = self.detector.get_coordinates()
 
-        if len(keypoints):
-            nose_coord = self.detector.get_landmark_coordinates('nose')
+        if self.person < len(keypoints):
+            nose_coord = self.detector.get_landmark_coordinates('nose', self.person)
             left_shldr_coord, left_elbow_coord, left_wrist_coord, left_hip_coord, left_knee_coord, left_ankle_coord = \
-                self.detector.get_landmark_coordinates('left')
+                self.detector.get_landmark_coordinates('left', self.person)
             right_shldr_coord, right_elbow_coord, right_wrist_coord, right_hip_coord, right_knee_coord, right_ankle_coord = \
-                self.detector.get_landmark_coordinates('right')
+                self.detector.get_landmark_coordinates('right', self.person)
 
             offset_angle = self.calculate_angle(left_shldr_coord, right_shldr_coord, nose_coord)
 
             if offset_angle > self.thresholds['OFFSET_THRESH']:
-                display_inactivity = False
-
-                end_time = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME_FRONT'] += end_time - self.state_tracker[
-                    'start_inactive_time_front']
-                self.state_tracker['start_inactive_time_front'] = end_time
+                return self._analyze_camera_not_aligned(offset_angle, nose_coord, left_shldr_coord, right_shldr_coord)
 
-                if self.state_tracker['INACTIVE_TIME_FRONT'] >= self.thresholds['INACTIVE_THRESH']:
-                    self.state_tracker['CURLS'] = 0
-                    self.state_tracker['BAD_CURLS'] = 0
-                    display_inactivity = True
-
-                cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
-                cv2.circle(frame, left_shldr_coord, 7, self.COLORS['yellow'], -1)
-                cv2.circle(frame, right_shldr_coord, 7, self.COLORS['magenta'], -1)
-
-                if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                                self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
-                    play_sound = 'reset_counters'
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter()
-
-                    if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                        self.state_tracker['INACTIVE_TIME_START'] = time.time()
-
-                self.cv_elem.draw_text(
-                    frame,
-                    "CORRECT " + str(self.state_tracker['CURLS']),
-                    pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                    text_color=(10, 228, 72),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                    pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                    text_color=(254, 197, 251),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                if curls is not None:
-                    self.cv_elem.draw_text(
-                        frame,
-                        "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                            curls),
-                        pos=(int(frame_width / 2.1), frame_height - 30),
-                        text_color=(255, 255, 255),
-                        font_scale=0.5,
-                        font_thickness=2,
-                        text_color_bg=self.COLORS['black']
-                    )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    'CAMERA NOT ALIGNED PROPERLY!!!',
-                    pos=(30, 60),
-                    text_color=(255, 255, 255),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    'OFFSET ANGLE: ' + str(offset_angle),
-                    pos=(30, 30),
-                    text_color=(255, 255, 255),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                # Reset inactive times for side view.
-                self.state_tracker['start_inactive_time'] = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME'] = 0.0
-                self.state_tracker['prev_state'] = None
-                self.state_tracker['curr_state'] = None
-
-                # Camera is aligned properly.
-            else:
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+            # Camera is aligned properly.
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.clock()
 
-                dist_l = abs(left_elbow_coord[1] - left_shldr_coord[1])
-                dist_r = abs(right_elbow_coord[1] - right_shldr_coord)[1]
+            dist_l = abs(left_elbow_coord[1] - left_shldr_coord[1])
+            dist_r = abs(right_elbow_coord[1] - right_shldr_coord)[1]
 
-                shldr_coord = None
-                elbow_coord = None
-                wrist_coord = None
+            shldr_coord = None
+            elbow_coord = None
+            wrist_coord = None
 
-                if nose_coord[0] <= left_shldr_coord[0]:
-                    shldr_coord = left_shldr_coord
-                    elbow_coord = left_elbow_coord
-                    wrist_coord = left_wrist_coord
+            if nose_coord[0] <= left_shldr_coord[0]:
+                shldr_coord = left_shldr_coord
+                elbow_coord = left_elbow_coord
+                wrist_coord = left_wrist_coord
 
-                    multiplier = -1
+                multiplier = -1
 
-                else:
-                    shldr_coord = right_shldr_coord
-                    elbow_coord = right_elbow_coord
-                    wrist_coord = right_wrist_coord
+            else:
+                shldr_coord = right_shldr_coord
+                elbow_coord = right_elbow_coord
+                wrist_coord = right_wrist_coord
 
-                    multiplier = 1
+                multiplier = 1
 
-                # --- Calculation angles ----
+            # --- Calculation angles ----
 
-                elbow_angle = self.calculate_angle(shldr_coord, wrist_coord, elbow_coord)
-                cv2.ellipse(frame, elbow_coord, (30, 30),
-                            angle=elbow_angle, startAngle=0, endAngle=0,
-                            color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+            elbow_angle = self.calculate_angle(shldr_coord, wrist_coord, elbow_coord)
+            shldr_angle = abs(180 - self.calculate_angle(elbow_coord, np.array([shldr_coord[0], 0]), shldr_coord))
 
-                shldr_angle = abs(180 - self.calculate_angle(elbow_coord, np.array([shldr_coord[0], 0]), shldr_coord))
-                if shldr_coord[0] >= elbow_coord[0]:
-                    cv2.ellipse(frame, shldr_coord, (30, 30),
-                                angle=0, startAngle=90 - multiplier * shldr_angle, endAngle=90,
-                                color=self.COLORS['white'], thickness=3, lineType=self.linetype)
-                else:
-                    cv2.ellipse(frame, shldr_coord, (30, 30),
-                                angle=0, startAngle=90 + multiplier * shldr_angle, endAngle=90,
-                                color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+            current_state = self.exercise.get_state(int(elbow_angle))
+            self.state_tracker.curr_state = current_state
+            self.exercise._update_state_sequence(current_state, self.state_tracker)
 
-                self.cv_elem.draw_dotted_line(frame, shldr_coord, start=shldr_coord[1] - 20, end=shldr_coord[1] + 50,
-                                              line_color=self.COLORS['purple'])
+            # --- Computing parts of automata
 
-                if not self.detector.is_plotted:
-                    # plotting landmarks
-                    self.draw_landmark_line(frame, shldr_coord, elbow_coord, self.COLORS['pink'], 4)
-                    self.draw_landmark_line(frame, wrist_coord, elbow_coord, self.COLORS['pink'], 4)
+            # print('\r', self.state_tracker.state_seq, current_state, self.state_tracker.display_text, self.state_tracker.count_frames, self.state_tracker.hint, end='')
 
-                    # plotting edges of landmarks
-                    cv2.circle(frame, shldr_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, elbow_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, wrist_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            if current_state == S1:
 
-                current_state = self.exercise.get_state(int(elbow_angle))
-                self.state_tracker['curr_state'] = current_state
-                print(f'\r {current_state}',end='')
-                self.exercise._update_state_sequence(current_state, self.state_tracker)
+                if self.state_tracker.state_seq == SEQ_S2_S3_S2 and not self.state_tracker.incorrect_posture:
+                    self.state_tracker.curls += 1
+                    play_sound = str(self.state_tracker.curls)
 
-                # --- Computing parts of automata
+                elif self.state_tracker.state_seq == SEQ_S2:
+                    self.state_tracker.bad_curls += 1
+                    play_sound = 'incorrect'
 
-                # print('\r', self.state_tracker['state_seq'], current_state, self.state_tracker['DISPLAY_TEXT'], self.state_tracker['COUNT_FRAMES'], self.state_tracker['NEAR_HAND'], end='')
+                elif self.state_tracker.incorrect_posture:
+                    self.state_tracker.bad_curls += 1
+                    play_sound = 'incorrect'
 
-                if current_state == 's1':
+                self.state_tracker.state_seq = SEQ_EMPTY
+                self.state_tracker.incorrect_posture = False
 
-                    if len(self.state_tracker['state_seq']) == 3 and not self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['CURLS'] += 1
-                        play_sound = str(self.state_tracker['CURLS'])
+                # --- End of computing
 
-                    elif 's2' in self.state_tracker['state_seq'] and len(self.state_tracker['state_seq']) == 1:
-                        self.state_tracker['BAD_CURLS'] += 1
-                        play_sound = 'incorrect'
+            # --- Perform feedback
 
-                    elif self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['BAD_CURLS'] += 1
-                        play_sound = 'incorrect'
+            else:
+                if elbow_angle < self.thresholds['ELBOW_THRESH'][0]:
+                    self.state_tracker.display_text[0] = True
 
-                    self.state_tracker['state_seq'] = []
-                    self.state_tracker['INCORRECT_POSTURE'] = False
-
-                    # --- End of computing
-
-                # --- Perform feedback
-
-                else:
-                    if elbow_angle < self.thresholds['ELBOW_THRESH'][0]:
-                        self.state_tracker['DISPLAY_TEXT'][0] = True
-
-                    elif elbow_angle > self.thresholds['ELBOW_THRESH'][1] and \
-                            self.state_tracker['state_seq'].count('s2') == 1:
-                        self.state_tracker['DISPLAY_TEXT'][1] = True
+                elif elbow_angle > self.thresholds['ELBOW_THRESH'][1] and \
+                        self.state_tracker.state_seq in (SEQ_S2, SEQ_S2_S3):
+                    self.state_tracker.display_text[1] = True
 
-                    if self.thresholds['HAND_THRESH'][0] < shldr_angle < self.thresholds['HAND_THRESH'][1] and \
-                            self.state_tracker['state_seq'].count('s2') == 1:
-                        self.state_tracker['DISPLAY_TEXT'][2] = True
+                if self.thresholds['HAND_THRESH'][0] < shldr_angle < self.thresholds['HAND_THRESH'][1] and \
+                        self.state_tracker.state_seq in (SEQ_S2, SEQ_S2_S3):
+                    self.state_tracker.display_text[2] = True
 
-                    elif shldr_angle > self.thresholds['HAND_THRESH'][2]:
-                        self.state_tracker['NEAR_HAND'] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
+                elif shldr_angle > self.thresholds['HAND_THRESH'][2]:
+                    self.state_tracker.hint = True
+                    self.state_tracker.incorrect_posture = True
 
-                # --- Inactivity computing
+            # --- Inactivity computing
 
-                display_inactivity = False
-
-                if self.state_tracker['curr_state'] == self.state_tracker['prev_state']:
+            display_inactivity = False
 
-                    end_time = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME'] += end_time - self.state_tracker['start_inactive_time']
-                    self.state_tracker['start_inactive_time'] = end_time
+            if self.state_tracker.curr_state == self.state_tracker.prev_state:
 
-                    if self.state_tracker['INACTIVE_TIME'] >= self.thresholds['INACTIVE_THRESH']:
-                        self.state_tracker['CURLS'] = 0
-                        self.state_tracker['BAD_CURLS'] = 0
-                        display_inactivity = True
+                end_time = self.clock()
+                self.state_tracker.inactive_time += end_time - self.state_tracker.start_inactive_time
+                self.state_tracker.start_inactive_time = end_time
 
-                else:
-                    self.state_tracker['start_inactive_time'] = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME'] = 0.0
-
-                # ---
+                if self.state_tracker.inactive_time >= self.thresholds['INACTIVE_THRESH']:
+                    self.state_tracker.curls = 0
+                    self.state_tracker.bad_curls = 0
+                    display_inactivity = True
 
-                elbow_text_coord_x = elbow_coord[0] + 10
-                shldr_text_coord_x = shldr_coord[0] + 15
-
-                if current_state == 's1':
-                    self.state_tracker['NEAR_HAND'] = False
-
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['DISPLAY_TEXT']] += 1
-
-                frame = self._show_feedback(frame, self.state_tracker['COUNT_FRAMES'],
-                                            self.FEEDBACK_ID_MAP, self.state_tracker['NEAR_HAND'])
-
-                if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                                self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
-                    play_sound = 'reset_counters'
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+            else:
+                self.state_tracker.start_inactive_time = self.clock()
+                self.state_tracker.inactive_time = 0.0
 
-                    if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                        self.state_tracker['INACTIVE_TIME_START'] = time.time()
+            # ---
 
-                cv2.putText(frame, str(int(elbow_angle)), (elbow_text_coord_x, elbow_coord[1]), self.font, 0.6,
-                            self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(shldr_angle)), (shldr_text_coord_x, shldr_coord[1] + 10),
-                            self.font,
-                            0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
+            if current_state == S1:
+                self.state_tracker.hint = False
 
-                # print(f"\r{self.state_tracker['state_seq']}", end='')
+            self.state_tracker.count_frames[self.state_tracker.display_text] += 1
 
-                self.cv_elem.draw_text(
-                    frame,
-                    "CORRECT " + str(self.state_tracker['CURLS']),
-                    pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                    text_color=(10, 228, 72),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
+            # the hint replaces the 'KEEP YOUR HAND NEAR THE BODY' message
+            if self.state_tracker.hint:
+                self.state_tracker.count_frames[2] = False
 
-                self.cv_elem.draw_text(
-                    frame,
-                    str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                    pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                    text_color=(254, 197, 251),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                if curls is not None:
-                    self.cv_elem.draw_text(
-                        frame,
-                        "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                            curls),
-                        pos=(int(frame_width / 2.1), frame_height - 30),
-                        text_color=(255, 255, 255),
-                        font_scale=0.5,
-                        font_thickness=2,
-                        text_color_bg=self.COLORS['black']
-                    )
-
-                self.state_tracker['DISPLAY_TEXT'][
-                    self.state_tracker['COUNT_FRAMES'] > self.thresholds['CNT_FRAME_THRESH']] = False
-                self.state_tracker['COUNT_FRAMES'][
-                    self.state_tracker['COUNT_FRAMES'] > self.thresholds['CNT_FRAME_THRESH']] = 0
-                self.state_tracker['prev_state'] = current_state
+            # feedback shown on this frame, taken before the counters below are reset
+            feedback = tuple(np.flatnonzero(self.state_tracker.count_frames))
+            near_hand = self.state_tracker.hint
 
+            inactivity_reset = display_inactivity or (self.clock() - self.state_tracker.inactive_time_start) <= 3
+            if inactivity_reset:
+                play_sound = 'reset_counters'
+                self.state_tracker.inactive_time_front = 0.0
+                self.state_tracker.start_inactive_time_front = self.clock()
+
+                if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                    self.state_tracker.inactive_time_start = self.clock()
+
+            # print(f"\r{self.state_tracker.state_seq}", end='')
+
+            self.state_tracker.display_text[
+                self.state_tracker.count_frames > self.thresholds['CNT_FRAME_THRESH']] = False
+            self.state_tracker.count_frames[
+                self.state_tracker.count_frames > self.thresholds['CNT_FRAME_THRESH']] = 0
+            self.state_tracker.prev_state = current_state
+
+            return PoseAnalysis(
+                status=ALIGNED,
+                correct=self.state_tracker.curls,
+                incorrect=self.state_tracker.bad_curls,
+                state=current_state,
+                angles={'elbow': elbow_angle, 'shldr': shldr_angle},
+                landmarks={'shldr': shldr_coord, 'elbow': elbow_coord, 'wrist': wrist_coord},
+                multiplier=multiplier,
+                feedback=feedback,
+                hint=near_hand,
+                inactivity_reset=inactivity_reset,
+                play_sound=play_sound
+            )
 
         # --- if len(keypoints)
 
+        # if self.flip_frame:
+        #     frame = cv2.flip(frame, 1)
+
+        end_time = self.clock()
+        self.state_tracker.inactive_time += end_time - self.state_tracker.start_inactive_time
+
+        display_inactivity = False
+
+        if self.state_tracker.inactive_time >= self.thresholds['INACTIVE_THRESH'] or (
+                self.clock() - self.state_tracker.inactive_time_start) <= 3:
+            self.state_tracker.curls = 0
+            self.state_tracker.bad_curls = 0
+            display_inactivity = True
+            if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                self.state_tracker.inactive_time_start = self.clock()
+
+        self.state_tracker.start_inactive_time = end_time
+
+        inactivity_reset = display_inactivity or (self.clock() - self.state_tracker.inactive_time_start) <= 3
+        if inactivity_reset:
+            play_sound = 'reset_counters'
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.clock()
+
+            if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                self.state_tracker.inactive_time_start = self.clock()
+
+        # Reset all other state variables
+
+        self.state_tracker.prev_state = NO_STATE
+        self.state_tracker.curr_state = NO_STATE
+        self.state_tracker.inactive_time_front = 0.0
+        self.state_tracker.incorrect_posture = False
+        self.state_tracker.reset_feedback()
+        self.state_tracker.start_inactive_time_front = self.clock()
+
+        return PoseAnalysis(
+            status=NO_PERSON,
+            correct=self.state_tracker.curls,
+            incorrect=self.state_tracker.bad_curls,
+            inactivity_reset=inactivity_reset,
+            inactivity_reset_bottom=display_inactivity,
+            play_sound=play_sound
+        )
+
+    def draw(self, frame: np.array, analysis: PoseAnalysis, curls=None):
+        if analysis.status == NO_PERSON:
+            return self._draw_no_person(frame, analysis, curls)
+        if analysis.status == CAMERA_NOT_ALIGNED:
+            return self._draw_camera_not_aligned(frame, analysis, curls)
+
+        landmarks = analysis.landmarks
+        multiplier = analysis.multiplier
+        shldr_coord, elbow_coord, wrist_coord = landmarks['shldr'], landmarks['elbow'], landmarks['wrist']
+        elbow_angle, shldr_angle = analysis.angles['elbow'], analysis.angles['shldr']
+
+        cv2.ellipse(frame, elbow_coord, (30, 30),
+                    angle=elbow_angle, startAngle=0, endAngle=0,
+                    color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+
+        if shldr_coord[0] >= elbow_coord[0]:
+            cv2.ellipse(frame, shldr_coord, (30, 30),
+                        angle=0, startAngle=90 - multiplier * shldr_angle, endAngle=90,
+                        color=self.COLORS['white'], thickness=3, lineType=self.linetype)
         else:
-            # if self.flip_frame:
-            #     frame = cv2.flip(frame, 1)
-
-            end_time = time.perf_counter()
-            self.state_tracker['INACTIVE_TIME'] += end_time - self.state_tracker['start_inactive_time']
+            cv2.ellipse(frame, shldr_coord, (30, 30),
+                        angle=0, startAngle=90 + multiplier * shldr_angle, endAngle=90,
+                        color=self.COLORS['white'], thickness=3, lineType=self.linetype)
 
-            display_inactivity = False
+        self.cv_elem.draw_dotted_line(frame, shldr_coord, start=shldr_coord[1] - 20, end=shldr_coord[1] + 50,
+                                      line_color=self.COLORS['purple'])
 
-            if self.state_tracker['INACTIVE_TIME'] >= self.thresholds['INACTIVE_THRESH'] or (
-                    time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                self.state_tracker['CURLS'] = 0
-                self.state_tracker['BAD_CURLS'] = 0
-                cv2.putText(frame, 'Resetting CURLS due to inactivity!!!', (10, frame_height - 25), self.font, 0.7,
-                            self.COLORS['red'], 2)
-                display_inactivity = True
-                if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    self.state_tracker['INACTIVE_TIME_START'] = time.time()
+        if not self.detector.is_plotted:
+            # plotting landmarks
+            self.draw_landmark_line(frame, shldr_coord, elbow_coord, self.COLORS['pink'], 4)
+            self.draw_landmark_line(frame, wrist_coord, elbow_coord, self.COLORS['pink'], 4)
 
-            self.state_tracker['start_inactive_time'] = end_time
+            # plotting edges of landmarks
+            cv2.circle(frame, shldr_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, elbow_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, wrist_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
 
-            self.cv_elem.draw_text(
-                frame,
-                "CORRECT " + str(self.state_tracker['CURLS']),
-                pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                text_color=(10, 228, 72),
-                font_scale=1,
-                font_thickness=3,
-                text_color_bg=self.COLORS['black'],
-                increased_size=3
-            )
+        elbow_text_coord_x = elbow_coord[0] + 10
+        shldr_text_coord_x = shldr_coord[0] + 15
 
-            self.cv_elem.draw_text(
-                frame,
-                str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                text_color=(254, 197, 251),
-                font_scale=1,
-                font_thickness=3,
-                text_color_bg=self.COLORS['black'],
-                increased_size=3
-            )
-
-            if curls is not None:
-                self.cv_elem.draw_text(
-                    frame,
-                    "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                        curls),
-                    pos=(int(frame_width / 2.1), frame_height - 30),
-                    text_color=(255, 255, 255),
-                    font_scale=0.5,
-                    font_thickness=2,
-                    text_color_bg=self.COLORS['black']
-                )
-
-            if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                            self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
-                play_sound = 'reset_counters'
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+        frame = self._show_feedback(frame, analysis.feedback, self.FEEDBACK_ID_MAP, analysis.hint)
 
-                if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    self.state_tracker['INACTIVE_TIME_START'] = time.time()
+        if analysis.inactivity_reset:
+            self._draw_inactivity_reset(frame)
 
-            # Reset all other state variables
+        cv2.putText(frame, str(int(elbow_angle)), (elbow_text_coord_x, elbow_coord[1]), self.font, 0.6,
+                    self.COLORS['light_green'], 2, lineType=self.linetype)
+        cv2.putText(frame, str(int(shldr_angle)), (shldr_text_coord_x, shldr_coord[1] + 10),
+                    self.font,
+                    0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
 
-            self.state_tracker['prev_state'] = None
-            self.state_tracker['curr_state'] = None
-            self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-            self.state_tracker['INCORRECT_POSTURE'] = False
-            self.state_tracker['DISPLAY_TEXT'] = np.full((5,), False)
-            self.state_tracker['COUNT_FRAMES'] = np.zeros((5,), dtype=np.int64)
-            self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+        self._draw_counters(frame, analysis, curls)
 
         return frame
@@ -0,0 +1,133 @@
+# multi_person_processor.py
+
+from dataclasses import dataclass, field
+import numpy as np
+from src.strategies.pose_processor.pose_processor import PoseProcessor, PoseAnalysis, NO_PERSON, ALIGNED
+from src.strategies import angle_calculation_strategy as acs
+from src.strategies import detection_strategy as dc
+
+
+@dataclass
+class MultiPersonAnalysis(PoseAnalysis):
+    # (track id, person box, PoseAnalysis of the person) for everyone tracked on the frame
+    people: list = field(default_factory=list)
+
+
+class MultiPersonProcessor(PoseProcessor):
+    """counts reps of every tracked person with its own processor, so everyone has an own
+    state tracker and exercise instance and the counts don't jump when the detection order changes.
+
+    the tracks live in fixed size arrays: slot i holds a track id (-1 = free), the frame the track
+    was last seen on and the processor of the track
+    """
+    def __init__(self, detection_strategy: dc.DetectionStrategy,
+                 angle_calculation_strategy: acs.AngleCalculationStrategy, level=0,
+                 processor_class=None, max_tracks=32, max_age=30):
+        super().__init__(detection_strategy, angle_calculation_strategy, level)
+
+        self.level = level
+        self.processor_class = processor_class
+        # frames a lost track is kept before its counters are dropped
+        self.max_age = max_age
+
+        self.track_ids = np.full(max_tracks, -1, dtype=np.int64)
+        self.last_seen = np.zeros(max_tracks, dtype=np.int64)
+        self.processors = [None] * max_tracks
+        self.frame_idx = 0
+        # reps of the tracks that were dropped, they still count towards the totals of the session
+        self.dropped_correct = 0
+        self.dropped_incorrect = 0
+
+    def _get_slots(self, ids):
+        """slot of every track id, new ids take free slots, -1 if there is no free slot left"""
+        stale = (self.track_ids != -1) & (self.frame_idx - self.last_seen > self.max_age)
+        self.track_ids[stale] = -1
+        for slot in np.flatnonzero(stale):
+            correct, incorrect = self.processors[slot].get_counts()
+            self.dropped_correct += correct
+            self.dropped_incorrect += incorrect
+            self.processors[slot] = None
+
+        match = self.track_ids[None, :] == ids[:, None]
+        slots = np.where(match.any(axis=1), match.argmax(axis=1), -1)
+
+        for person, slot in zip(np.flatnonzero(slots == -1), np.flatnonzero(self.track_ids == -1)):
+            self.track_ids[slot] = ids[person]
+            self.processors[slot] = self.processor_class(self.detector, self.angle_calculation,
+                                                         self.level).set_clock(self.clock)
+            slots[person] = slot
+
+        self.last_seen[slots[slots >= 0]] = self.frame_idx
+        return slots
+
+    def set_clock(self, clock):
+        self.clock = clock
+        for processor in self.processors:
+            if processor is not None:
+                processor.set_clock(clock)
+        return self
+
+    def analyze(self):
+        self.frame_idx += 1
+
+        ids = self.detector.get_track_ids()
+        boxes = self.detector.get_boxes()
+        # people the tracker hasn't given an id yet are skipped
+        tracked = np.flatnonzero(ids >= 0)
+        slots = self._get_slots(ids[tracked])
+
+        people = []
+        play_sound = None
+        for person, slot in zip(tracked, slots):
+            if slot < 0:
+                continue
+            processor = self.processors[slot]
+            processor.person = person
+            try:
+                analysis = processor.analyze()
+            except Exception as ex:
+                print(f'pose_processor exception, track {self.track_ids[slot]}: {ex}')
+                continue
+            play_sound = play_sound or analysis.play_sound
+            people.append((int(self.track_ids[slot]), boxes[person], analysis))
+
+        # the totals of the session, the people off the frame and the dropped tracks included
+        correct, incorrect = self.get_counts()
+        return MultiPersonAnalysis(
+            status=ALIGNED if people else NO_PERSON,
+            correct=correct,
+            incorrect=incorrect,
+            people=people,
+            play_sound=play_sound
+        )
+
+    def draw(self, frame: np.array, analysis: MultiPersonAnalysis, curls=None):
+        for track_id, box, person in analysis.people:
+            x1, y1 = int(box[0]), int(box[1])
+            box_color = self.COLORS['green'] if person.status == ALIGNED else self.COLORS['blue']
+            text = f'#{track_id} CORRECT {person.correct} INCORRECT {person.incorrect}'
+            if curls is not None:
+                text += f' {person.correct + person.incorrect}/{curls}'
+            self.cv_elem.draw_text(
+                frame,
+                text,
+                pos=(x1 + 20, max(y1 - 30, 10)),
+                text_color=self.COLORS['white'],
+                font_scale=0.5,
+                font_thickness=1,
+                text_color_bg=box_color
+            )
+        return frame
+
+    def get_counts(self):
+        """reps of everyone so far, including the people whose track was dropped"""
+        counts = [self.processors[slot].get_counts() for slot in np.flatnonzero(self.track_ids != -1)]
+        return (self.dropped_correct + sum(c for c, _ in counts),
+                self.dropped_incorrect + sum(i for _, i in counts))
+
+    def active_feedback(self):
+        feedback = []
+        for slot in np.flatnonzero(self.track_ids != -1):
+            if self.last_seen[slot] == self.frame_idx:
+                feedback.extend(self.processors[slot].active_feedback())
+        return feedback
@@ -1,12 +1,58 @@
 # pose_processor.py
 
 from abc import ABC, abstractmethod
+import time
+from dataclasses import dataclass, field
+from typing import Optional
 import cv2
 import numpy as np
 from src.strategies import angle_calculation_strategy as acs
 from src.strategies import detection_strategy as dc
 
 from src.models import opencv_elements
+from src.models.state_tracker import NO_STATE
+
+# PoseAnalysis.status values
+NO_PERSON = 0
+CAMERA_NOT_ALIGNED = 1
+ALIGNED = 2
+
+
+@dataclass
+class PoseAnalysis:
+    """result of PoseProcessor.analyze for one frame: everything the draw step needs, no pixels"""
+    status: int
+    correct: int = 0
+    incorrect: int = 0
+    # NO_STATE, S1, S2 or S3 of src.models.state_tracker
+    state: int = NO_STATE
+    # angles and landmark coordinates by name, e.g. 'knee_vertical' or 'hip'
+    angles: dict = field(default_factory=dict)
+    landmarks: dict = field(default_factory=dict)
+    # which side of the body is measured, -1 = left, 1 = right
+    multiplier: int = 1
+    # ids of FEEDBACK_ID_MAP to show and the exercise specific hint (LOWER YOUR HIPS, HAND TOO FAR FROM BODY)
+    feedback: tuple = ()
+    hint: bool = False
+    # 'Resetting CURLS due to inactivity' messages
+    inactivity_reset: bool = False
+    inactivity_reset_bottom: bool = False
+    play_sound: Optional[str] = None
+
+
+class FrameClock:
+    """time of the current frame of a video, frame index / fps. the inactivity timers of a processor run on it
+    for video files, so the counts don't depend on how fast the video is processed. tick() once per frame
+    """
+    def __init__(self, fps=30.0):
+        self.fps = fps
+        self.frame = 0
+
+    def tick(self):
+        self.frame += 1
+
+    def __call__(self):
+        return self.frame / self.fps
 
 
 class PoseProcessor(ABC):
@@ -15,6 +61,10 @@ class PoseProcessor(ABC):
 
         self.detector = detection_strategy
         self.angle_calculation = angle_calculation_strategy
+        # time source of the inactivity timers, see set_clock
+        self.clock = time.perf_counter
+        # index of the analysed person in the detections of the current frame
+        self.person = 0
 
         self.cv_elem = opencv_elements.OpenCVElements
 
@@ -39,7 +89,159 @@ class PoseProcessor(ABC):
             'pink': (229, 156, 209)
         }
 
+    def set_clock(self, clock):
+        """clock() returns the current time in seconds, time.perf_counter for a camera, a FrameClock for a video"""
+        self.clock = clock
+        self.state_tracker.start_inactive_time = clock()
+        self.state_tracker.start_inactive_time_front = clock()
+        return self
+
+    @abstractmethod
+    def analyze(self) -> PoseAnalysis:
+        """updates the rep counter with the current detections, doesn't draw anything"""
+        pass
 
     @abstractmethod
-    def process(self, frame: np.array, curls):
-        pass
\ No newline at end of file
+    def draw(self, frame: np.array, analysis: PoseAnalysis, curls=None):
+        pass
+
+    def process(self, frame: np.array, curls=None, render=True):
+        analysis = self.analyze()
+        if render:
+            frame = self.draw(frame, analysis, curls)
+        return frame, analysis.play_sound
+
+    def _analyze_camera_not_aligned(self, offset_angle, nose_coord, left_shldr_coord, right_shldr_coord):
+        play_sound = None
+        display_inactivity = False
+
+        end_time = self.clock()
+        self.state_tracker.inactive_time_front += end_time - self.state_tracker.start_inactive_time_front
+        self.state_tracker.start_inactive_time_front = end_time
+
+        if self.state_tracker.inactive_time_front >= self.thresholds['INACTIVE_THRESH']:
+            self.state_tracker.curls = 0
+            self.state_tracker.bad_curls = 0
+            display_inactivity = True
+
+        inactivity_reset = display_inactivity or (self.clock() - self.state_tracker.inactive_time_start) <= 3
+        if inactivity_reset:
+            play_sound = 'reset_counters'
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.clock()
+
+            if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                self.state_tracker.inactive_time_start = self.clock()
+
+        # Reset inactive times for side view.
+        self.state_tracker.start_inactive_time = self.clock()
+        self.state_tracker.inactive_time = 0.0
+        self.state_tracker.prev_state = NO_STATE
+        self.state_tracker.curr_state = NO_STATE
+
+        return PoseAnalysis(
+            status=CAMERA_NOT_ALIGNED,
+            correct=self.state_tracker.curls,
+            incorrect=self.state_tracker.bad_curls,
+            angles={'offset': offset_angle},
+            landmarks={'nose': nose_coord, 'left_shldr': left_shldr_coord, 'right_shldr': right_shldr_coord},
+            inactivity_reset=inactivity_reset,
+            play_sound=play_sound
+        )
+
+    def get_counts(self):
+        """correct and incorrect reps so far"""
+        return self.state_tracker.curls, self.state_tracker.bad_curls
+
+    def active_feedback(self):
+        """messages of the form errors shown on the current frame"""
+        return [self.FEEDBACK_ID_MAP[idx][0] for idx in np.flatnonzero(self.state_tracker.display_text)
+                if idx in self.FEEDBACK_ID_MAP]
+
+    def draw_landmark_line(self, frame, p1, p2, color, thickness):
+        if not np.array_equal(p1, [0, 0]) and not np.array_equal(p2, [0, 0]):
+            cv2.line(frame, p1, p2, color, thickness, lineType=self.linetype)
+        return frame
+
+    def _draw_inactivity_reset(self, frame):
+        cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
+                    self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
+
+    def _draw_counters(self, frame, analysis, curls=None):
+        frame_height, frame_width, _ = frame.shape
+
+        self.cv_elem.draw_text(
+            frame,
+            "CORRECT " + str(analysis.correct),
+            pos=(int(frame_width * 0.06), int(frame_height - 80)),
+            text_color=(10, 228, 72),
+            font_scale=1,
+            font_thickness=3,
+            text_color_bg=self.COLORS['black'],
+            increased_size=3
+        )
+
+        self.cv_elem.draw_text(
+            frame,
+            str(analysis.incorrect) + " INCORRECT",
+            pos=(int(frame_width * 0.78), int(frame_height - 80)),
+            text_color=(254, 197, 251),
+            font_scale=1,
+            font_thickness=3,
+            text_color_bg=self.COLORS['black'],
+            increased_size=3
+        )
+
+        if curls is not None:
+            self.cv_elem.draw_text(
+                frame,
+                "CURLS: " + str(analysis.correct + analysis.incorrect) + '/' + str(curls),
+                pos=(int(frame_width / 2.1), frame_height - 30),
+                text_color=(255, 255, 255),
+                font_scale=0.5,
+                font_thickness=2,
+                text_color_bg=self.COLORS['black']
+            )
+
+    def _draw_camera_not_aligned(self, frame, analysis, curls=None, text_color=(255, 255, 255)):
+        nose_coord = analysis.landmarks['nose']
+        cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
+        cv2.circle(frame, analysis.landmarks['left_shldr'], 7, self.COLORS['yellow'], -1)
+        cv2.circle(frame, analysis.landmarks['right_shldr'], 7, self.COLORS['magenta'], -1)
+
+        if analysis.inactivity_reset:
+            self._draw_inactivity_reset(frame)
+
+        self._draw_counters(frame, analysis, curls)
+
+        self.cv_elem.draw_text(
+            frame,
+            'CAMERA NOT ALIGNED PROPERLY!!!',
+            pos=(30, 60),
+            text_color=text_color,
+            font_scale=0.65,
+            text_color_bg=(255, 153, 0),
+        )
+
+        self.cv_elem.draw_text(
+            frame,
+            'OFFSET ANGLE: ' + str(analysis.angles['offset']),
+            pos=(30, 30),
+            text_color=text_color,
+            font_scale=0.65,
+            text_color_bg=(255, 153, 0),
+        )
+        return frame
+
+    def _draw_no_person(self, frame, analysis, curls=None):
+        frame_height = frame.shape[0]
+
+        if analysis.inactivity_reset_bottom:
+            cv2.putText(frame, 'Resetting CURLS due to inactivity!!!', (10, frame_height - 25), self.font, 0.7,
+                        self.COLORS['red'], 2)
+
+        self._draw_counters(frame, analysis, curls)
+
+        if analysis.inactivity_reset:
+            self._draw_inactivity_reset(frame)
+        return frame
@@ -1,12 +1,12 @@
 # squats_processor.py
 
-from src.strategies.pose_processor.pose_processor import PoseProcessor
-import time
+from src.strategies.pose_processor.pose_processor import PoseProcessor, PoseAnalysis, NO_PERSON, CAMERA_NOT_ALIGNED, ALIGNED
 import cv2
 import numpy as np
 from src.strategies import angle_calculation_strategy as acs
 from src.strategies import detection_strategy as dc
 from src.models import exercise as exr
+from src.models.state_tracker import StateTracker, NO_STATE, S1, SEQ_EMPTY, SEQ_S2, SEQ_S2_S3, SEQ_S2_S3_S2
 
 
 class SquatsProcessor(PoseProcessor):
@@ -17,29 +17,8 @@ class SquatsProcessor(PoseProcessor):
         self.thresholds = self.exercise.get_thresholds()
 
         self.landmark_features_dict = detection_strategy.get_landmark_features()
-        self.state_tracker = {
-            'state_seq': [],
-
-            'start_inactive_time': time.perf_counter(),
-            'start_inactive_time_front': time.perf_counter(),
-            'INACTIVE_TIME': 0.0,
-            'INACTIVE_TIME_FRONT': 0.0,
-            'INACTIVE_TIME_START': 0.0,
-
-            # 0 --> Bend Backwards, 1 --> Bend Forward, 2 --> Keep shin straight, 3 --> Deep squat
-            'DISPLAY_TEXT': np.full((4,), False),
-            'COUNT_FRAMES': np.zeros((4,), dtype=np.int64),
-
-            'LOWER_HIPS': False,
-
-            'INCORRECT_POSTURE': False,
-
-            'prev_state': None,
-            'curr_state':None,
-
-            'CURLS': 0,
-            'BAD_CURLS': 0
-        }
+        # feedback slots: 0 --> Bend Backwards, 1 --> Bend Forward, 2 --> Keep shin straight, 3 --> Deep squat
+        self.state_tracker = StateTracker(4, self.clock)
 
         self.FEEDBACK_ID_MAP = {
             0: ('BEND BACKWARDS', 215, (0, 153, 255)),
@@ -54,7 +33,10 @@ class SquatsProcessor(PoseProcessor):
     def calculate_angle(self, p1, p2, ref_tp=np.array([0,0])):
         return self.angle_calculation.calculate_angle(p1,p2,ref_tp)
 
-    def _show_feedback(self, frame, c_frame, dict_maps, lower_hips_disp):
+    def calculate_angles(self, p1, p2, ref_tp=np.array([0,0])):
+        return self.angle_calculation.calculate_angles(p1,p2,ref_tp)
+
+    def _show_feedback(self, frame, feedback, dict_maps, lower_hips_disp):
 
         if lower_hips_disp:
             self.cv_elem.draw_text(
@@ -68,7 +50,7 @@ class SquatsProcessor(PoseProcessor):
                 increased_size=3
             )
 
-        for idx in np.where(c_frame)[0]:
+        for idx in feedback:
             self.cv_elem.draw_text(
                 frame,
                 dict_maps[idx][0],
@@ -82,422 +64,305 @@ class SquatsProcessor(PoseProcessor):
 
         return frame
 
-    def draw_landmark_line(self, frame, p1, p2, color, thickness):
-        if not np.array_equal(p1, [0, 0]) and not np.array_equal(p2, [0, 0]):
-            cv2.line(frame, p1, p2, color, thickness, lineType=self.linetype)
-        return frame
-
+    def active_feedback(self):
+        feedback = super().active_feedback()
+        if self.state_tracker.hint:
+            feedback.append('LOWER YOUR HIPS')
+        return feedback
 
-
-    def process(self, frame: np.array, curls=None):
+    def analyze(self):
         play_sound = None
 
-        frame_height, frame_width, _ = frame.shape
-
-        # self.detector.process_frame(frame)
         # Process the image.
         keypoints = self.detector.get_coordinates()
 
-        if len(keypoints):
-            nose_coord = self.detector.get_landmark_coordinates('nose')
+        if self.person < len(keypoints):
+            nose_coord = self.detector.get_landmark_coordinates('nose', self.person)
             left_shldr_coord, left_elbow_coord, left_wrist_coord, left_hip_coord, left_knee_coord, left_ankle_coord = \
-                self.detector.get_landmark_coordinates('left')
+                self.detector.get_landmark_coordinates('left', self.person)
             right_shldr_coord, right_elbow_coord, right_wrist_coord, right_hip_coord, right_knee_coord, right_ankle_coord = \
-                self.detector.get_landmark_coordinates('right')
+                self.detector.get_landmark_coordinates('right', self.person)
 
             offset_angle = self.calculate_angle(left_shldr_coord, right_shldr_coord, nose_coord)
 
             if offset_angle > self.thresholds['OFFSET_THRESH']:
-
-                display_inactivity = False
-
-                end_time = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME_FRONT'] += end_time - self.state_tracker['start_inactive_time_front']
-                self.state_tracker['start_inactive_time_front'] = end_time
-
-                if self.state_tracker['INACTIVE_TIME_FRONT'] >= self.thresholds['INACTIVE_THRESH']:
-                    self.state_tracker['CURLS'] = 0
-                    self.state_tracker['BAD_CURLS'] = 0
-                    display_inactivity = True
-
-                cv2.circle(frame, nose_coord, 7, self.COLORS['white'], -1)
-                cv2.circle(frame, left_shldr_coord, 7, self.COLORS['yellow'], -1)
-                cv2.circle(frame, right_shldr_coord, 7, self.COLORS['magenta'], -1)
-
-                # if self.flip_frame:
-                #     frame = cv2.flip(frame, 1)
-
-                if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                                self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
-                    play_sound = 'reset_counters'
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter()
-
-                    if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                        self.state_tracker['INACTIVE_TIME_START'] = time.time()
-
-                self.cv_elem.draw_text(
-                    frame,
-                    "CORRECT " + str(self.state_tracker['CURLS']),
-                    pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                    text_color=(10, 228, 72),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                    pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                    text_color=(254, 197, 251),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                if curls is not None:
-                    self.cv_elem.draw_text(
-                        frame,
-                        "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                            curls),
-                        pos=(int(frame_width / 2.1), frame_height - 30),
-                        text_color=(255, 255, 255),
-                        font_scale=0.5,
-                        font_thickness=2,
-                        text_color_bg=self.COLORS['black']
-                    )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    'CAMERA NOT ALIGNED PROPERLY!!!',
-                    pos=(30, 60),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                self.cv_elem.draw_text(
-                    frame,
-                    'OFFSET ANGLE: ' + str(offset_angle),
-                    pos=(30, 30),
-                    text_color=(255, 255, 230),
-                    font_scale=0.65,
-                    text_color_bg=(255, 153, 0),
-                )
-
-                # Reset inactive times for side view.
-                self.state_tracker['start_inactive_time'] = time.perf_counter()
-                self.state_tracker['INACTIVE_TIME'] = 0.0
-                self.state_tracker['prev_state'] = None
-                self.state_tracker['curr_state'] = None
+                return self._analyze_camera_not_aligned(offset_angle, nose_coord, left_shldr_coord, right_shldr_coord)
 
             # Camera is aligned properly.
-            else:
-
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter()
-
-                dist_l = abs(left_ankle_coord[1] - left_shldr_coord[1])
-                dist_r = abs(right_ankle_coord[1] - right_shldr_coord)[1]
-
-                shldr_coord = None
-                elbow_coord = None
-                wrist_coord = None
-                hip_coord = None
-                knee_coord = None
-                ankle_coord = None
-                foot_coord = None # for MP Strategy
-
-                if dist_l > dist_r:
-                    shldr_coord = left_shldr_coord
-                    elbow_coord = left_elbow_coord
-                    wrist_coord = left_wrist_coord
-                    hip_coord = left_hip_coord
-                    knee_coord = left_knee_coord
-                    ankle_coord = left_ankle_coord
-
-                    multiplier = -1
-
-                else:
-                    shldr_coord = right_shldr_coord
-                    elbow_coord = right_elbow_coord
-                    wrist_coord = right_wrist_coord
-                    hip_coord = right_hip_coord
-                    knee_coord = right_knee_coord
-                    ankle_coord = right_ankle_coord
-
-                    multiplier = 1
-
-                # --- Calculation vertical angles ----
-
-                hip_vertical_angle = self.calculate_angle(shldr_coord, np.array([hip_coord[0], 0]), hip_coord)
-                cv2.ellipse(frame, hip_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier * hip_vertical_angle,
-                            color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.clock()
+
+            dist_l = abs(left_ankle_coord[1] - left_shldr_coord[1])
+            dist_r = abs(right_ankle_coord[1] - right_shldr_coord)[1]
+
+            shldr_coord = None
+            elbow_coord = None
+            wrist_coord = None
+            hip_coord = None
+            knee_coord = None
+            ankle_coord = None
+            foot_coord = None # for MP Strategy
+
+            if dist_l > dist_r:
+                shldr_coord = left_shldr_coord
+                elbow_coord = left_elbow_coord
+                wrist_coord = left_wrist_coord
+                hip_coord = left_hip_coord
+                knee_coord = left_knee_coord
+                ankle_coord = left_ankle_coord
+
+                multiplier = -1
 
-                self.cv_elem.draw_dotted_line(frame, hip_coord, start=hip_coord[1] - 80, end=hip_coord[1] + 20,
-                                 line_color=self.COLORS['purple'])
-
-                knee_vertical_angle = self.calculate_angle(hip_coord, np.array([knee_coord[0], 0]), knee_coord)
-                cv2.ellipse(frame, knee_coord, (20, 20),
-                            angle=0, startAngle=-90, endAngle=-90 - multiplier * knee_vertical_angle,
-                            color=self.COLORS['white'], thickness=3, lineType=self.linetype)
-
-                self.cv_elem.draw_dotted_line(frame, knee_coord, start=knee_coord[1] - 50, end=knee_coord[1] + 20,
-                                 line_color=self.COLORS['purple'])
-
-                ankle_vertical_angle = self.calculate_angle(knee_coord, np.array([ankle_coord[0], 0]), ankle_coord)
-                cv2.ellipse(frame, ankle_coord, (30, 30),
-                            angle=0, startAngle=-90, endAngle=-90 + multiplier * ankle_vertical_angle,
-                            color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+            else:
+                shldr_coord = right_shldr_coord
+                elbow_coord = right_elbow_coord
+                wrist_coord = right_wrist_coord
+                hip_coord = right_hip_coord
+                knee_coord = right_knee_coord
+                ankle_coord = right_ankle_coord
 
-                self.cv_elem.draw_dotted_line(frame, ankle_coord, start=ankle_coord[1] - 50, end=ankle_coord[1] + 20,
-                                 line_color=self.COLORS['purple'])
+                multiplier = 1
 
-                # --- Plotting landmarks if it wasn't implemented in the detector
-                #
-                if not self.detector.is_plotted:
-                    # plotting landmarks
-                    self.draw_landmark_line(frame, shldr_coord, elbow_coord, self.COLORS['pink'], 4)
-                    self.draw_landmark_line(frame, wrist_coord, elbow_coord, self.COLORS['pink'], 4)
-                    self.draw_landmark_line(frame, shldr_coord, hip_coord, self.COLORS['pink'], 4)
-                    self.draw_landmark_line(frame, knee_coord, hip_coord, self.COLORS['pink'], 4)
-                    self.draw_landmark_line(frame, ankle_coord, knee_coord, self.COLORS['pink'], 4)
+            # --- Calculation vertical angles ----
 
-                    # plotting edges of landmarks
-                    cv2.circle(frame, shldr_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, elbow_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, wrist_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, hip_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, knee_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
-                    cv2.circle(frame, ankle_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            # hip, knee and ankle angles to the vertical in one vectorized call
+            hip_vertical_angle, knee_vertical_angle, ankle_vertical_angle = self.calculate_angles(
+                np.array([shldr_coord, hip_coord, knee_coord]),
+                np.array([[hip_coord[0], 0], [knee_coord[0], 0], [ankle_coord[0], 0]]),
+                np.array([hip_coord, knee_coord, ankle_coord])
+            ).tolist()
 
-                current_state = self.exercise.get_state(int(knee_vertical_angle))
-                self.state_tracker['curr_state'] = current_state
-                self.exercise._update_state_sequence(current_state, self.state_tracker)
+            current_state = self.exercise.get_state(int(knee_vertical_angle))
+            self.state_tracker.curr_state = current_state
+            self.exercise._update_state_sequence(current_state, self.state_tracker)
 
-                # --- Computing parts of automata
+            # --- Computing parts of automata
 
-                # print('\r', self.state_tracker['state_seq'], current_state, self.state_tracker['DISPLAY_TEXT'], self.state_tracker['COUNT_FRAMES'], end='')
+            # print('\r', self.state_tracker.state_seq, current_state, self.state_tracker.display_text, self.state_tracker.count_frames, end='')
 
-                if current_state == 's1':
+            if current_state == S1:
 
-                    if len(self.state_tracker['state_seq']) == 3 and not self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['CURLS'] += 1
-                        play_sound = str(self.state_tracker['CURLS'])
+                if self.state_tracker.state_seq == SEQ_S2_S3_S2 and not self.state_tracker.incorrect_posture:
+                    self.state_tracker.curls += 1
+                    play_sound = str(self.state_tracker.curls)
 
-                    elif 's2' in self.state_tracker['state_seq'] and len(self.state_tracker['state_seq']) == 1:
-                        self.state_tracker['BAD_CURLS'] += 1
-                        play_sound = 'incorrect'
+                elif self.state_tracker.state_seq == SEQ_S2:
+                    self.state_tracker.bad_curls += 1
+                    play_sound = 'incorrect'
 
-                    elif self.state_tracker['INCORRECT_POSTURE']:
-                        self.state_tracker['BAD_CURLS'] += 1
-                        play_sound = 'incorrect'
+                elif self.state_tracker.incorrect_posture:
+                    self.state_tracker.bad_curls += 1
+                    play_sound = 'incorrect'
 
-                    self.state_tracker['state_seq'] = []
-                    self.state_tracker['INCORRECT_POSTURE'] = False
-
-                    # --- End of computing
-
-                # --- Perform feedback
-
-                else:
-                    if hip_vertical_angle > self.thresholds['HIP_THRESH'][1]:
-                        self.state_tracker['DISPLAY_TEXT'][0] = True
-
-
-                    elif hip_vertical_angle < self.thresholds['HIP_THRESH'][0] and \
-                            self.state_tracker['state_seq'].count('s2') == 1:
-                        self.state_tracker['DISPLAY_TEXT'][1] = True
-
-                    if self.thresholds['KNEE_THRESH'][0] < knee_vertical_angle < self.thresholds['KNEE_THRESH'][1] and \
-                            self.state_tracker['state_seq'].count('s2') == 1:
-                        self.state_tracker['LOWER_HIPS'] = True
-
-
-                    elif knee_vertical_angle > self.thresholds['KNEE_THRESH'][2]:
-                        self.state_tracker['DISPLAY_TEXT'][3] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
-
-                    if (ankle_vertical_angle > self.thresholds['ANKLE_THRESH']):
-                        self.state_tracker['DISPLAY_TEXT'][2] = True
-                        self.state_tracker['INCORRECT_POSTURE'] = True
+                self.state_tracker.state_seq = SEQ_EMPTY
+                self.state_tracker.incorrect_posture = False
 
-                # --- Inactivity computing
+                # --- End of computing
 
-                display_inactivity = False
+            # --- Perform feedback
 
-                if self.state_tracker['curr_state'] == self.state_tracker['prev_state']:
-
-                    end_time = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME'] += end_time - self.state_tracker['start_inactive_time']
-                    self.state_tracker['start_inactive_time'] = end_time
-
-                    if self.state_tracker['INACTIVE_TIME'] >= self.thresholds['INACTIVE_THRESH']:
-                        self.state_tracker['CURLS'] = 0
-                        self.state_tracker['BAD_CURLS'] = 0
-                        display_inactivity = True
-
-                else:
-                    self.state_tracker['start_inactive_time'] = time.perf_counter()
-                    self.state_tracker['INACTIVE_TIME'] = 0.0
-
-                # ---
-
-                hip_text_coord_x = hip_coord[0] + 10
-                knee_text_coord_x = knee_coord[0] + 15
-                ankle_text_coord_x = ankle_coord[0] + 10
-
-                # if self.flip_frame:
-                #     frame = cv2.flip(frame, 1)
-                #     hip_text_coord_x = frame_width - hip_coord[0] + 10
-                #     knee_text_coord_x = frame_width - knee_coord[0] + 15
-                #     ankle_text_coord_x = frame_width - ankle_coord[0] + 10
-
-                if 's3' in self.state_tracker['state_seq'] or current_state == 's1':
-                    self.state_tracker['LOWER_HIPS'] = False
-
-                self.state_tracker['COUNT_FRAMES'][self.state_tracker['DISPLAY_TEXT']] += 1
+            else:
+                if hip_vertical_angle > self.thresholds['HIP_THRESH'][1]:
+                    self.state_tracker.display_text[0] = True
 
-                frame = self._show_feedback(frame, self.state_tracker['COUNT_FRAMES'], self.FEEDBACK_ID_MAP,
-                                            self.state_tracker['LOWER_HIPS'])
 
-                if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                                self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
-                    play_sound = 'reset_counters'
-                    self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                    self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+                elif hip_vertical_angle < self.thresholds['HIP_THRESH'][0] and \
+                        self.state_tracker.state_seq in (SEQ_S2, SEQ_S2_S3):
+                    self.state_tracker.display_text[1] = True
 
-                    if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                        self.state_tracker['INACTIVE_TIME_START'] = time.time()
+                if self.thresholds['KNEE_THRESH'][0] < knee_vertical_angle < self.thresholds['KNEE_THRESH'][1] and \
+                        self.state_tracker.state_seq in (SEQ_S2, SEQ_S2_S3):
+                    self.state_tracker.hint = True
 
-                cv2.putText(frame, str(int(hip_vertical_angle)), (hip_text_coord_x, hip_coord[1]), self.font, 0.6,
-                            self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(knee_vertical_angle)), (knee_text_coord_x, knee_coord[1] + 10), self.font,
-                            0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
-                cv2.putText(frame, str(int(ankle_vertical_angle)), (ankle_text_coord_x, ankle_coord[1]), self.font, 0.6,
-                            self.COLORS['light_green'], 2, lineType=self.linetype)
 
-                self.cv_elem.draw_text(
-                    frame,
-                    "CORRECT " + str(self.state_tracker['CURLS']),
-                    pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                    text_color=(10, 228, 72),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
+                elif knee_vertical_angle > self.thresholds['KNEE_THRESH'][2]:
+                    self.state_tracker.display_text[3] = True
+                    self.state_tracker.incorrect_posture = True
 
-                self.cv_elem.draw_text(
-                    frame,
-                    str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                    pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                    text_color=(254, 197, 251),
-                    font_scale=1,
-                    font_thickness=3,
-                    text_color_bg=self.COLORS['black'],
-                    increased_size=3
-                )
-
-                if curls is not None:
-                    self.cv_elem.draw_text(
-                        frame,
-                        "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                            curls),
-                        pos=(int(frame_width / 2.1), frame_height - 30),
-                        text_color=(255, 255, 255),
-                        font_scale=0.5,
-                        font_thickness=2,
-                        text_color_bg=self.COLORS['black']
-                    )
-
-                self.state_tracker['DISPLAY_TEXT'][
-                    self.state_tracker['COUNT_FRAMES'] > self.thresholds['CNT_FRAME_THRESH']] = False
-                self.state_tracker['COUNT_FRAMES'][
-                    self.state_tracker['COUNT_FRAMES'] > self.thresholds['CNT_FRAME_THRESH']] = 0
-                self.state_tracker['prev_state'] = current_state
+                if (ankle_vertical_angle > self.thresholds['ANKLE_THRESH']):
+                    self.state_tracker.display_text[2] = True
+                    self.state_tracker.incorrect_posture = True
 
+            # --- Inactivity computing
 
+            display_inactivity = False
 
-        # --- if len(keypoints)
+            if self.state_tracker.curr_state == self.state_tracker.prev_state:
 
-        else:
-            # if self.flip_frame:
-            #     frame = cv2.flip(frame, 1)
+                end_time = self.clock()
+                self.state_tracker.inactive_time += end_time - self.state_tracker.start_inactive_time
+                self.state_tracker.start_inactive_time = end_time
 
-            end_time = time.perf_counter()
-            self.state_tracker['INACTIVE_TIME'] += end_time - self.state_tracker['start_inactive_time']
+                if self.state_tracker.inactive_time >= self.thresholds['INACTIVE_THRESH']:
+                    self.state_tracker.curls = 0
+                    self.state_tracker.bad_curls = 0
+                    display_inactivity = True
 
-            display_inactivity = False
+            else:
+                self.state_tracker.start_inactive_time = self.clock()
+                self.state_tracker.inactive_time = 0.0
 
-            if self.state_tracker['INACTIVE_TIME'] >= self.thresholds['INACTIVE_THRESH'] or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                self.state_tracker['CURLS'] = 0
-                self.state_tracker['BAD_CURLS'] = 0
-                cv2.putText(frame, 'Resetting CURLS due to inactivity!!!', (10, frame_height - 25), self.font, 0.7, self.COLORS['red'], 2)
-                display_inactivity = True
-                if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    self.state_tracker['INACTIVE_TIME_START'] = time.time()
+            # ---
 
-            self.state_tracker['start_inactive_time'] = end_time
+            if self.state_tracker.state_seq in (SEQ_S2_S3, SEQ_S2_S3_S2) or current_state == S1:
+                self.state_tracker.hint = False
 
-            self.cv_elem.draw_text(
-                frame,
-                "CORRECT " + str(self.state_tracker['CURLS']),
-                pos=(int(frame_width * 0.06), int(frame_height - 80)),
-                text_color=(10, 228, 72),
-                font_scale=1,
-                font_thickness=3,
-                text_color_bg=self.COLORS['black'],
-                increased_size=3
-            )
+            self.state_tracker.count_frames[self.state_tracker.display_text] += 1
 
-            self.cv_elem.draw_text(
-                frame,
-                str(self.state_tracker['BAD_CURLS']) + " INCORRECT",
-                pos=(int(frame_width * 0.78), int(frame_height - 80)),
-                text_color=(254, 197, 251),
-                font_scale=1,
-                font_thickness=3,
-                text_color_bg=self.COLORS['black'],
-                increased_size=3
-            )
+            # feedback shown on this frame, taken before the counters below are reset
+            feedback = tuple(np.flatnonzero(self.state_tracker.count_frames))
+            lower_hips = self.state_tracker.hint
 
-            if curls is not None:
-                self.cv_elem.draw_text(
-                    frame,
-                    "CURLS: " + str(self.state_tracker['CURLS'] + self.state_tracker['BAD_CURLS']) + '/' + str(
-                        curls),
-                    pos=(int(frame_width / 2.1), frame_height - 30),
-                    text_color=(255, 255, 255),
-                    font_scale=0.5,
-                    font_thickness=2,
-                    text_color_bg=self.COLORS['black']
-                )
-
-            if display_inactivity or (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                cv2.putText(frame, 'Resetting CURLS due to inactivity!', (10, 90),
-                            self.font, 0.5, self.COLORS['red'], 2, lineType=self.linetype)
+            inactivity_reset = display_inactivity or (self.clock() - self.state_tracker.inactive_time_start) <= 3
+            if inactivity_reset:
                 play_sound = 'reset_counters'
-                self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-                self.state_tracker['start_inactive_time_front'] = time.perf_counter()
-
-                if not (time.time() - self.state_tracker['INACTIVE_TIME_START']) <= 3:
-                    self.state_tracker['INACTIVE_TIME_START'] = time.time()
+                self.state_tracker.inactive_time_front = 0.0
+                self.state_tracker.start_inactive_time_front = self.clock()
+
+                if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                    self.state_tracker.inactive_time_start = self.clock()
+
+            self.state_tracker.display_text[
+                self.state_tracker.count_frames > self.thresholds['CNT_FRAME_THRESH']] = False
+            self.state_tracker.count_frames[
+                self.state_tracker.count_frames > self.thresholds['CNT_FRAME_THRESH']] = 0
+            self.state_tracker.prev_state = current_state
+
+            return PoseAnalysis(
+                status=ALIGNED,
+                correct=self.state_tracker.curls,
+                incorrect=self.state_tracker.bad_curls,
+                state=current_state,
+                angles={'hip_vertical': hip_vertical_angle, 'knee_vertical': knee_vertical_angle,
+                        'ankle_vertical': ankle_vertical_angle},
+                landmarks={'shldr': shldr_coord, 'elbow': elbow_coord, 'wrist': wrist_coord,
+                           'hip': hip_coord, 'knee': knee_coord, 'ankle': ankle_coord},
+                multiplier=multiplier,
+                feedback=feedback,
+                hint=lower_hips,
+                inactivity_reset=inactivity_reset,
+                play_sound=play_sound
+            )
 
-            # Reset all other state variables
+        # --- if len(keypoints)
 
-            self.state_tracker['prev_state'] = None
-            self.state_tracker['curr_state'] = None
-            self.state_tracker['INACTIVE_TIME_FRONT'] = 0.0
-            self.state_tracker['INCORRECT_POSTURE'] = False
-            self.state_tracker['DISPLAY_TEXT'] = np.full((3,), False)
-            self.state_tracker['COUNT_FRAMES'] = np.zeros((3,), dtype=np.int64)
-            self.state_tracker['start_inactive_time_front'] = time.perf_counter()
+        # if self.flip_frame:
+        #     frame = cv2.flip(frame, 1)
+
+        end_time = self.clock()
+        self.state_tracker.inactive_time += end_time - self.state_tracker.start_inactive_time
+
+        display_inactivity = False
+
+        if self.state_tracker.inactive_time >= self.thresholds['INACTIVE_THRESH'] or (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+            self.state_tracker.curls = 0
+            self.state_tracker.bad_curls = 0
+            display_inactivity = True
+            if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                self.state_tracker.inactive_time_start = self.clock()
+
+        self.state_tracker.start_inactive_time = end_time
+
+        inactivity_reset = display_inactivity or (self.clock() - self.state_tracker.inactive_time_start) <= 3
+        if inactivity_reset:
+            play_sound = 'reset_counters'
+            self.state_tracker.inactive_time_front = 0.0
+            self.state_tracker.start_inactive_time_front = self.clock()
+
+            if not (self.clock() - self.state_tracker.inactive_time_start) <= 3:
+                self.state_tracker.inactive_time_start = self.clock()
+
+        # Reset all other state variables
+
+        self.state_tracker.prev_state = NO_STATE
+        self.state_tracker.curr_state = NO_STATE
+        self.state_tracker.inactive_time_front = 0.0
+        self.state_tracker.incorrect_posture = False
+        self.state_tracker.reset_feedback()
+        self.state_tracker.start_inactive_time_front = self.clock()
+
+        return PoseAnalysis(
+            status=NO_PERSON,
+            correct=self.state_tracker.curls,
+            incorrect=self.state_tracker.bad_curls,
+            inactivity_reset=inactivity_reset,
+            inactivity_reset_bottom=display_inactivity,
+            play_sound=play_sound
+        )
+
+    def draw(self, frame: np.array, analysis: PoseAnalysis, curls=None):
+        if analysis.status == NO_PERSON:
+            return self._draw_no_person(frame, analysis, curls)
+        if analysis.status == CAMERA_NOT_ALIGNED:
+            return self._draw_camera_not_aligned(frame, analysis, curls, text_color=(255, 255, 230))
+
+        landmarks = analysis.landmarks
+        angles = analysis.angles
+        multiplier = analysis.multiplier
+        shldr_coord, elbow_coord, wrist_coord = landmarks['shldr'], landmarks['elbow'], landmarks['wrist']
+        hip_coord, knee_coord, ankle_coord = landmarks['hip'], landmarks['knee'], landmarks['ankle']
+
+        cv2.ellipse(frame, hip_coord, (30, 30),
+                    angle=0, startAngle=-90, endAngle=-90 + multiplier * angles['hip_vertical'],
+                    color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+
+        self.cv_elem.draw_dotted_line(frame, hip_coord, start=hip_coord[1] - 80, end=hip_coord[1] + 20,
+                         line_color=self.COLORS['purple'])
+
+        cv2.ellipse(frame, knee_coord, (20, 20),
+                    angle=0, startAngle=-90, endAngle=-90 - multiplier * angles['knee_vertical'],
+                    color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+
+        self.cv_elem.draw_dotted_line(frame, knee_coord, start=knee_coord[1] - 50, end=knee_coord[1] + 20,
+                         line_color=self.COLORS['purple'])
+
+        cv2.ellipse(frame, ankle_coord, (30, 30),
+                    angle=0, startAngle=-90, endAngle=-90 + multiplier * angles['ankle_vertical'],
+                    color=self.COLORS['white'], thickness=3, lineType=self.linetype)
+
+        self.cv_elem.draw_dotted_line(frame, ankle_coord, start=ankle_coord[1] - 50, end=ankle_coord[1] + 20,
+                         line_color=self.COLORS['purple'])
+
+        # --- Plotting landmarks if it wasn't implemented in the detector
+        #
+        if not self.detector.is_plotted:
+            # plotting landmarks
+            self.draw_landmark_line(frame, shldr_coord, elbow_coord, self.COLORS['pink'], 4)
+            self.draw_landmark_line(frame, wrist_coord, elbow_coord, self.COLORS['pink'], 4)
+            self.draw_landmark_line(frame, shldr_coord, hip_coord, self.COLORS['pink'], 4)
+            self.draw_landmark_line(frame, knee_coord, hip_coord, self.COLORS['pink'], 4)
+            self.draw_landmark_line(frame, ankle_coord, knee_coord, self.COLORS['pink'], 4)
+
+            # plotting edges of landmarks
+            cv2.circle(frame, shldr_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, elbow_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, wrist_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, hip_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, knee_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+            cv2.circle(frame, ankle_coord, 7, self.COLORS['white'], -1, lineType=self.linetype)
+
+        hip_text_coord_x = hip_coord[0] + 10
+        knee_text_coord_x = knee_coord[0] + 15
+        ankle_text_coord_x = ankle_coord[0] + 10
+
+        # if self.flip_frame:
+        #     frame = cv2.flip(frame, 1)
+        #     hip_text_coord_x = frame_width - hip_coord[0] + 10
+        #     knee_text_coord_x = frame_width - knee_coord[0] + 15
+        #     ankle_text_coord_x = frame_width - ankle_coord[0] + 10
+
+        frame = self._show_feedback(frame, analysis.feedback, self.FEEDBACK_ID_MAP, analysis.hint)
+
+        if analysis.inactivity_reset:
+            self._draw_inactivity_reset(frame)
+
+        cv2.putText(frame, str(int(angles['hip_vertical'])), (hip_text_coord_x, hip_coord[1]), self.font, 0.6,
+                    self.COLORS['light_green'], 2, lineType=self.linetype)
+        cv2.putText(frame, str(int(angles['knee_vertical'])), (knee_text_coord_x, knee_coord[1] + 10), self.font,
+                    0.6, self.COLORS['light_green'], 2, lineType=self.linetype)
+        cv2.putText(frame, str(int(angles['ankle_vertical'])), (ankle_text_coord_x, ankle_coord[1]), self.font, 0.6,
+                    self.COLORS['light_green'], 2, lineType=self.linetype)
+
+        self._draw_counters(frame, analysis, curls)
 
-        return frame, play_sound
\ No newline at end of file
+        return frame
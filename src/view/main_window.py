@@ -3,6 +3,7 @@ from PySide6.QtWidgets import QApplication, QMainWindow
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtCore import QFile, QIODevice
 from src.controllers import main_window_controller
+from src.view import video_view
 import os
 
 class MainWindow(QMainWindow):
@@ -24,6 +25,10 @@ class MainWindow(QMainWindow):
             print(loader.errorString())
             sys.exit(-1)
 
+        # the session frames are shown right of the form, the window grows when a session starts
+        self.window.video = video_view.VideoView(self.window.centralWidget())
+        self.window.video.hide()
+
         self.controller = main_window_controller.MainWindowController(self.window)
 
         # invents processed by controller
@@ -31,8 +36,12 @@ class MainWindow(QMainWindow):
         self.window.stream.currentIndexChanged.connect(lambda: self.controller.chosen_stream())
         self.window.exercise.currentIndexChanged.connect(lambda: self.controller.chosen_exercise())
         self.window.start_button.clicked.connect(lambda: self.controller.clicked_start())
+        self.window.pause_button.clicked.connect(lambda: self.controller.clicked_pause())
         self.window.folder_button.clicked.connect(lambda: self.controller.clicked_dir())
 
+        # a running session is stopped before the window goes away
+        QApplication.instance().aboutToQuit.connect(lambda: self.controller.close())
+
         self.window.setWindowTitle("AI Trainer")
         return self.window
 
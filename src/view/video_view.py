@@ -0,0 +1,15 @@
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QLabel
+
+
+class VideoView(QLabel):
+    """the annotated frames of a running session, scaled to the size of the label"""
+    def __init__(self, parent=None):
+        super(VideoView, self).__init__(parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.setStyleSheet('background-color: rgb(14,16,15);')
+
+    def show_frame(self, image):
+        # fromImage copies, so the worker may reuse the frame's memory afterwards
+        self.setPixmap(QPixmap.fromImage(image).scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
@@ -0,0 +1,198 @@
+# conftest.py
+# a recorded exercise that runs through the real pipeline without ultralytics: RecordedVideo stands in for
+# cv2.VideoCapture and RecordedModel for the yolo model, the model finds the keypoints the video was drawn from
+
+import math
+import os
+import sys
+from unittest import mock
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.controllers import opencv_controller
+from src.strategies import angle_calculation_strategy
+from src.strategies import detection_strategy
+
+
+def recorded_pose(index, width, height, exercise='Squats'):
+    """(persons, 17, 2) keypoints of frame index, every 97th frame has nobody on it.
+    a rep takes 40 frames, every third rep goes deeper (squats) or not as high (curls)
+    """
+    if index % 97 == 50:
+        return np.zeros((0, 17, 2), dtype=np.float32)
+    keypoints = np.zeros((17, 2), dtype=np.float32)
+    phase = 1 - abs(2 * (index % 40) / 40.0 - 1)
+    deep = (index // 40) % 3 == 2
+    if exercise == 'Squats':
+        angle = math.radians(5 + (100 if deep else 88) * phase)
+        for side, (dx, ankle_y) in enumerate(((0, 600.0), (3, 590.0))):
+            knee = np.array([500.0 + dx, 450.0])
+            hip = knee + 150 * np.array([math.sin(angle), -math.cos(angle)])
+            shoulder = hip + [5.0, -200.0]
+            keypoints[5 + side] = shoulder
+            keypoints[7 + side] = shoulder + [10, 80]
+            keypoints[9 + side] = shoulder + [20, 160]
+            keypoints[11 + side] = hip
+            keypoints[13 + side] = knee
+            keypoints[15 + side] = (500.0 + dx, ankle_y)
+        keypoints[0] = keypoints[5] + [40, -40]
+    else:
+        angle = math.radians(170 - (80 if deep else 130) * phase)
+        for side in (0, 1):
+            shoulder = np.array([600.0 + 2 * side, 300.0])
+            elbow = shoulder + [0, 150]
+            keypoints[5 + side] = shoulder
+            keypoints[7 + side] = elbow
+            keypoints[9 + side] = elbow + 130 * np.array([-math.sin(angle), -math.cos(angle)])
+            keypoints[11 + side] = shoulder + [0, 250]
+            keypoints[13 + side] = shoulder + [0, 400]
+            keypoints[15 + side] = shoulder + [0, 550]
+        keypoints[0] = keypoints[5] + [-40, -60]
+    # drawn for a 1280x720 frame
+    return (keypoints * [width / 1280, height / 720] + 0.4)[None].astype(np.float32)
+
+
+def _frame_index(frame):
+    return int(frame[0, 0, 0]) + 256 * int(frame[0, 0, 1])
+
+
+class RecordedVideo:
+    """cv2.VideoCapture of a recorded exercise: the keypoints are drawn as dots, so the optical flow of the
+    keyframe mode can follow them, and the frame index is stored in the first pixel for RecordedModel
+    """
+    def __init__(self, frames=400, width=640, height=360, exercise='Squats', fps=30.0):
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.exercise = exercise
+        self.fps = fps
+        self.index = 0
+
+    def isOpened(self):
+        return self.index < self.frames
+
+    def _render(self, index):
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        for x, y in recorded_pose(index, self.width, self.height, self.exercise).reshape(-1, 2):
+            if x or y:
+                cv2.circle(frame, (int(round(x)), int(round(y))), 4, (255, 255, 255), -1, cv2.LINE_AA)
+        frame = cv2.GaussianBlur(frame, (5, 5), 0)
+        frame[0, 0, 0], frame[0, 0, 1] = index % 256, index // 256
+        frame[0, 0, 2] = self.exercise == 'Squats'
+        return frame
+
+    def grab(self):
+        if self.index >= self.frames:
+            return False
+        self.index += 1
+        return True
+
+    def read(self, image=None):
+        if self.index >= self.frames:
+            return False, None
+        frame = self._render(self.index)
+        self.index += 1
+        if image is not None:
+            image[...] = frame
+            return True, image
+        return True, frame
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: self.frames,
+                cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.index = int(value)
+        return True
+
+    def release(self):
+        self.index = self.frames
+
+
+class _Tensor:
+    def __init__(self, array):
+        self.array = array
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Keypoints:
+    def __init__(self, xy):
+        self.xy = _Tensor(xy)
+        self.conf = _Tensor(np.ones(xy.shape[:2], dtype=np.float32))
+
+
+class _Boxes:
+    def __init__(self, xy, ids=None):
+        boxes = np.zeros((len(xy), 4), dtype=np.float32)
+        for i, person in enumerate(xy):
+            boxes[i, :2], boxes[i, 2:] = person.min(axis=0), person.max(axis=0)
+        self.xyxy = _Tensor(boxes)
+        self.id = None if ids is None else _Tensor(ids)
+
+
+class _Result:
+    def __init__(self, frame, ids=False):
+        height, width = frame.shape[:2]
+        exercise = 'Squats' if frame[0, 0, 2] else 'Dumbbell'
+        xy = recorded_pose(_frame_index(frame), width, height, exercise)
+        self.keypoints = _Keypoints(xy)
+        self.boxes = _Boxes(xy, np.arange(1, len(xy) + 1, dtype=np.float32) if ids else None)
+        self.orig_img = frame
+        self.speed = {'preprocess': 0.0, 'inference': 0.0, 'postprocess': 0.0}
+
+    def plot(self, **kwargs):
+        return self.orig_img.copy()
+
+
+class RecordedModel:
+    """ultralytics YOLO stand-in that finds the recorded keypoints of a RecordedVideo frame"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, source, **kwargs):
+        self.calls += 1
+        frames = source if isinstance(source, list) else [source]
+        return [_Result(frame) for frame in frames]
+
+    def track(self, source, persist=False, **kwargs):
+        self.calls += 1
+        return [_Result(source, ids=True)]
+
+
+def recorded_detector(**kwargs):
+    """a YOLOStrategy running RecordedModel, kwargs go to YOLOStrategy"""
+    detector = detection_strategy.YOLOStrategy(**kwargs)
+    detector.model = RecordedModel()
+    return detector
+
+
+def recorded_controller(exercise='Squats', detector=None, level=0, multi_person=False, **video_kwargs):
+    """an OpenCVController set up on a RecordedVideo, the frames go to a sink instead of a window"""
+    controller = opencv_controller.OpenCVController(detector or recorded_detector(),
+                                                    angle_calculation_strategy.Angle2DCalculation(), exercise)
+    with mock.patch.object(cv2, 'VideoCapture', lambda path: RecordedVideo(exercise=exercise, **video_kwargs)):
+        controller.setup(stream=0, level=level, video_path='recorded.mp4', multi_person=multi_person)
+    controller.set_frame_sink(lambda frame: None)
+    return controller
+
+
+@pytest.fixture
+def recorded_videos(monkeypatch):
+    """cv2.VideoCapture opens RecordedVideos, the path is looked up in the returned dict of RecordedVideo kwargs"""
+    videos = {}
+    monkeypatch.setattr(cv2, 'VideoCapture', lambda path, *args: RecordedVideo(**videos.get(path, {})))
+    return videos
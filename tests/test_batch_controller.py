@@ -0,0 +1,25 @@
+# test_batch_controller.py
+
+import pytest
+
+from src.controllers import batch_controller
+from conftest import recorded_detector
+
+
+def _counts(result):
+    assert 'error' not in result, result['error']
+    return result['frames'], result['correct'], result['incorrect']
+
+
+@pytest.mark.parametrize('detector_kwargs', [{}, {'keyframe_every': 3}])
+def test_videos_scored_by_one_worker_count_like_fresh_ones(recorded_videos, detector_kwargs):
+    """a worker reuses its detector for every video, nothing of the previous video may change the counts"""
+    recorded_videos['a.mp4'] = {'width': 640, 'height': 360}
+    recorded_videos['b.mp4'] = {'width': 480, 'height': 270, 'frames': 300}
+    fresh = {path: _counts(batch_controller.score_video(path, 'Squats', detector=recorded_detector(**detector_kwargs)))
+             for path in recorded_videos}
+
+    for order in (('a.mp4', 'b.mp4'), ('b.mp4', 'a.mp4')):
+        detector = recorded_detector(**detector_kwargs)
+        for path in order:
+            assert _counts(batch_controller.score_video(path, 'Squats', detector=detector)) == fresh[path]
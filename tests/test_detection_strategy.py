@@ -0,0 +1,22 @@
+# test_detection_strategy.py
+
+import numpy as np
+
+from conftest import recorded_detector
+
+
+def test_roi_box_is_cut_to_the_frame():
+    detector = recorded_detector(roi=True)
+    detector._roi_box = (900, 500, 1200, 700)
+    assert detector._roi_in((360, 640, 3)) is None
+    detector._roi_box = (500, 200, 900, 500)
+    assert detector._roi_in((360, 640, 3)) == (500, 200, 640, 360)
+
+
+def test_reset_forgets_the_previous_video():
+    detector = recorded_detector(roi=True, keyframe_every=3)
+    detector._roi_box, detector._roi_frames = (10, 10, 200, 200), 5
+    detector._last_keyframe, detector._since_keyframe = (np.zeros((8, 8), np.uint8), None), 2
+    detector.reset()
+    assert detector._roi_box is None and detector._roi_frames == 0
+    assert detector._last_keyframe is None and detector._since_keyframe == 0
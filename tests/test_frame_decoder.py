@@ -0,0 +1,59 @@
+# test_frame_decoder.py
+
+import cv2
+import numpy as np
+import pytest
+
+from src.controllers.frame_decoder import PrefetchDecoder
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """30 frames, frame i is filled with the gray level 8 * i"""
+    path = str(tmp_path / 'frames.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def _level(frame):
+    return int(round(frame.mean() / 8))
+
+
+def test_reads_every_frame_then_ends(video_path):
+    decoder = PrefetchDecoder(cv2.VideoCapture(video_path), prefetch=4)
+    levels = []
+    while decoder.isOpened():
+        ret, frame = decoder.read()
+        if not ret:
+            break
+        levels.append(_level(frame))
+    decoder.release()
+    assert levels == list(range(30))
+    assert decoder.read() == (False, None)
+
+
+def test_stride_and_start(video_path):
+    decoder = PrefetchDecoder(cv2.VideoCapture(video_path), prefetch=4, stride=3, start=2)
+    levels = []
+    ret, frame = decoder.read()
+    while ret:
+        levels.append(_level(frame))
+        ret, frame = decoder.read()
+    decoder.release()
+    assert levels == list(range(2, 30, 3))
+
+
+def test_seek_back_to_the_first_frame(video_path):
+    decoder = PrefetchDecoder(cv2.VideoCapture(video_path), prefetch=4)
+    for _ in range(10):
+        decoder.read()
+    decoder.seek(0)
+    ret, frame = decoder.read()
+    assert ret and _level(frame) == 0
+    assert decoder.get(cv2.CAP_PROP_POS_FRAMES) == 1
+    decoder.set(cv2.CAP_PROP_POS_FRAMES, 20)
+    assert _level(decoder.read()[1]) == 20
+    decoder.release()
@@ -0,0 +1,35 @@
+# test_multi_person_processor.py
+
+from src.models.keypoints import KeypointRecord
+from conftest import recorded_controller, recorded_pose
+
+
+def _person(index, track_id):
+    xy = recorded_pose(index, 1280, 720)
+    return KeypointRecord(xy, ids=[track_id] * len(xy))
+
+
+def test_counts_keep_the_reps_of_dropped_tracks():
+    controller = recorded_controller(multi_person=True)
+    processor = controller.pose_processor
+    frames = [_person(i, 1) for i in range(200)] + [KeypointRecord.empty()] * 60 + \
+             [_person(i, 2) for i in range(120)]
+
+    totals = []
+    for detections in frames:
+        controller.detection_strategy.set_detections(detections)
+        analysis = processor.analyze()
+        assert (analysis.correct, analysis.incorrect) == processor.get_counts()
+        totals.append(sum(processor.get_counts()))
+    # the first track was dropped during the gap, its reps stay in the totals
+    assert totals[259] == totals[199] > 0
+    assert totals == sorted(totals)
+
+
+def test_a_new_session_starts_new_tracks():
+    controller = recorded_controller(multi_person=True)
+    detector = controller.detection_strategy
+    detector.detect(controller.vid.read()[1])
+    assert detector._track_persist
+    controller.setup(stream=0, video_path='recorded.mp4', multi_person=True)
+    assert not detector._track_persist
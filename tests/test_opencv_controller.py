@@ -0,0 +1,27 @@
+# test_opencv_controller.py
+
+import pytest
+
+from conftest import recorded_controller, recorded_detector
+
+
+def _counts(exercise, detector=None, **process_kwargs):
+    controller = recorded_controller(exercise, detector=detector)
+    controller.process(**process_kwargs)
+    return controller.pose_processor.get_counts()
+
+
+@pytest.mark.parametrize('exercise', ['Squats', 'Dumbbell'])
+def test_batched_counts_like_frame_by_frame(exercise):
+    expected = _counts(exercise)
+    assert sum(expected) > 0
+    assert _counts(exercise, batch_size=7) == expected
+
+
+@pytest.mark.parametrize('exercise', ['Squats', 'Dumbbell'])
+def test_keyframes_count_like_every_frame(exercise):
+    expected = _counts(exercise)
+    detector = recorded_detector(keyframe_every=3)
+    assert _counts(exercise, detector=detector) == expected
+    # the frames in between come from optical flow
+    assert detector.model.calls < 400 / 2
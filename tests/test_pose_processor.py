@@ -0,0 +1,18 @@
+# test_pose_processor.py
+
+import pytest
+
+from src.models.keypoints import KeypointRecord
+from conftest import recorded_controller, recorded_pose
+
+
+@pytest.mark.parametrize('exercise', ['Squats', 'Dumbbell'])
+def test_feedback_after_a_frame_without_a_person(exercise):
+    controller = recorded_controller(exercise)
+    processor = controller.pose_processor
+    size = len(processor.state_tracker.display_text)
+    # every 97th recorded frame has nobody in it, the deep reps after it show every feedback message
+    for index in range(400):
+        controller.detection_strategy.set_detections(KeypointRecord(recorded_pose(index, 1280, 720, exercise)))
+        processor.analyze()
+        assert len(processor.state_tracker.display_text) == len(processor.state_tracker.count_frames) == size